@@ -9,17 +9,16 @@ from .data import dao_session
 from .data.data_models import DataError
 from .data.data_models import User
 from .data.data_models import ResponseCode
+from . import error_responses
 
 def handle_create_registration_token(user: User):
     new_registration_token = get_cropped_otp(request.form.get('registration_token'))
     if new_registration_token is None or new_registration_token.strip() == '':
-        errorResponse = jsonify({'message':'Invalid Registration Token given!','code':ResponseCode.INVALID_REGISTRATION_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_REGISTRATION_TOKEN)
 
     result = dao_registration_tokens.insert_token(new_registration_token)
     if (result is DataError.REGISTRATION_CODE_ALREADY_EXISTS):
-        errorResponse = jsonify({'message':'Invalid Registration Token given!','code':ResponseCode.INVALID_REGISTRATION_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_REGISTRATION_TOKEN)
 
     return jsonify({'message':'Registration token Saved!','code':ResponseCode.SUCCESS_SAVED_REGISTRATION_TOKEN}), 200
 
@@ -27,12 +26,10 @@ def handle_create_reset_password_token(user: User):
     reset_password_token = get_cropped_otp(request.form.get('reset_password_token'))
     username_to_reset = get_cropped_username(request.form.get('username_to_reset'))
     if reset_password_token is None or reset_password_token.strip() == '':
-        errorResponse = jsonify({'message':'Invalid Reset Password Token given!','code':ResponseCode.INVALID_RESET_PASSWORD_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_RESET_PASSWORD_TOKEN)
 
     if username_to_reset is None or username_to_reset.strip() == '':
-        errorResponse = jsonify({'message':'username_to_reset cannot be empty!','code':ResponseCode.INVALID_USERNAME_TO_EDIT})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_USERNAME_TO_EDIT)
 
     expires_at = token_generator_util.generate_reset_password_expires_at()
 
@@ -43,13 +40,11 @@ def handle_create_reset_password_token(user: User):
 def handle_reset_user_otp_verification(user: User):
     username = get_cropped_username(request.form.get('username_to_reset'))
     if username is None or username.strip() == '':
-        errorResponse = jsonify({'message':'username_to_reset cannot be empty!','code':ResponseCode.INVALID_USERNAME_TO_EDIT})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_USERNAME_TO_EDIT)
 
     user_to_update = dao_users.get_user_by_name(username)
     if user_to_update is None:
-        errorResponse = jsonify({'message':'User cannot be found!','code':ResponseCode.NOT_FOUND_USER})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.NOT_FOUND_USER)
 
     dao_users.update_user_otp_verification(user_to_update.id, False)
 
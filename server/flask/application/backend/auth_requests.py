@@ -10,20 +10,19 @@ from .data.data_models import RegisteringUser
 from .data.data_models import User
 from .data.data_models import ResponseCode
 from .data.data_models import Session
+from . import error_responses
 from math import trunc
 
 def handle_register(username, password):
     one_time_password = get_cropped_otp(request.form.get('otp') or '')
     if not dao_registration_tokens.is_valid_token(one_time_password):
-        errorResponse = jsonify({'message':'Invalid Token!','code':ResponseCode.UNKNOWN_REGISTRATION_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.UNKNOWN_REGISTRATION_TOKEN)
 
     one_time_password_secret = token_generator_util.generate_otp_secret()
     user = RegisteringUser(name = username, password = password, otp_secret = one_time_password_secret)
     result = dao_users.insert_user(user)
     if (result is DataError.USER_NAME_NOT_VALID):
-        errorResponse = jsonify({'message':'Username is already taken!','code':ResponseCode.ALREADY_TAKEN_USERNAME})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.ALREADY_TAKEN_USERNAME)
 
     dao_registration_tokens.delete_token(one_time_password)
     secret_url = token_generator_util.get_url(user.name, one_time_password_secret)
@@ -46,8 +45,7 @@ def handle_otp_verification(user: User):
         dao_session.insert_user_session(session)
         return _jsonify_session(session), 200
     else:
-        errorResponse = jsonify({'message':'Invalid Token!','code':ResponseCode.INVALID_OTP})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_OTP)
 
 def handle_logout():
     access_token = get_cropped_token(request.headers.get('Authorization'))
@@ -60,13 +58,11 @@ def handle_logout():
 def handle_refresh_token():
     refresh_token = get_cropped_token(request.form.get('refresh_token'))
     if refresh_token is None:
-        errorResponse = jsonify({'message':'Invalid Refresh Token!','code':ResponseCode.INVALID_REFRESH_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_REFRESH_TOKEN)
 
     user_id = dao_session.get_user_for_refresh_token(refresh_token)
     if user_id is None:
-        errorResponse = jsonify({'message':'Invalid Refresh Token!','code':ResponseCode.INVALID_REFRESH_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_REFRESH_TOKEN)
         
     new_session = token_generator_util.generate_session(user_id)
     dao_session.swap_refresh_session(refresh_token = refresh_token, session = new_session)
@@ -0,0 +1,63 @@
+import gzip
+from flask import request
+from .data.session_cache import LruTtlCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_CACHE_EXTENSION = 'compressed_response_cache'
+# endpoints whose body is fully identified by the request path, query and ETag
+_CACHED_ENDPOINTS = {'get_file_metadata'}
+
+# Compresses JSON responses of at least COMPRESSION_MIN_SIZE_IN_BYTES with brotli (when installed) or gzip,
+# whichever the client accepts. A compressed body is a different representation, so a strong ETag becomes
+# weak, If-None-Match is compared weakly by the handlers, so 304s keep working.
+def init_app(app):
+    min_size = app.config.get('COMPRESSION_MIN_SIZE_IN_BYTES', 1024)
+    if min_size is None or min_size < 0:
+        return
+    app.extensions[_CACHE_EXTENSION] = LruTtlCache(max_size = app.config.get('COMPRESSION_CACHE_SIZE', 256), ttl = float('inf'))
+    encoders = {'gzip': _gzip_encoder(app.config.get('COMPRESSION_GZIP_LEVEL') or 6)}
+    if brotli is not None:
+        encoders['br'] = _brotli_encoder(app.config.get('COMPRESSION_BROTLI_QUALITY') or 5)
+
+    @app.after_request
+    def compress_response(response):
+        return _compress(app, response, min_size, encoders)
+
+def _gzip_encoder(level: int):
+    return lambda data: gzip.compress(data, compresslevel = level, mtime = 0)
+
+def _brotli_encoder(quality: int):
+    return lambda data: brotli.compress(data, quality = quality)
+
+def _compress(app, response, min_size: int, encoders: dict):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if 'br' in encoders else ['gzip'])
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    etag, is_weak = response.get_etag()
+    if etag is not None and request.endpoint in _CACHED_ENDPOINTS:
+        cache = app.extensions[_CACHE_EXTENSION]
+        key = (request.full_path, etag, encoding)
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = encoders[encoding](data)
+            cache.put(key, compressed, expires_at = float('inf'))
+    else:
+        compressed = encoders[encoding](data)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag is not None and not is_weak:
+        response.set_etag(etag, weak = True)
+    return response
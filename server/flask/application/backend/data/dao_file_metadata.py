@@ -2,32 +2,56 @@ from .db import get_db
 from .data_models import DataError
 from sqlite3 import IntegrityError
 
-_INSER_METADATA_SQL = "INSERT INTO file_metadata(file_key,metadata) "\
-"VALUES(:file_key, :metadata)"
-_DELETE_METADATA_SQL = "DELETE FROM file_metadata WHERE file_key=:file_key"
+# one statement per key, relies on the unique index added by migration 5, unchanged rows are not rewritten,
+# so the version of a row only grows when its metadata changes
+_UPSERT_METADATA_SQL = "INSERT INTO file_metadata(file_key,metadata) "\
+"VALUES(:file_key, :metadata) "\
+"ON CONFLICT(file_key) DO UPDATE SET metadata=excluded.metadata, version=version + 1 WHERE metadata IS NOT excluded.metadata"
 def insert_metadata(metadata: dict):
     db = get_db()
     db_cursor = db.cursor()
 
-    delete_params = map(lambda key: {'file_key':key}, metadata.keys())
-    delete_params = list(delete_params)
-    db_cursor.executemany(_DELETE_METADATA_SQL, delete_params)
-    
-    insert_params = map(lambda item: {'file_key':item[0], 'metadata':item[1]}, metadata.items())
-    insert_params = list(insert_params)
-
+    upsert_params = map(lambda item: {'file_key':item[0], 'metadata':item[1]}, metadata.items())
+    upsert_params = list(upsert_params)
 
-    db_cursor.executemany(_INSER_METADATA_SQL, insert_params)
+    db_cursor.executemany(_UPSERT_METADATA_SQL, upsert_params)
     db.commit()
 
+# the change version of the key's metadata, 0 if it has none
+_GET_VERSION_SQL = "SELECT version FROM file_metadata WHERE file_key=:file_key"
+def get_version(file_key: str):
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_VERSION_SQL, {"file_key": file_key})
+    row = db_cursor.fetchone()
+
+    if (row is None):
+        return 0
+    return row[0]
+
+_GET_METADATA_SQL = "SELECT metadata FROM file_metadata WHERE file_key=:file_key"
 def get_metadata(file_key: str):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT metadata FROM file_metadata WHERE file_key=:file_key",{"file_key":file_key})
+    db_cursor.execute(_GET_METADATA_SQL,{"file_key":file_key})
     rows = db_cursor.fetchone()
 
     if (rows is None):
         return dict()
     
     converted_tuple_array = map(lambda metadata: (file_key, metadata), rows)
-    return dict(converted_tuple_array)
\ No newline at end of file
+    return dict(converted_tuple_array)
+
+# SQLite versions before 3.32 allow at most 999 variables per statement
+_MAX_KEYS_PER_QUERY = 900
+_GET_METADATA_FOR_KEYS_SQL = "SELECT file_key, metadata FROM file_metadata WHERE file_key IN ({})"
+def get_metadata_for_keys(file_keys: list):
+    db = get_db()
+    db_cursor = db.cursor()
+    metadata = dict()
+    for start in range(0, len(file_keys), _MAX_KEYS_PER_QUERY):
+        chunk = file_keys[start:start + _MAX_KEYS_PER_QUERY]
+        db_cursor.execute(_GET_METADATA_FOR_KEYS_SQL.format(','.join('?' * len(chunk))), chunk)
+        for row in db_cursor.fetchall():
+            metadata[row['file_key']] = row['metadata']
+    return metadata
\ No newline at end of file
@@ -2,29 +2,85 @@ from .db import get_db
 from .data_models import DataError
 from sqlite3 import IntegrityError
 
-_INSER_METADATA_SQL = "INSERT INTO file_metadata_of_user(user_id,file_key,metadata) "\
-"VALUES(:user_id, :file_key, :metadata)"
-_DELETE_METADATA_SQL = "DELETE FROM file_metadata_of_user WHERE user_id=:user_id AND file_key=:file_key"
+# Every written key gets the next change version of the user, the versions only grow as the writes are
+# serialized by SQLite. A None metadata deletes the key, leaving a tombstone so the deletion is synced too.
+# One statement per key, relies on the unique index added by migration 5, unchanged rows are not rewritten.
+_UPSERT_METADATA_SQL = "INSERT INTO file_metadata_of_user(user_id,file_key,metadata,version,deleted) "\
+"VALUES(:user_id, :file_key, :metadata, "\
+"(SELECT COALESCE(MAX(version), 0) + 1 FROM file_metadata_of_user WHERE user_id=:user_id), :deleted) "\
+"ON CONFLICT(user_id, file_key) DO UPDATE SET metadata=excluded.metadata, version=excluded.version, deleted=excluded.deleted "\
+"WHERE metadata IS NOT excluded.metadata OR deleted IS NOT excluded.deleted"
 def insert_metadata(user_id: str, metadata: dict):
     db = get_db()
     db_cursor = db.cursor()
 
-    delete_params = map(lambda key: {'user_id':user_id, 'file_key':key}, metadata.keys())
-    delete_params = list(delete_params)
-    db_cursor.executemany(_DELETE_METADATA_SQL, delete_params)
-    
-    insert_params = map(lambda item: {'user_id':user_id, 'file_key':item[0], 'metadata':item[1]}, metadata.items())
-    insert_params = list(insert_params)
+    upsert_params = map(lambda item: _upsert_params(user_id, item[0], item[1]), metadata.items())
+    upsert_params = list(upsert_params)
 
-
-    db_cursor.executemany(_INSER_METADATA_SQL, insert_params)
+    db_cursor.executemany(_UPSERT_METADATA_SQL, upsert_params)
     db.commit()
 
+def _upsert_params(user_id: str, file_key: str, metadata):
+    if metadata is None:
+        return {'user_id':user_id, 'file_key':file_key, 'metadata':'', 'deleted':1}
+    return {'user_id':user_id, 'file_key':file_key, 'metadata':metadata, 'deleted':0}
+
+_GET_METADATA_SQL = "SELECT file_key, metadata FROM file_metadata_of_user WHERE user_id=:user_id AND deleted=0"
 def get_metadata(user_id: str):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT file_key, metadata FROM file_metadata_of_user WHERE user_id=:user_id",{"user_id":user_id})
+    db_cursor.execute(_GET_METADATA_SQL,{"user_id":user_id})
     rows = db_cursor.fetchall()
 
     converted_tuple_array = map(lambda row: (row['file_key'], row['metadata']), rows)
-    return dict(converted_tuple_array)
\ No newline at end of file
+    return dict(converted_tuple_array)
+
+# the latest change version of the user, 0 if nothing was written yet
+_GET_VERSION_SQL = "SELECT COALESCE(MAX(version), 0) FROM file_metadata_of_user WHERE user_id=:user_id"
+def get_version(user_id: str):
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_VERSION_SQL, {"user_id": user_id})
+    return db_cursor.fetchone()[0]
+
+# keys changed after the `since` version, deleted keys are mapped to None
+_GET_CHANGES_SINCE_SQL = "SELECT file_key, metadata, deleted FROM file_metadata_of_user "\
+"WHERE user_id=:user_id AND version > :since ORDER BY version"
+def get_changes_since(user_id: str, since: int):
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_CHANGES_SINCE_SQL, {"user_id": user_id, "since": since})
+    rows = db_cursor.fetchall()
+
+    converted_tuple_array = map(lambda row: (row['file_key'], None if row['deleted'] else row['metadata']), rows)
+    return dict(converted_tuple_array)
+
+# ordered by file_key, `after` is the last file_key of the previous page,
+# returns the page and the file_key to continue after, None if it was the last page
+_GET_METADATA_PAGE_SQL = "SELECT file_key, metadata FROM file_metadata_of_user "\
+"WHERE user_id=:user_id AND deleted=0 AND file_key > :after ORDER BY file_key LIMIT :limit"
+def get_metadata_page(user_id: str, limit: int, after: str = None):
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_METADATA_PAGE_SQL, {"user_id": user_id, "after": after or '', "limit": limit + 1})
+    rows = db_cursor.fetchall()
+
+    page = dict(map(lambda row: (row['file_key'], row['metadata']), rows[:limit]))
+    next_after = rows[limit - 1]['file_key'] if len(rows) > limit else None
+    return page, next_after
+
+# yields (file_key, metadata) ordered by file_key, holding at most batch_size rows in memory
+_ITERATE_METADATA_SQL = "SELECT file_key, metadata FROM file_metadata_of_user WHERE user_id=:user_id AND deleted=0 ORDER BY file_key"
+def iterate_metadata(user_id: str, batch_size: int = 500):
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_ITERATE_METADATA_SQL, {"user_id": user_id})
+    try:
+        while True:
+            rows = db_cursor.fetchmany(batch_size)
+            if len(rows) == 0:
+                return
+            for row in rows:
+                yield row['file_key'], row['metadata']
+    finally:
+        db_cursor.close()
\ No newline at end of file
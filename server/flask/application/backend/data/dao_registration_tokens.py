@@ -2,33 +2,37 @@ from .db import get_db
 from .data_models import DataError
 from sqlite3 import IntegrityError
 
+_COUNT_TOKEN_SQL = "SELECT COUNT(*) FROM registration_token where token = :token"
 def is_valid_token(token):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT COUNT(*) FROM registration_token where token = :token", {"token": token})
+    db_cursor.execute(_COUNT_TOKEN_SQL, {"token": token})
     rows = db_cursor.fetchone()
     
     return rows[0] == 1
 
+_INSERT_TOKEN_SQL = "INSERT INTO registration_token(token) VALUES(:token)"
 def insert_token(token):
     db = get_db()
     db_cursor = db.cursor()
     try:
-        db_cursor.execute("INSERT INTO registration_token(token) VALUES(:token)", {"token": token})
+        db_cursor.execute(_INSERT_TOKEN_SQL, {"token": token})
     except IntegrityError as e:
         return DataError.REGISTRATION_CODE_ALREADY_EXISTS
     db.commit()
     
+_DELETE_TOKEN_SQL = "DELETE FROM registration_token WHERE token=:token"
 def delete_token(token):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM registration_token WHERE token=:token", {"token": token})
+    db_cursor.execute(_DELETE_TOKEN_SQL, {"token": token})
     db.commit()
 
+_GET_TOKENS_SQL = "SELECT * FROM registration_token"
 def get_tokens():
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM registration_token")
+    db_cursor.execute(_GET_TOKENS_SQL)
     rows = db_cursor.fetchall()
     
     return list(map(lambda row: row['token'],rows))
\ No newline at end of file
@@ -1,21 +1,17 @@
 from .db import get_db
 import time
 
-_DELETE_EXPIRED_SESSION_SQL = "DELETE FROM reset_password_token where expires_at <= :time"
-def _delete_expired_tokens(db):
-    db_cursor = db.cursor()
-    db_cursor.execute(_DELETE_EXPIRED_SESSION_SQL, {"time": time.time()})
-    db.commit()
-
+# expired rows are removed by the janitor, reads only filter them out
+_COUNT_VALID_TOKEN_SQL = "SELECT COUNT(*) FROM reset_password_token where token = :token AND username = :username AND expires_at > :time"
 def is_valid_token(token, username):
     db = get_db()
-    _delete_expired_tokens(db)
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT COUNT(*) FROM reset_password_token where token = :token AND username = :username", {"token": token, "username": username})
+    db_cursor.execute(_COUNT_VALID_TOKEN_SQL, {"token": token, "username": username, "time": time.time()})
     rows = db_cursor.fetchone()
     
     return rows[0] == 1
 
+_INSERT_TOKEN_SQL = "INSERT INTO reset_password_token(token, username, expires_at) VALUES(:token, :username, :expires_at)"
 def insert_token(token, username, expires_at):
     db = get_db()
     db_cursor = db.cursor()
@@ -24,11 +20,12 @@ def insert_token(token, username, expires_at):
         "username": username,
         "expires_at": expires_at
     }
-    db_cursor.execute("INSERT INTO reset_password_token(token, username, expires_at) VALUES(:token, :username, :expires_at)", params)
+    db_cursor.execute(_INSERT_TOKEN_SQL, params)
     db.commit()
     
+_DELETE_TOKENS_SQL = "DELETE FROM reset_password_token WHERE username=:username"
 def delete_tokens(username):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM reset_password_token WHERE username=:username", {"username": username})
+    db_cursor.execute(_DELETE_TOKENS_SQL, {"username": username})
     db.commit()
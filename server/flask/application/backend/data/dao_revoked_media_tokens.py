@@ -0,0 +1,16 @@
+from .db import get_db
+import time
+
+_INSERT_REVOKED_TOKEN_SQL = "INSERT OR IGNORE INTO revoked_media_token(token_id, expires_at) VALUES(:token_id, :expires_at)"
+def insert_revoked_tokens(db_cursor, revoked_tokens):
+    params = list(map(lambda item: {'token_id': item[0], 'expires_at': item[1]}, revoked_tokens))
+    db_cursor.executemany(_INSERT_REVOKED_TOKEN_SQL, params)
+
+_GET_REVOKED_TOKEN_IDS_SQL = "SELECT token_id FROM revoked_media_token WHERE expires_at >= :time"
+def get_revoked_token_ids():
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_REVOKED_TOKEN_IDS_SQL, {"time": time.time()})
+    rows = db_cursor.fetchall()
+
+    return set(map(lambda row: row[0], rows))
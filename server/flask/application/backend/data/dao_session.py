@@ -1,36 +1,45 @@
 from .db import get_db
 from .data_models import Session
+from .session_cache import get_session_cache, access_key, media_key
+from . import signed_media_token
 import time
 
-_DELETE_EXPIRED_SESSION_SQL = "DELETE FROM session where refresh_expires_at <= :time"
-def _delete_expired_tokens(db):
-    db_cursor = db.cursor()
-    db_cursor.execute(_DELETE_EXPIRED_SESSION_SQL, {"time": time.time()})
-    db.commit()
+# expired rows are removed by the janitor, reads only filter them out.
+# Access tokens are resolved with their user by dao_users.get_user_for_access_token.
+_GET_USER_FOR_MEDIA_TOKEN_SQL = "SELECT user_id, access_expires_at, refresh_expires_at FROM session where media_token = :token and access_expires_at >= :time and refresh_expires_at > :time"
+# (user_id, expires_at) of the media token, expires_at being the end of the session's access
+def get_user_and_expiration_for_media_token(media_token: str):
+    cache = get_session_cache()
+    cache_key = media_key(media_token)
+    cached = cache.get(cache_key)
+    if (cached is not None):
+        return cached
 
-_GET_USER_FOR_ACCESS_TOKEN_SQL = "SELECT user_id FROM session where access_token = :token and access_expires_at >= :time"
-def get_user_for_token(access_token: str):
     db = get_db()
-    _delete_expired_tokens(db)
     db_cursor = db.cursor()
-    db_cursor.execute(_GET_USER_FOR_ACCESS_TOKEN_SQL, {"token": access_token, "time": time.time()})
+    db_cursor.execute(_GET_USER_FOR_MEDIA_TOKEN_SQL, {"token": media_token, "time": time.time()})
     rows = db_cursor.fetchall()
     
     if (len(rows) == 1):
-        return rows[0][0]
+        row = rows[0]
+        expires_at = min(row['access_expires_at'], row['refresh_expires_at'])
+        user_and_expiration = (row['user_id'], expires_at)
+        cache.put(cache_key, user_and_expiration, expires_at = expires_at)
+        return user_and_expiration
     return None
 
-_GET_USER_FOR_MEDIA_TOKEN_SQL = "SELECT user_id FROM session where media_token = :token and access_expires_at >= :time"
-def get_user_for_media_token(media_token: str):
-    db = get_db()
-    _delete_expired_tokens(db)
-    db_cursor = db.cursor()
-    db_cursor.execute(_GET_USER_FOR_MEDIA_TOKEN_SQL, {"token": media_token, "time": time.time()})
+# (access_tokens, media_tokens) of the sessions about to be deleted
+_SELECT_TOKENS_BY_ACCESS_TOKEN_SQL = "SELECT access_token, media_token FROM session WHERE access_token = :token"
+_SELECT_TOKENS_BY_USER_ID_SQL = "SELECT access_token, media_token FROM session WHERE user_id = :id"
+_SELECT_TOKENS_BY_REFRESH_TOKEN_SQL = "SELECT access_token, media_token FROM session WHERE refresh_token = :token"
+def _select_tokens(db_cursor, sql: str, params: dict):
+    db_cursor.execute(sql, params)
     rows = db_cursor.fetchall()
-    
-    if (len(rows) == 1):
-        return rows[0][0]
-    return None
+    return list(map(lambda row: row[0], rows)), list(map(lambda row: row[1], rows))
+
+# called after the commit, so workers reading the cache afterwards go to the database
+def _invalidate_tokens(access_tokens, media_tokens):
+    get_session_cache().invalidate(list(map(access_key, access_tokens)) + list(map(media_key, media_tokens)))
 
 _INSER_SESSION_SQL = "INSERT INTO session(user_id, access_token, media_token, refresh_token, access_expires_at, refresh_expires_at)"\
 "VALUES(:user_id, :access_token, :media_token, :refresh_token, :access_expires_at, :refresh_expires_at)"
@@ -52,40 +61,54 @@ def insert_user_session(session: Session):
     _session_insert(db_cursor, session)
     db.commit()
 
+_DELETE_SESSION_BY_ACCESS_TOKEN_SQL = "DELETE FROM session WHERE access_token = :token"
 def delete_user_session(access_token: str):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM session WHERE access_token = :token", {"token": access_token})
+    access_tokens, media_tokens = _select_tokens(db_cursor, _SELECT_TOKENS_BY_ACCESS_TOKEN_SQL, {"token": access_token})
+    db_cursor.execute(_DELETE_SESSION_BY_ACCESS_TOKEN_SQL, {"token": access_token})
+    signed_media_token.revoke(db_cursor, media_tokens)
     db.commit()
+    _invalidate_tokens(access_tokens, media_tokens)
 
+_DELETE_SESSIONS_BY_USER_ID_SQL = "DELETE FROM session WHERE user_id = :id"
 def delete_all_user_session_by_user_id(user_id: int):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM session WHERE user_id = :id", {"id": user_id})
+    access_tokens, media_tokens = _select_tokens(db_cursor, _SELECT_TOKENS_BY_USER_ID_SQL, {"id": user_id})
+    db_cursor.execute(_DELETE_SESSIONS_BY_USER_ID_SQL, {"id": user_id})
+    signed_media_token.revoke(db_cursor, media_tokens)
     db.commit()
+    _invalidate_tokens(access_tokens, media_tokens)
 
 def create_new_single_session(session: Session):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM session where user_id = :id", {"id": session.user_id})
+    access_tokens, media_tokens = _select_tokens(db_cursor, _SELECT_TOKENS_BY_USER_ID_SQL, {"id": session.user_id})
+    db_cursor.execute(_DELETE_SESSIONS_BY_USER_ID_SQL, {"id": session.user_id})
     _session_insert(db_cursor, session)
+    signed_media_token.revoke(db_cursor, media_tokens)
     db.commit()
+    _invalidate_tokens(access_tokens, media_tokens)
 
+_GET_USER_FOR_REFRESH_TOKEN_SQL = "SELECT user_id FROM session where refresh_token = :token and refresh_expires_at > :time"
 def get_user_for_refresh_token(refresh_token: str):
     db = get_db()
-    _delete_expired_tokens(db)
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT user_id FROM session where refresh_token = :token", {"token": refresh_token})
+    db_cursor.execute(_GET_USER_FOR_REFRESH_TOKEN_SQL, {"token": refresh_token, "time": time.time()})
     rows = db_cursor.fetchall()
     
     if (len(rows) == 1):
         return rows[0][0]
     return None
 
+_DELETE_SESSION_BY_REFRESH_TOKEN_SQL = "DELETE FROM session WHERE refresh_token = :token"
 def swap_refresh_session(refresh_token: str, session: Session):
     db = get_db()
-    _delete_expired_tokens(db)
     db_cursor = db.cursor()
-    db_cursor.execute("DELETE FROM session WHERE refresh_token = :token", {"token": refresh_token})
+    access_tokens, media_tokens = _select_tokens(db_cursor, _SELECT_TOKENS_BY_REFRESH_TOKEN_SQL, {"token": refresh_token})
+    db_cursor.execute(_DELETE_SESSION_BY_REFRESH_TOKEN_SQL, {"token": refresh_token})
     _session_insert(db_cursor, session)
-    db.commit()
\ No newline at end of file
+    signed_media_token.revoke(db_cursor, media_tokens)
+    db.commit()
+    _invalidate_tokens(access_tokens, media_tokens)
@@ -2,8 +2,11 @@ from .data_models import User
 from .data_models import RegisteringUser
 from .data_models import DataError
 from .db import get_db
+from .session_cache import get_session_cache, access_key, user_key
 from sqlite3 import IntegrityError
-from passlib.hash import sha256_crypt
+from .password_hashing import hash_password, verify_and_update_password
+import math
+import time
 
 def _user_from_row(row):
     return User(
@@ -14,10 +17,11 @@ def _user_from_row(row):
         privileged = row['privileged'] != 0,
     )
 
+_GET_USER_BY_ID_SQL = "SELECT * FROM user where id = :user_id"
 def get_user_by_id(user_id: int):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM user where id = :user_id", {"user_id": user_id})
+    db_cursor.execute(_GET_USER_BY_ID_SQL, {"user_id": user_id})
     row = db_cursor.fetchone()
     
     if (row is None):
@@ -25,10 +29,51 @@ def get_user_by_id(user_id: int):
 
     return _user_from_row(row)
 
+# the fields of the User, in the order of its constructor
+def _user_entry(user: User):
+    return (user.id, user.name, user.otp_secret, user.privileged, user.was_otp_verified)
+
+# called after the commit of every change of the user's fields, like dao_session._invalidate_tokens
+def _invalidate_user(user_id: int):
+    get_session_cache().invalidate([user_key(user_id)])
+
+# resolves the session and its user in one indexed lookup, user columns are NULL if the user no longer exists
+_GET_USER_FOR_ACCESS_TOKEN_SQL = "SELECT session.user_id, session.access_expires_at, session.refresh_expires_at, "\
+"user.id, user.username, user.otp_secret, user.privileged, user.was_otp_verified "\
+"FROM session LEFT JOIN user ON user.id = session.user_id "\
+"WHERE session.access_token = :token AND session.access_expires_at >= :time AND session.refresh_expires_at > :time"
+# The session is cached under the access token, the entry dao_session invalidates, and the
+# user under its id, so a cached session resolves its user without the database. A miss fills both.
+def get_user_for_access_token(access_token: str):
+    cache = get_session_cache()
+    user_and_expiration = cache.get(access_key(access_token))
+    if (user_and_expiration is not None):
+        cached_user = cache.get(user_key(user_and_expiration[0]))
+        if (cached_user is not None):
+            return User(*cached_user)
+
+    db = get_db()
+    db_cursor = db.cursor()
+    db_cursor.execute(_GET_USER_FOR_ACCESS_TOKEN_SQL, {"token": access_token, "time": time.time()})
+    rows = db_cursor.fetchall()
+
+    if (len(rows) != 1):
+        return None
+    row = rows[0]
+    expires_at = min(row['access_expires_at'], row['refresh_expires_at'])
+    cache.put(access_key(access_token), (row['user_id'], expires_at), expires_at = expires_at)
+    if (row['id'] is None):
+        return DataError.SESSION_WITHOUT_USER
+
+    user = _user_from_row(row)
+    cache.put(user_key(user.id), _user_entry(user), expires_at = math.inf)
+    return user
+
+_GET_USER_BY_NAME_SQL = "SELECT * FROM user where username = :name"
 def get_user_by_name(username: str):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM user where username = :name", {"name": username})
+    db_cursor.execute(_GET_USER_BY_NAME_SQL, {"name": username})
     row = db_cursor.fetchone()
     
     if (row is None):
@@ -36,26 +81,32 @@ def get_user_by_name(username: str):
 
     return _user_from_row(row)
 
+_UPDATE_PASSWORD_SQL = "UPDATE user SET password = :pass WHERE id=:id"
 def get_user_by_name_and_password(user_name: str, password: str):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM user where username = :user_name", {"user_name": user_name})
+    db_cursor.execute(_GET_USER_BY_NAME_SQL, {"name": user_name})
     row = db_cursor.fetchone()
 
     if (row is None):
-        sha256_crypt.hash('') # do hashing even if no user is found
+        hash_password('') # do hashing even if no user is found
         return None
 
-    is_password_wrong = not sha256_crypt.verify(password, row['password'] or '')
-    if is_password_wrong:
+    is_password_correct, updated_hashed_password = verify_and_update_password(password, row['password'] or '')
+    if not is_password_correct:
         return None
 
+    if updated_hashed_password is not None:
+        db_cursor.execute(_UPDATE_PASSWORD_SQL,{'id':row['id'], 'pass': updated_hashed_password})
+        db.commit()
+
     return _user_from_row(row)
 
+_GET_USERS_SQL = "SELECT * FROM user"
 def get_users():
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute("SELECT * FROM user")
+    db_cursor.execute(_GET_USERS_SQL)
     rows = db_cursor.fetchall()
 
     return map(_user_from_row, rows)
@@ -65,7 +116,7 @@ _INSER_USER_SQL = "INSERT INTO user(username, password, otp_secret, privileged,
 def insert_user(user: RegisteringUser):
     db = get_db()
     db_cursor = db.cursor()
-    hashed_password = sha256_crypt.hash(user.password)
+    hashed_password = hash_password(user.password)
 
     params = {
         "name": user.name,
@@ -81,27 +132,33 @@ def insert_user(user: RegisteringUser):
     db.commit()
     return db_cursor.lastrowid
 
+_UPDATE_PRIVILEGED_SQL = "UPDATE user SET privileged = :privileged WHERE id=:id"
 def update_user_privilige(user_id: int, privileged: bool):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute('UPDATE user SET privileged = :privileged WHERE id=:id',{'id':user_id, 'privileged': privileged})
+    db_cursor.execute(_UPDATE_PRIVILEGED_SQL,{'id':user_id, 'privileged': privileged})
     db.commit()
+    _invalidate_user(user_id)
 
+_UPDATE_OTP_VERIFIED_SQL = "UPDATE user SET was_otp_verified = :otp_verified WHERE id=:id"
 def update_user_otp_verification(user_id: int, was_otp_verified: bool):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute('UPDATE user SET was_otp_verified = :otp_verified WHERE id=:id',{'id':user_id, 'otp_verified': was_otp_verified})
+    db_cursor.execute(_UPDATE_OTP_VERIFIED_SQL,{'id':user_id, 'otp_verified': was_otp_verified})
     db.commit()
+    _invalidate_user(user_id)
 
 def update_user_password(user_id: int, new_password: str):
-    hashed_password = sha256_crypt.hash(new_password)
+    hashed_password = hash_password(new_password)
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute('UPDATE user SET password = :pass WHERE id=:id',{'id':user_id, 'pass': hashed_password})
+    db_cursor.execute(_UPDATE_PASSWORD_SQL,{'id':user_id, 'pass': hashed_password})
     db.commit()
 
+_DELETE_USER_SQL = "DELETE FROM user WHERE id=:id"
 def delete_user_by_id(user_id: int):
     db = get_db()
     db_cursor = db.cursor()
-    db_cursor.execute('DELETE FROM user WHERE id=:id',{'id':user_id})
+    db_cursor.execute(_DELETE_USER_SQL,{'id':user_id})
     db.commit()
+    _invalidate_user(user_id)
@@ -79,6 +79,7 @@ class User:
 class DataError(Enum):
     USER_NAME_NOT_VALID = 1
     REGISTRATION_CODE_ALREADY_EXISTS = 2
+    SESSION_WITHOUT_USER = 3
 
 class ResponseCode(IntEnum):
     SUCCESS_FOUND_USER = 200
@@ -99,6 +100,9 @@ class ResponseCode(IntEnum):
     CANT_SAVE_USER_FILE_METADATA = 414
     CANT_SAVE_FILE_METADATA = 415
     INVALID_FILE_KEY = 416
+    TOO_MANY_FILE_KEYS = 417
+    INVALID_PAGE_LIMIT = 418
+    INVALID_SINCE_VERSION = 419
     EMPTY_PASSWORD = 420
     INVALID_PASSWORD = 421
     INVALID_NEW_PASSWORD = 422
@@ -112,4 +116,5 @@ class ResponseCode(IntEnum):
     INVALID_REFRESH_TOKEN = 450
     INVALID_RESET_PASSWORD_TOKEN = 459
     INVALID_REGISTRATION_TOKEN = 460
-    UNKNOWN_RESET_PASSWORD_TOKEN = 461
\ No newline at end of file
+    UNKNOWN_RESET_PASSWORD_TOKEN = 461
+    SERVER_BUSY = 470
\ No newline at end of file
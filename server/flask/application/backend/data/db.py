@@ -1,31 +1,181 @@
 import sqlite3
+import os
+import re
+import threading
+import time
 from os import path
 import argparse
-from flask import current_app, g
-from passlib.hash import sha256_crypt
+import json
+from flask import current_app, g, has_app_context
+from .session_cache import clear_caches
+from . import migration
+from . import password_hashing
 
 default_database_name = "sqlitedb"
 
+def get_db_path(app = None):
+    app = app or current_app
+    db_path = app.config.get('DATABASE_PATH')
+    if (db_path is None):
+        db_path = path.join(app.instance_path, app.config['DATABASE_NAME'])
+    return db_path
+
+_PRAGMA_NAME_PATTERN = re.compile('^[a-z_]+$')
+_PRAGMA_VALUE_PATTERN = re.compile('^[A-Za-z0-9_-]+$')
+
+def _pragma_statements(pragmas: dict):
+    statements = []
+    for name, value in pragmas.items():
+        if isinstance(value, bool):
+            value = 'ON' if value else 'OFF'
+        if not _PRAGMA_NAME_PATTERN.match(name) or not _PRAGMA_VALUE_PATTERN.match(str(value)):
+            raise ValueError('Invalid DATABASE_PRAGMAS entry: {}={}'.format(name, value))
+        statements.append('PRAGMA {} = {}'.format(name, value))
+    return statements
+
+_QUERY_OBSERVERS_EXTENSION = 'db_query_observers'
+_FETCH_OBSERVERS_EXTENSION = 'db_fetch_observers'
+
+# observer(sql, params, duration_in_seconds) is called after every statement executed on the connections of
+# get_db, commits included as 'COMMIT', hooks like metrics register here instead of wrapping the DAOs
+def add_query_observer(app, observer):
+    app.extensions.setdefault(_QUERY_OBSERVERS_EXTENSION, []).append(observer)
+
+# observer(duration_in_seconds) is called after every fetchone, fetchmany and fetchall, stepping through the
+# rows of a SELECT happens there, not in execute
+def add_fetch_observer(app, observer):
+    app.extensions.setdefault(_FETCH_OBSERVERS_EXTENSION, []).append(observer)
+
+def _has_query_observers(app):
+    return len(app.extensions.get(_QUERY_OBSERVERS_EXTENSION, [])) > 0 or len(app.extensions.get(_FETCH_OBSERVERS_EXTENSION, [])) > 0
+
+def _notify_query_observers(sql: str, params, duration: float):
+    if not has_app_context():
+        return
+    for observer in current_app.extensions.get(_QUERY_OBSERVERS_EXTENSION, []):
+        observer(sql, params, duration)
+
+def _notify_fetch_observers(duration: float):
+    if not has_app_context():
+        return
+    for observer in current_app.extensions.get(_FETCH_OBSERVERS_EXTENSION, []):
+        observer(duration)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, params = ()):
+        started_at = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            _notify_query_observers(sql, params, time.perf_counter() - started_at)
+
+    def executemany(self, sql, params):
+        started_at = time.perf_counter()
+        try:
+            return super().executemany(sql, params)
+        finally:
+            _notify_query_observers(sql, params, time.perf_counter() - started_at)
+
+    def fetchone(self):
+        started_at = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _notify_fetch_observers(time.perf_counter() - started_at)
+
+    def fetchmany(self, size = None):
+        started_at = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            _notify_fetch_observers(time.perf_counter() - started_at)
+
+    def fetchall(self):
+        started_at = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _notify_fetch_observers(time.perf_counter() - started_at)
+
+# the shortcut methods of Connection create plain cursors internally, so they are routed through cursor() here,
+# commit is timed too, with WAL and synchronous=NORMAL it is where the log is written
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory = InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params = ()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self.cursor().executemany(sql, params)
+
+    def commit(self):
+        started_at = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _notify_query_observers('COMMIT', (), time.perf_counter() - started_at)
+
+def connect(db_path: str, pragmas: dict = None, instrumented: bool = False):
+    factory = InstrumentedConnection if instrumented else sqlite3.Connection
+    db = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES, factory=factory)
+    db.row_factory = sqlite3.Row
+    for statement in _pragma_statements(pragmas or {}):
+        db.execute(statement)
+    return db
+
+# Connections kept alive across requests, one per thread and database path, so they are never shared between threads.
+# uWSGI forks workers after the app is loaded, connections inherited from the parent process are never reused.
+_persistent_connections = threading.local()
+
+def _get_persistent_connection(db_path: str, pragmas: dict, instrumented: bool):
+    if getattr(_persistent_connections, 'pid', None) != os.getpid():
+        _persistent_connections.pid = os.getpid()
+        _persistent_connections.by_path = {}
+    key = (db_path, instrumented)
+    db = _persistent_connections.by_path.get(key)
+    if db is None:
+        db = connect(db_path, pragmas, instrumented = instrumented)
+        _persistent_connections.by_path[key] = db
+    return db
+
+def close_persistent_connections():
+    if getattr(_persistent_connections, 'pid', None) != os.getpid():
+        return
+    for db in _persistent_connections.by_path.values():
+        db.close()
+    _persistent_connections.by_path = {}
+
 def get_db():
-    current_app.config.get('DATABASE_PATH')
     if 'db' not in g:
-        db_path = current_app.config.get('DATABASE_PATH')
-        if (db_path is None):
-            db_path = path.join(current_app.instance_path, current_app.config['DATABASE_NAME'])
-        g.db = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-        g.db.row_factory = sqlite3.Row
+        db_path = get_db_path()
+        pragmas = current_app.config.get('DATABASE_PRAGMAS')
+        instrumented = _has_query_observers(current_app)
+        if current_app.config.get('DATABASE_KEEP_CONNECTION_ALIVE'):
+            g.db = _get_persistent_connection(db_path, pragmas, instrumented)
+            g.db_is_persistent = True
+        else:
+            g.db = connect(db_path, pragmas, instrumented = instrumented)
 
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
+    is_persistent = g.pop('db_is_persistent', False)
 
-    if db is not None:
+    if db is None:
+        return
+    if is_persistent:
+        # the connection is reused by the next request, never leave a transaction open on it
+        if db.in_transaction:
+            db.rollback()
+    else:
         db.close()
 
 def init_db(db_path = None, schema_path = None):
     if db_path is None:
-        db = get_db()
+        db = connect(get_db_path(), current_app.config.get('DATABASE_PRAGMAS'))
+        clear_caches()
     else:
         db = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
 
@@ -38,10 +188,20 @@ def init_db(db_path = None, schema_path = None):
 
     db.executescript(script)
     db.commit()
+    migration.migrate(db)
     db.close()
 
+def migrate_db(app):
+    db_path = get_db_path(app)
+    if not path.exists(db_path):
+        return
+    for version, description in migration.migrate_db_at(db_path):
+        app.logger.info('Applied database migration to version %s: %s', version, description)
+
 def init_app(app):
 	app.teardown_appcontext(close_db)
+	if app.config.get('RUN_MIGRATIONS_ON_STARTUP'):
+		migrate_db(app)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="DB Init ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -67,7 +227,9 @@ if __name__ == "__main__":
     db.row_factory = sqlite3.Row
     db_cursor = db.cursor()
 
-    hashed_password = sha256_crypt.hash(password)
+    with open(path.join(path.dirname(__file__), '..', 'config.json'), "r") as f:
+        app_config = json.load(f)
+    hashed_password = password_hashing.create_context(app_config).hash(password)
     sql = "INSERT INTO user(username, password, otp_secret, privileged, was_otp_verified)"\
     "VALUES(:name, :pass, :otp, :privileged, :otp_verified)"
     params = {
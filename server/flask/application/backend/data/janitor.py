@@ -0,0 +1,109 @@
+import fcntl
+import os
+import threading
+import time
+from .db import get_db, get_db_path
+
+# bounded batches, so a sweep never holds the write lock for long
+_SWEEP_EXPIRED_SQL = {
+    'session': "DELETE FROM session WHERE rowid IN "\
+        "(SELECT rowid FROM session WHERE refresh_expires_at <= :time LIMIT :batch_size)",
+    'reset_password_token': "DELETE FROM reset_password_token WHERE id IN "\
+        "(SELECT id FROM reset_password_token WHERE expires_at <= :time LIMIT :batch_size)",
+    'revoked_media_token': "DELETE FROM revoked_media_token WHERE token_id IN "\
+        "(SELECT token_id FROM revoked_media_token WHERE expires_at < :time LIMIT :batch_size)",
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'sweeps': 0,
+    'last_sweep_at': None,
+    'last_sweep_duration_in_seconds': None,
+    'last_sweep_deleted_rows': {},
+    'total_deleted_rows': {},
+    'is_sweeping_process': False,
+}
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+def sweep_expired(db, batch_size: int = 500):
+    started_at = time.perf_counter()
+    now = time.time()
+    deleted_rows = {}
+    db_cursor = db.cursor()
+    for table, sql in _SWEEP_EXPIRED_SQL.items():
+        deleted_rows[table] = 0
+        while True:
+            db_cursor.execute(sql, {"time": now, "batch_size": batch_size})
+            db.commit()
+            deleted_rows[table] += db_cursor.rowcount
+            if db_cursor.rowcount < batch_size:
+                break
+    _record_sweep(deleted_rows, time.perf_counter() - started_at)
+    return deleted_rows
+
+def _record_sweep(deleted_rows: dict, duration: float):
+    with _stats_lock:
+        _stats['sweeps'] += 1
+        _stats['last_sweep_at'] = time.time()
+        _stats['last_sweep_duration_in_seconds'] = duration
+        _stats['last_sweep_deleted_rows'] = dict(deleted_rows)
+        for table, count in deleted_rows.items():
+            _stats['total_deleted_rows'][table] = _stats['total_deleted_rows'].get(table, 0) + count
+
+def get_stats():
+    with _stats_lock:
+        return {
+            **_stats,
+            'last_sweep_deleted_rows': dict(_stats['last_sweep_deleted_rows']),
+            'total_deleted_rows': dict(_stats['total_deleted_rows']),
+        }
+
+# uWSGI forks the workers after loading the app, so the thread is started lazily from the first request of each process
+def init_app(app):
+    interval = app.config.get('EXPIRED_TOKEN_SWEEP_INTERVAL_IN_SECONDS') or 0
+    if interval <= 0:
+        return
+
+    @app.before_request
+    def start_janitor():
+        _ensure_started(app, interval)
+
+def _ensure_started(app, interval: float):
+    global _started_pid
+    pid = os.getpid()
+    if _started_pid == pid:
+        return
+    with _start_lock:
+        if _started_pid == pid:
+            return
+        _started_pid = pid
+        thread = threading.Thread(target=_run, args=(app, interval), name='expired-token-janitor', daemon=True)
+        thread.start()
+
+# only the process holding the lock file sweeps, if it dies the lock is released and another worker takes over
+def _run(app, interval: float):
+    lock_file = open(get_db_path(app) + '.janitor.lock', 'a')
+    batch_size = app.config.get('EXPIRED_TOKEN_SWEEP_BATCH_SIZE') or 500
+    is_sweeping_process = False
+    while True:
+        if not is_sweeping_process:
+            is_sweeping_process = _try_lock(lock_file)
+            with _stats_lock:
+                _stats['is_sweeping_process'] = is_sweeping_process
+        if is_sweeping_process:
+            try:
+                with app.app_context():
+                    deleted_rows = sweep_expired(get_db(), batch_size = batch_size)
+                app.logger.debug('Expired token sweep deleted %s', deleted_rows)
+            except Exception:
+                app.logger.exception('Expired token sweep failed')
+        time.sleep(interval)
+
+def _try_lock(lock_file):
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
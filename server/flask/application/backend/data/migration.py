@@ -1,13 +1,121 @@
 import sqlite3
-import sys
+import argparse
 
-def migration_0_to_1(db_path: str):
+# The schema version is kept in PRAGMA user_version, schema.sql creates version 0.
+# Every migration is applied in its own transaction together with the version bump,
+# so a database is always at a well defined version. Migrations must never lose data.
+
+def _column_names(db_cursor, table: str):
+    db_cursor.execute("PRAGMA table_info({})".format(table))
+    return list(map(lambda row: row[1], db_cursor.fetchall()))
+
+def _migration_0_to_1(db_cursor):
+    if 'media_token' not in _column_names(db_cursor, 'session'):
+        db_cursor.execute("ALTER TABLE session ADD media_token TEXT NOT NULL DEFAULT ''")
+
+def _migration_1_to_2(db_cursor):
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS session_access_token_index ON session(access_token)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS session_media_token_index ON session(media_token)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS session_refresh_token_index ON session(refresh_token)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS session_refresh_expires_at_index ON session(refresh_expires_at)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS session_user_id_index ON session(user_id)")
+
+def _migration_2_to_3(db_cursor):
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS file_metadata_file_key_index ON file_metadata(file_key)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS file_metadata_of_user_user_id_file_key_index ON file_metadata_of_user(user_id, file_key)")
+
+def _migration_3_to_4(db_cursor):
+    db_cursor.execute("CREATE TABLE IF NOT EXISTS revoked_media_token (token_id TEXT PRIMARY KEY NOT NULL, expires_at INTEGER NOT NULL)")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS revoked_media_token_expires_at_index ON revoked_media_token(expires_at)")
+
+# duplicates could be left by concurrent writers, the latest row (highest id) of every key is kept
+def _migration_4_to_5(db_cursor):
+    db_cursor.execute("DELETE FROM file_metadata WHERE id NOT IN (SELECT MAX(id) FROM file_metadata GROUP BY file_key)")
+    db_cursor.execute("DELETE FROM file_metadata_of_user WHERE id NOT IN (SELECT MAX(id) FROM file_metadata_of_user GROUP BY user_id, file_key)")
+    db_cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS file_metadata_file_key_unique_index ON file_metadata(file_key)")
+    db_cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS file_metadata_of_user_user_id_file_key_unique_index ON file_metadata_of_user(user_id, file_key)")
+    db_cursor.execute("DROP INDEX IF EXISTS file_metadata_file_key_index")
+    db_cursor.execute("DROP INDEX IF EXISTS file_metadata_of_user_user_id_file_key_index")
+
+# rows written before versioning count as the first change, so syncing since version 0 returns them
+def _migration_5_to_6(db_cursor):
+    columns = _column_names(db_cursor, 'file_metadata_of_user')
+    if 'version' not in columns:
+        db_cursor.execute("ALTER TABLE file_metadata_of_user ADD version INTEGER NOT NULL DEFAULT 0")
+        db_cursor.execute("UPDATE file_metadata_of_user SET version = 1")
+    if 'deleted' not in columns:
+        db_cursor.execute("ALTER TABLE file_metadata_of_user ADD deleted INTEGER NOT NULL DEFAULT 0")
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS file_metadata_of_user_user_id_version_index ON file_metadata_of_user(user_id, version)")
+
+# counts the changes of every file_metadata row, used as its ETag
+def _migration_6_to_7(db_cursor):
+    if 'version' not in _column_names(db_cursor, 'file_metadata'):
+        db_cursor.execute("ALTER TABLE file_metadata ADD version INTEGER NOT NULL DEFAULT 1")
+
+# reset password tokens are looked up by username and token, and deleted by username
+def _migration_7_to_8(db_cursor):
+    db_cursor.execute("CREATE INDEX IF NOT EXISTS reset_password_token_username_token_index ON reset_password_token(username, token)")
+
+# (version after migration, description, migration), in order
+MIGRATIONS = [
+    (1, 'add session.media_token', _migration_0_to_1),
+    (2, 'add session token, expiration and user indexes', _migration_1_to_2),
+    (3, 'add file metadata key indexes', _migration_2_to_3),
+    (4, 'add revoked_media_token', _migration_3_to_4),
+    (5, 'make file metadata keys unique', _migration_4_to_5),
+    (6, 'add file_metadata_of_user change versions and tombstones', _migration_5_to_6),
+    (7, 'add file_metadata change versions', _migration_6_to_7),
+    (8, 'add reset_password_token username index', _migration_7_to_8),
+]
+
+def get_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+def get_latest_version():
+    return MIGRATIONS[-1][0]
+
+def get_pending_migrations(db):
+    version = get_version(db)
+    return list(filter(lambda migration: migration[0] > version, MIGRATIONS))
+
+def migrate(db, dry_run = False):
+    pending = get_pending_migrations(db)
+    if dry_run:
+        return list(map(lambda migration: (migration[0], migration[1]), pending))
+
+    applied = []
+    for version, description, migration in pending:
+        db_cursor = db.cursor()
+        db_cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # another process may have migrated while we waited for the write lock
+            if get_version(db) >= version:
+                db.rollback()
+                continue
+            migration(db_cursor)
+            db_cursor.execute("PRAGMA user_version = {:d}".format(version))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+def migrate_db_at(db_path: str, dry_run = False):
     db = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
-    db_cursor = db.cursor()
-    db_cursor.execute("ALTER TABLE session ADD media_token TEXT NOT NULL DEFAULT '';")
-    db.commit()
-    db.close()
+    try:
+        return migrate(db, dry_run = dry_run)
+    finally:
+        db.close()
 
 if __name__ == "__main__":
-    print(sys.argv[1])
-    #migration_0_to_1(sys.argv[1])
+    parser = argparse.ArgumentParser(description="DB Migration ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("db_path", type=str, help="path of the sqlite database to migrate")
+    parser.add_argument("--dry-run", action="store_true", help="only list the migrations which would be applied")
+    args = parser.parse_args()
+
+    migrations = migrate_db_at(args.db_path, dry_run = args.dry_run)
+    if len(migrations) == 0:
+        print('Database is up to date at version {}.'.format(get_latest_version()))
+    for version, description in migrations:
+        print('{} migration to version {}: {}'.format('Pending' if args.dry_run else 'Applied', version, description))
@@ -0,0 +1,76 @@
+import argparse
+import json
+import math
+import statistics
+import time
+from passlib.registry import get_crypt_handler
+
+# Benchmarks password hash schemes on this host and recommends the rounds hitting a target latency per hash.
+# Run it on the production host, from the /server folder:
+# `python -m backend.data.password_calibration --target-ms 100`
+
+_DEFAULT_CANDIDATES = ['pbkdf2_sha256', 'sha256_crypt', 'bcrypt', 'argon2']
+
+def _is_available(handler):
+    has_backend = getattr(handler, 'has_backend', None)
+    return has_backend is None or has_backend()
+
+def _measure_ms(handler, rounds: int, samples: int):
+    configured = handler.using(rounds = rounds)
+    durations = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        configured.hash('calibration-password')
+        durations.append((time.perf_counter() - started_at) * 1000)
+    return statistics.median(durations)
+
+def _clamp(handler, rounds: int):
+    return max(handler.min_rounds, min(handler.max_rounds, rounds))
+
+def _estimate_rounds(handler, rounds: int, measured_ms: float, target_ms: float):
+    if handler.rounds_cost == 'log2':
+        return _clamp(handler, rounds + round(math.log2(target_ms / measured_ms)))
+    return _clamp(handler, max(1, round(rounds * target_ms / measured_ms)))
+
+def calibrate(scheme: str, target_ms: float, samples: int = 3):
+    handler = get_crypt_handler(scheme)
+    if not _is_available(handler):
+        return None
+    rounds = handler.default_rounds
+    measured_ms = _measure_ms(handler, rounds, samples)
+    # the second pass corrects the constant overhead which is not proportional to the rounds
+    for _ in range(2):
+        rounds = _estimate_rounds(handler, rounds, measured_ms, target_ms)
+        measured_ms = _measure_ms(handler, rounds, samples)
+    return {'scheme': scheme, 'rounds': rounds, 'measured_ms': round(measured_ms, 1)}
+
+def recommended_config(result: dict, available_schemes):
+    scheme = result['scheme']
+    schemes = [scheme] + list(filter(lambda other: other != scheme, available_schemes))
+    return {
+        'PASSWORD_SCHEMES': schemes,
+        'PASSWORD_SCHEME_SETTINGS': {
+            '{}__default_rounds'.format(scheme): result['rounds'],
+            '{}__max_rounds'.format(scheme): result['rounds'],
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password Hash Calibration ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=100, help="target duration of one hash in milliseconds")
+    parser.add_argument("--schemes", nargs="+", default=_DEFAULT_CANDIDATES, help="passlib schemes to benchmark, first available is recommended")
+    parser.add_argument("--samples", type=int, default=3, help="hashes measured per step")
+    args = parser.parse_args()
+
+    results = []
+    for scheme in args.schemes:
+        result = calibrate(scheme, target_ms = args.target_ms, samples = args.samples)
+        if result is None:
+            print('{}: not available, install its backend to benchmark it'.format(scheme))
+            continue
+        print('{}: {} rounds take {} ms'.format(scheme, result['rounds'], result['measured_ms']))
+        results.append(result)
+
+    if len(results) > 0:
+        print('Recommended config.json entries (hashes of the other schemes are upgraded on login):')
+        print(json.dumps(recommended_config(results[0], map(lambda result: result['scheme'], results)), indent = 2))
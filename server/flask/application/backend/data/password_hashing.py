@@ -0,0 +1,161 @@
+import fcntl
+import os
+import threading
+import time
+from flask import current_app
+from passlib.context import CryptContext
+from . import phase_timing
+
+_EXTENSION = 'password_hashing'
+_CONTEXT_EXTENSION = 'password_context'
+_DEFAULT_SCHEMES = ['sha256_crypt']
+
+class HashingBusyError(Exception):
+    pass
+
+# A fixed number of lock files shared by every process, a slot is taken by holding an exclusive flock on one
+# of them. The kernel drops the lock when its holder dies, so a worker killed mid-hash (harakiri, OOM killer)
+# frees its slot instead of leaking it, which a semaphore shared between the workers would not.
+class _SlotFiles:
+    _POLL_INTERVAL_IN_SECONDS = 0.01
+
+    def __init__(self, directory: str, name: str, count: int):
+        self._paths = [os.path.join(directory, '{}-{}.lock'.format(name, index)) for index in range(count)]
+        for path in self._paths:
+            open(path, 'a').close()
+
+    # returns the descriptor holding the slot, None if every slot is taken
+    def try_acquire(self):
+        for path in self._paths:
+            descriptor = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return descriptor
+            except BlockingIOError:
+                os.close(descriptor)
+        return None
+
+    def acquire(self, timeout: float):
+        deadline = time.perf_counter() + timeout
+        while True:
+            descriptor = self.try_acquire()
+            if descriptor is not None or time.perf_counter() >= deadline:
+                return descriptor
+            time.sleep(self._POLL_INTERVAL_IN_SECONDS)
+
+    # closing the descriptor releases its lock
+    def release(self, descriptor: int):
+        os.close(descriptor)
+
+# Password hashing is bounded across all uWSGI workers: at most `workers` hashes run at the same time
+# and at most `queue_depth` more wait for a free slot, anything above is rejected right away.
+# The slots are lock files in `directory`, so they are shared by every worker using the same directory,
+# and login storms can never pin more than workers + queue_depth processes.
+class HashingExecutor:
+    def __init__(self, directory: str, workers: int, queue_depth: int, timeout: float):
+        self.timeout = timeout
+        os.makedirs(directory, exist_ok = True)
+        self._admitted = _SlotFiles(directory, 'admitted', workers + queue_depth)
+        self._running = _SlotFiles(directory, 'running', workers)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'rejected': 0,
+            'timed_out': 0,
+            'total_wait_in_seconds': 0.0,
+            'total_hashing_in_seconds': 0.0,
+            'max_hashing_in_seconds': 0.0,
+        }
+
+    def run(self, function, *args):
+        admitted_slot = self._admitted.try_acquire()
+        if admitted_slot is None:
+            self._count('rejected')
+            raise HashingBusyError()
+        try:
+            started_at = time.perf_counter()
+            running_slot = self._running.acquire(self.timeout)
+            if running_slot is None:
+                self._count('timed_out')
+                raise HashingBusyError()
+            try:
+                hashing_started_at = time.perf_counter()
+                result = function(*args)
+                finished_at = time.perf_counter()
+            finally:
+                self._running.release(running_slot)
+        finally:
+            self._admitted.release(admitted_slot)
+        self._record(wait = hashing_started_at - started_at, hashing = finished_at - hashing_started_at)
+        return result
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _record(self, wait: float, hashing: float):
+        with self._stats_lock:
+            self._stats['calls'] += 1
+            self._stats['total_wait_in_seconds'] += wait
+            self._stats['total_hashing_in_seconds'] += hashing
+            self._stats['max_hashing_in_seconds'] = max(self._stats['max_hashing_in_seconds'], hashing)
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+# The first of PASSWORD_SCHEMES is used for new hashes, hashes of the other schemes are still verified
+# but are replaced on the next successful login, the same happens to hashes outside of the configured
+# rounds (for example above pbkdf2_sha256__max_rounds) set in PASSWORD_SCHEME_SETTINGS.
+def create_context(config):
+    schemes = config.get('PASSWORD_SCHEMES') or _DEFAULT_SCHEMES
+    settings = config.get('PASSWORD_SCHEME_SETTINGS') or {}
+    return CryptContext(schemes = schemes, deprecated = 'auto', **settings)
+
+def init_app(app):
+    app.extensions[_CONTEXT_EXTENSION] = create_context(app.config)
+    workers = app.config.get('PASSWORD_HASHING_WORKERS') or 0
+    if workers <= 0:
+        return
+    queue_depth = app.config.get('PASSWORD_HASHING_QUEUE_DEPTH') or 0
+    timeout = app.config.get('PASSWORD_HASHING_TIMEOUT_IN_SECONDS') or 10
+    directory = app.config.get('PASSWORD_HASHING_SLOT_DIRECTORY') or os.path.join(app.instance_path, 'hashing_slots')
+    app.extensions[_EXTENSION] = HashingExecutor(directory = directory, workers = workers, queue_depth = queue_depth, timeout = timeout)
+
+def get_executor():
+    return get_executor_of(current_app)
+
+def get_executor_of(app):
+    return app.extensions.get(_EXTENSION)
+
+# hashes of this process, including the wait for the executor, read by the metrics
+_hashing_stats_lock = threading.Lock()
+_hashing_stats = {'calls': 0, 'total_seconds': 0.0}
+
+def get_hashing_stats():
+    with _hashing_stats_lock:
+        return dict(_hashing_stats)
+
+def _run(function, *args):
+    started_at = time.perf_counter()
+    executor = get_executor()
+    if executor is None:
+        result = function(*args)
+    else:
+        result = executor.run(function, *args)
+    duration = time.perf_counter() - started_at
+    with _hashing_stats_lock:
+        _hashing_stats['calls'] += 1
+        _hashing_stats['total_seconds'] += duration
+    phase_timing.add('hash', duration)
+    return result
+
+def get_context():
+    return current_app.extensions[_CONTEXT_EXTENSION]
+
+def hash_password(password: str):
+    return _run(get_context().hash, password)
+
+# returns if the password is correct and the new hash to store if the given one is outdated, None otherwise
+def verify_and_update_password(password: str, hashed_password: str):
+    return _run(get_context().verify_and_update, password, hashed_password)
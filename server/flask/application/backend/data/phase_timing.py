@@ -0,0 +1,19 @@
+from flask import g, has_app_context
+
+# Time spent per phase (db, hash, otp, json) of the current request. Collection only runs when server timing
+# started it for the request, otherwise add is a context check and a dict lookup.
+def start():
+    g.phase_timings = {}
+
+def get():
+    return g.get('phase_timings')
+
+# count is 0 for time belonging to a call already counted, like fetching the rows of a statement
+def add(phase: str, duration: float, count: int = 1):
+    if not has_app_context():
+        return
+    timings = g.get('phase_timings')
+    if timings is None:
+        return
+    total, calls = timings.get(phase, (0.0, 0))
+    timings[phase] = (total + duration, calls + count)
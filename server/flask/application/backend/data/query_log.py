@@ -0,0 +1,117 @@
+import re
+import threading
+from flask import current_app
+from .db import add_query_observer, get_db
+
+_EXTENSION = 'query_log'
+_REDACTED_PARAM_NAMES = re.compile(r'token|pass|secret|otp', re.IGNORECASE)
+_PLANNED_STATEMENTS = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+_EXPLAIN = re.compile(r'^\s*EXPLAIN\b', re.IGNORECASE)
+_PLACEHOLDER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?!.*USING (COVERING )?INDEX)')
+_MAX_STATEMENTS = 1000
+_MAX_LOGGED_PARAMS_LENGTH = 500
+
+# Records the latency of every statement run on get_db connections, by statement. Statements slower than
+# SLOW_QUERY_THRESHOLD_IN_MS are logged as warnings with their parameters, values of parameters named like
+# tokens, passwords, secrets or OTPs are redacted. With QUERY_PLAN_CAPTURE_ENABLED the EXPLAIN QUERY PLAN of
+# each distinct statement is captured on its first execution and full table scans are logged as warnings.
+class QueryLog:
+    def __init__(self, threshold: float, is_capturing_plans: bool):
+        self.threshold = threshold
+        self.is_capturing_plans = is_capturing_plans
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}
+            self._plans = {}
+
+    # statements above _MAX_STATEMENTS distinct ones are not recorded, but still logged when slow
+    def observe(self, sql: str, params, duration: float):
+        if _EXPLAIN.match(sql):
+            return
+        statement = normalize(sql)
+        is_first_execution = False
+        with self._lock:
+            stats = self._statements.get(statement)
+            if stats is None and len(self._statements) < _MAX_STATEMENTS:
+                stats = self._statements[statement] = {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+                is_first_execution = True
+            if stats is not None:
+                stats['count'] += 1
+                stats['total_seconds'] += duration
+                stats['max_seconds'] = max(stats['max_seconds'], duration)
+        if duration * 1000 >= self.threshold:
+            current_app.logger.warning('Slow query (%.1f ms): %s params=%s', duration * 1000, statement, redact(params))
+        if is_first_execution and self.is_capturing_plans and _PLANNED_STATEMENTS.match(sql):
+            self._capture_plan(statement, sql, params)
+
+    def _capture_plan(self, statement: str, sql: str, params):
+        if _is_executemany_rows(params):
+            params = params[0]
+        elif params == [] or not isinstance(params, (dict, tuple, list)):
+            # executemany without rows, or with rows given as an iterator, which is already consumed
+            return
+        try:
+            rows = get_db().execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        except Exception:
+            current_app.logger.exception('EXPLAIN QUERY PLAN failed for %s', statement)
+            return
+        plan = [row['detail'] for row in rows]
+        with self._lock:
+            self._plans[statement] = plan
+        current_app.logger.info('Query plan of %s: %s', statement, ' | '.join(plan))
+        for detail in plan:
+            if is_full_scan(detail):
+                current_app.logger.warning('Full table scan (%s) in %s', detail, statement)
+
+    def statement_stats(self):
+        with self._lock:
+            return {statement: dict(stats) for statement, stats in self._statements.items()}
+
+    def query_plans(self):
+        with self._lock:
+            return dict(self._plans)
+
+# the IN lists of batch lookups have a placeholder per key, they are the same statement regardless of length
+def normalize(sql: str):
+    return _PLACEHOLDER_LIST.sub('?, ...', ' '.join(sql.split()))
+
+# a line of EXPLAIN QUERY PLAN reading every row of a table, not through an index, also used by the plan tests
+def is_full_scan(detail: str):
+    return _FULL_SCAN.match(detail) is not None
+
+# execute takes a dict or a sequence of values, executemany a list of those
+def _is_executemany_rows(params):
+    return isinstance(params, list) and len(params) > 0 and isinstance(params[0], (dict, tuple, list))
+
+def _redact_row(params):
+    if isinstance(params, dict):
+        return {name: '<redacted>' if _REDACTED_PARAM_NAMES.search(name) else value for name, value in params.items()}
+    return params
+
+def redact(params):
+    if _is_executemany_rows(params):
+        logged = '{} rows, first: {}'.format(len(params), _redact_row(params[0]))
+    else:
+        logged = str(_redact_row(params))
+    if len(logged) > _MAX_LOGGED_PARAMS_LENGTH:
+        return logged[:_MAX_LOGGED_PARAMS_LENGTH] + '...'
+    return logged
+
+# SLOW_QUERY_THRESHOLD_IN_MS turns the log on, 0 logs every statement
+def init_app(app):
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_IN_MS')
+    if threshold is None or threshold < 0:
+        return
+    query_log = QueryLog(threshold, is_capturing_plans = app.config.get('QUERY_PLAN_CAPTURE_ENABLED') or False)
+    app.extensions[_EXTENSION] = query_log
+    add_query_observer(app, query_log.observe)
+
+def get_query_log():
+    return get_query_log_of(current_app)
+
+def get_query_log_of(app):
+    return app.extensions.get(_EXTENSION)
@@ -1,3 +1,6 @@
+-- version 0 of the schema, later changes are applied by migration.py
+PRAGMA user_version = 0;
+
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS registration_token;
 DROP TABLE IF EXISTS reset_password_token;
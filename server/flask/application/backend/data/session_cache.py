@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from flask import current_app
+import json
+import math
+import threading
+import time
+
+_SESSION_CACHE_EXTENSION = 'session_cache'
+
+# bounded, thread-safe LRU, entries live for ttl seconds but never past their own expires_at
+class LruTtlCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, valid_until = entry
+            if valid_until < now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expires_at: float):
+        if self.max_size <= 0:
+            return
+        valid_until = min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'backend': 'local',
+            }
+
+# Shared by every worker of the uWSGI instance, needs a cache declared in its ini, for example
+# `cache2 = name=session_tokens,items=4096,blocksize=256`. Values are tuples of JSON scalars,
+# stored as the JSON array "[value, valid_until]", uWSGI refuses values larger than a block, which are
+# then read from the database every time.
+# An invalidation leaves a tombstone for ttl seconds, `put` never overwrites it, so a worker which read
+# the session before it was deleted can not put it back into the cache.
+class UwsgiCache:
+    _TOMBSTONE = b'-'
+
+    def __init__(self, uwsgi, cache_name: str, ttl: float):
+        self.uwsgi = uwsgi
+        self.cache_name = cache_name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.uwsgi.cache_get(key, self.cache_name)
+        entry = self._decode(value)
+        if entry is None or entry[1] < time.time():
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry[0]
+
+    def put(self, key, value, expires_at: float):
+        valid_until = min(expires_at, time.time() + self.ttl)
+        expires_in = max(1, math.ceil(valid_until - time.time()))
+        self.uwsgi.cache_set(key, json.dumps([list(value), valid_until], ensure_ascii = False).encode('utf-8'), expires_in, self.cache_name)
+
+    def invalidate(self, keys):
+        for key in keys:
+            self.uwsgi.cache_update(key, self._TOMBSTONE, math.ceil(self.ttl), self.cache_name)
+
+    def clear(self):
+        self.uwsgi.cache_clear(self.cache_name)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'backend': 'uwsgi',
+            }
+
+    def _count(self, key: str):
+        with self._lock:
+            setattr(self, key, getattr(self, key) + 1)
+
+    def _decode(self, value):
+        if value is None or value == self._TOMBSTONE:
+            return None
+        value, valid_until = json.loads(value)
+        return (tuple(value), valid_until)
+
+def _is_uwsgi_cache_declared(uwsgi, cache_name: str):
+    declarations = uwsgi.opt.get('cache2') or []
+    if not isinstance(declarations, list):
+        declarations = [declarations]
+    name = 'name={}'.format(cache_name).encode('ascii')
+    return any(name in declaration.split(b',') for declaration in declarations)
+
+# SESSION_CACHE_BACKEND is either 'local', a per worker LRU, or 'uwsgi', shared by every worker.
+# Outside of uWSGI, or without the declared cache, 'uwsgi' falls back to 'local'.
+def _create_session_cache(app):
+    max_size = app.config.get('SESSION_CACHE_SIZE', 1024)
+    ttl = app.config.get('SESSION_CACHE_TTL_IN_SECONDS', 60)
+    if app.config.get('SESSION_CACHE_BACKEND') == 'uwsgi':
+        cache_name = app.config.get('SESSION_CACHE_UWSGI_NAME') or 'session_tokens'
+        try:
+            import uwsgi
+        except ImportError:
+            uwsgi = None
+        if uwsgi is not None and _is_uwsgi_cache_declared(uwsgi, cache_name):
+            return UwsgiCache(uwsgi, cache_name = cache_name, ttl = ttl)
+        app.logger.warning('uWSGI cache %s is not available, falling back to a local session cache', cache_name)
+    return LruTtlCache(max_size = max_size, ttl = ttl)
+
+def get_session_cache():
+    cache = current_app.extensions.get(_SESSION_CACHE_EXTENSION)
+    if cache is None:
+        cache = current_app.extensions.setdefault(_SESSION_CACHE_EXTENSION, _create_session_cache(current_app))
+    return cache
+
+# cache keys, the access and media tokens and the users of the sessions share the session cache
+def access_key(access_token: str):
+    return 'access:' + access_token
+
+def media_key(media_token: str):
+    return 'media:' + media_token
+
+def user_key(user_id: int):
+    return 'user:{}'.format(user_id)
+
+# clears every cache of the app, the database was recreated so their entries are stale
+def clear_caches():
+    for extension in current_app.extensions.values():
+        if isinstance(extension, (LruTtlCache, UwsgiCache)):
+            extension.clear()
+
+
+# stats of every cache of the app by extension name
+def get_cache_stats(app):
+    stats = {}
+    for name, extension in app.extensions.items():
+        if isinstance(extension, (LruTtlCache, UwsgiCache)):
+            stats[name] = extension.stats()
+    return stats
\ No newline at end of file
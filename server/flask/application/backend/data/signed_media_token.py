@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+import posixpath
+import threading
+import time
+from secrets import token_urlsafe
+from urllib.parse import unquote
+from flask import current_app
+from . import dao_revoked_media_tokens
+
+# Signed media tokens can be verified without looking up the session:
+# `v1.<base64 of "user_id:expires_at:token_id:path_prefix">.<base64 of its HMAC-SHA256>`
+# Logout and user deletion still revoke them by token_id, the revoked ids are reloaded from the
+# database at most every MEDIA_TOKEN_REVOCATION_REFRESH_IN_SECONDS per worker.
+
+_VERSION_PREFIX = 'v1.'
+_REVOKED_IDS_EXTENSION = 'revoked_media_token_ids'
+
+def is_enabled():
+    return bool(current_app.config.get('MEDIA_TOKEN_SIGNING_KEY'))
+
+def is_signed(token: str):
+    return token.startswith(_VERSION_PREFIX)
+
+def _encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _decode(text: str):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _signature(payload: str):
+    key = current_app.config['MEDIA_TOKEN_SIGNING_KEY'].encode('utf-8')
+    return hmac.new(key, payload.encode('ascii'), hashlib.sha256).digest()
+
+# the requests crop tokens to MAX_TOKEN_LENGTH, a longer one could never be verified
+def sign(user_id: int, expires_at: float, path_prefix: str = ''):
+    token_id = token_urlsafe(12)
+    payload = _encode('{}:{}:{}:{}'.format(user_id, int(expires_at), token_id, path_prefix).encode('utf-8'))
+    token = _VERSION_PREFIX + payload + '.' + _encode(_signature(payload))
+    max_length = current_app.config['MAX_TOKEN_LENGTH']
+    if len(token) > max_length:
+        raise ValueError('Signed media token of {} characters is longer than MAX_TOKEN_LENGTH {}, shorten MEDIA_TOKEN_PATH_PREFIX'.format(len(token), max_length))
+    return token
+
+# reads the claims without checking the signature, only for tokens coming from our own database
+def parse(token: str):
+    try:
+        payload = token[len(_VERSION_PREFIX):].split('.')[0]
+        user_id, expires_at, token_id, path_prefix = _decode(payload).decode('utf-8').split(':', 3)
+        return {'user_id': int(user_id), 'expires_at': int(expires_at), 'token_id': token_id, 'path_prefix': path_prefix}
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+# claims of the token if it is genuine, not expired, allowed for the path and not revoked, None otherwise
+def verify(token: str, path: str):
+    if not is_enabled() or not is_signed(token):
+        return None
+    parts = token[len(_VERSION_PREFIX):].split('.')
+    if len(parts) != 2:
+        return None
+    try:
+        is_signature_valid = hmac.compare_digest(_decode(parts[1]), _signature(parts[0]))
+    except ValueError:
+        return None
+    if not is_signature_valid:
+        return None
+
+    claims = parse(token)
+    if claims is None or claims['expires_at'] < time.time():
+        return None
+    if claims['path_prefix'] != '' and not _is_path_within_prefix(path, claims['path_prefix']):
+        return None
+    if claims['token_id'] in _get_revoked_ids().get():
+        return None
+    return claims
+
+# the path is compared the way nginx resolves it, so `/media/allowed/../private` or its percent-encoded
+# form can not escape the prefix, paths still going above their root are rejected. The prefix is a
+# directory, `/media/alice` does not grant `/media/alice2`
+def _is_path_within_prefix(path: str, path_prefix: str):
+    if path is None:
+        return False
+    normalized_path = posixpath.normpath(unquote(path))
+    if '..' in normalized_path.split('/'):
+        return False
+    directory = path_prefix.rstrip('/')
+    return normalized_path == directory or normalized_path.startswith(directory + '/')
+
+def revoke(db_cursor, media_tokens):
+    revoked_tokens = []
+    for claims in map(parse, filter(is_signed, media_tokens)):
+        if claims is not None:
+            revoked_tokens.append((claims['token_id'], claims['expires_at']))
+    if len(revoked_tokens) == 0:
+        return
+    dao_revoked_media_tokens.insert_revoked_tokens(db_cursor, revoked_tokens)
+    _get_revoked_ids().add(map(lambda revoked: revoked[0], revoked_tokens))
+
+class _RevokedIds:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._ids = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.time()
+        if self._loaded_at is None or now - self._loaded_at >= self.refresh_interval:
+            ids = dao_revoked_media_tokens.get_revoked_token_ids()
+            with self._lock:
+                self._ids = ids
+                self._loaded_at = now
+        return self._ids
+
+    def add(self, token_ids):
+        with self._lock:
+            self._ids = self._ids.union(token_ids)
+
+    def clear(self):
+        with self._lock:
+            self._ids = set()
+            self._loaded_at = None
+
+def _get_revoked_ids():
+    revoked_ids = current_app.extensions.get(_REVOKED_IDS_EXTENSION)
+    if revoked_ids is None:
+        refresh_interval = current_app.config.get('MEDIA_TOKEN_REVOCATION_REFRESH_IN_SECONDS', 5)
+        revoked_ids = current_app.extensions.setdefault(_REVOKED_IDS_EXTENSION, _RevokedIds(refresh_interval))
+    return revoked_ids
@@ -0,0 +1,58 @@
+from flask import current_app
+from .data.data_models import ResponseCode
+
+_EXTENSION = 'error_responses'
+
+# a constant {'message':...,'code':...} response, its body is encoded once per app by init_app
+class ErrorResponse:
+    def __init__(self, message: str, code: ResponseCode, status: int):
+        self.message = message
+        self.code = code
+        self.status = status
+
+    def __str__(self):
+        return 'ErrorResponse(message={},code={},status={})'.format(self.message, self.code, self.status)
+
+    def __repr__(self):
+        return self.__str__()
+
+EMPTY_USERNAME = ErrorResponse('Username cannot be empty!', ResponseCode.EMPTY_USERNAME, 400)
+EMPTY_PASSWORD = ErrorResponse('Password cannot be empty!', ResponseCode.EMPTY_PASSWORD, 400)
+ALREADY_TAKEN_USERNAME = ErrorResponse('Username is already taken!', ResponseCode.ALREADY_TAKEN_USERNAME, 400)
+NOT_FOUND_USER = ErrorResponse('User cannot be found!', ResponseCode.NOT_FOUND_USER, 400)
+INVALID_USERNAME_TO_EDIT = ErrorResponse('username_to_reset cannot be empty!', ResponseCode.INVALID_USERNAME_TO_EDIT, 400)
+INVALID_PASSWORD = ErrorResponse('Invalid Password!', ResponseCode.INVALID_PASSWORD, 400)
+INVALID_NEW_PASSWORD = ErrorResponse('New Password cannot be empty!', ResponseCode.INVALID_NEW_PASSWORD, 400)
+UNKNOWN_REGISTRATION_TOKEN = ErrorResponse('Invalid Token!', ResponseCode.UNKNOWN_REGISTRATION_TOKEN, 400)
+INVALID_OTP = ErrorResponse('Invalid Token!', ResponseCode.INVALID_OTP, 400)
+MISSING_AUTHORIZATION = ErrorResponse('Missing Authorization!', ResponseCode.MISSING_AUTHORIZATION, 401)
+INVALID_AUTHORIZATION = ErrorResponse('Invalid Authorization!', ResponseCode.INVALID_AUTHORIZATION, 401)
+UNASSOCIATED_AUTHORIZATION = ErrorResponse('Invalid Authorization!', ResponseCode.UNASSOCIATED_AUTHORIZATION, 400)
+MISSING_MEDIA_AUTHORIZATION = ErrorResponse('Missing Authorization!', ResponseCode.MISSING_MEDIA_AUTHORIZATION, 401)
+INVALID_MEDIA_AUTHORIZATION = ErrorResponse('Invalid Authorization!', ResponseCode.INVALID_MEDIA_AUTHORIZATION, 401)
+INVALID_REFRESH_TOKEN = ErrorResponse('Invalid Refresh Token!', ResponseCode.INVALID_REFRESH_TOKEN, 400)
+INVALID_RESET_PASSWORD_TOKEN = ErrorResponse('Invalid Reset Password Token given!', ResponseCode.INVALID_RESET_PASSWORD_TOKEN, 400)
+UNKNOWN_RESET_PASSWORD_TOKEN = ErrorResponse('Invalid Reset Password Token given!', ResponseCode.UNKNOWN_RESET_PASSWORD_TOKEN, 400)
+INVALID_REGISTRATION_TOKEN = ErrorResponse('Invalid Registration Token given!', ResponseCode.INVALID_REGISTRATION_TOKEN, 400)
+NOT_PRIVILEGED = ErrorResponse('Not Authorized!', ResponseCode.INVALID_REGISTRATION_TOKEN, 400)
+CANT_SAVE_USER_FILE_METADATA = ErrorResponse('Couldn\'t save user\'s metadata!', ResponseCode.CANT_SAVE_USER_FILE_METADATA, 400)
+CANT_SAVE_FILE_METADATA = ErrorResponse('Couldn\'t save metadata!', ResponseCode.CANT_SAVE_FILE_METADATA, 400)
+INVALID_FILE_KEY = ErrorResponse('Invalid FileKey (file_key)!', ResponseCode.INVALID_FILE_KEY, 400)
+INVALID_PAGE_LIMIT = ErrorResponse('Invalid Limit (limit)!', ResponseCode.INVALID_PAGE_LIMIT, 400)
+INVALID_SINCE_VERSION = ErrorResponse('Invalid Version (since)!', ResponseCode.INVALID_SINCE_VERSION, 400)
+SERVER_BUSY = ErrorResponse('Server is busy, try again later!', ResponseCode.SERVER_BUSY, 503)
+
+ALL = [value for value in list(globals().values()) if isinstance(value, ErrorResponse)]
+
+# encoded with the app's JSON provider, so the bodies are the same as jsonify would produce
+def init_app(app):
+    app.extensions[_EXTENSION] = dict(map(lambda error: (error, _encode(app, error)), ALL))
+
+def _encode(app, error: ErrorResponse):
+    with app.app_context():
+        return app.json.response({'message': error.message, 'code': error.code}).get_data()
+
+# a new response around the encoded body, nothing is serialized per request
+def respond(error: ErrorResponse, headers: dict = None):
+    body = current_app.extensions[_EXTENSION][error]
+    return current_app.response_class(body, status = error.status, headers = headers, mimetype = current_app.json.mimetype)
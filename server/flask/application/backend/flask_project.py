@@ -3,6 +3,9 @@ from os import path
 from flask import Flask
 import json
 from .data import db as db
+from .data import janitor as janitor
+from .data import password_hashing as password_hashing
+from .data import query_log as query_log
 from .data.data_models import User
 from .require_decorators import require_username_and_password
 from .require_decorators import require_user_exists_by_username_and_password
@@ -13,6 +16,11 @@ from . import auth_requests as auth_requests_handler
 from . import admin_requests as admin_requests_handler
 from . import user_action_requests as user_action_requests_handler
 from . import media_access_requests as media_access_requests_handler
+from . import json_provider as json_provider
+from . import compression as compression
+from . import error_responses
+from . import metrics as metrics
+from . import server_timing as server_timing
 
 # for chrome to accept the certificate run in console `endCommand(SecurityInterstitialCommandId.CMD_PROCEED)`
 # to restart = `uwsgi --ini home-vod-server.ini` like in Dockerimage
@@ -22,7 +30,20 @@ def create_app(test_config=None):
         app.config.from_file('config.json', silent=True, load=json.load)
     else:
         app.config.from_mapping(test_config)
+    app.json = json_provider.create_json_provider(app)
+    error_responses.init_app(app)
     db.init_app(app)
+    query_log.init_app(app)
+    janitor.init_app(app)
+    password_hashing.init_app(app)
+    # registered before compression, so its after_request runs last and the app timing includes compression
+    server_timing.init_app(app)
+    compression.init_app(app)
+    metrics.init_app(app)
+
+    @app.errorhandler(password_hashing.HashingBusyError)
+    def hashing_busy(e):
+        return error_responses.respond(error_responses.SERVER_BUSY, headers = {'Retry-After': '1'})
 
 #   region auth requests
     @app.route("/register", methods=['POST'])
@@ -87,6 +108,11 @@ def create_app(test_config=None):
     @requires_session
     def get_file_metadata(user: User):
         return user_action_requests_handler.handle_get_file_metadata(user = user)
+
+    @app.route("/file/metadata/batch", methods=['GET', 'POST'])
+    @requires_session
+    def get_file_metadata_batch(user: User):
+        return user_action_requests_handler.handle_get_file_metadata_batch(user = user)
 #   endregion
 
 #   region admin requests
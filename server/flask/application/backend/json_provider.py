@@ -0,0 +1,43 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Keeps the behaviour of Flask's default provider (sorted keys, compact responses, `\n` ending)
+# but encodes and decodes with orjson. Unlike the default provider it does not escape non-ASCII characters.
+# Values orjson can not handle (for example strings with lone surrogates) fall back to the standard library.
+class OrjsonJSONProvider(DefaultJSONProvider):
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent') is not None:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default = kwargs.get('default', self.default), option = option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # the standard library also accepts NaN, Infinity and integers above 64 bits
+            return super().loads(s, **kwargs)
+
+def is_orjson_available():
+    return orjson is not None
+
+# JSON_PROVIDER is 'auto' (orjson when it is installed), 'orjson' or 'stdlib'
+def create_json_provider(app):
+    name = app.config.get('JSON_PROVIDER') or 'auto'
+    if name == 'stdlib':
+        return DefaultJSONProvider(app)
+    if name == 'orjson' and not is_orjson_available():
+        raise ImportError('JSON_PROVIDER is orjson, but orjson is not installed')
+    if is_orjson_available():
+        return OrjsonJSONProvider(app)
+    return DefaultJSONProvider(app)
@@ -1,25 +1,68 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from .require_decorators import get_cropped_token
 from .data.data_models import ResponseCode
 from .data import dao_session
+from .data import signed_media_token
+from . import error_responses
 from urllib.parse import parse_qs
+import time
+
+_MEDIA_ACCESS_ERRORS = {
+    ResponseCode.MISSING_MEDIA_AUTHORIZATION: error_responses.MISSING_MEDIA_AUTHORIZATION,
+    ResponseCode.INVALID_MEDIA_AUTHORIZATION: error_responses.INVALID_MEDIA_AUTHORIZATION,
+}
 
 def handle_has_media_access():
-    media_token = get_cropped_token(_get_token_from_request('Media-Authorization'))
+    status, code, headers = check_media_access(header_token = request.headers.get('Media-Authorization'), original_uri = request.headers.get('X-Original-URI'))
+    if (code in _MEDIA_ACCESS_ERRORS):
+        return error_responses.respond(_MEDIA_ACCESS_ERRORS[code], headers = headers)
+    return jsonify({'message':'Access Granted','code':code}), status, headers
+
+# shared with the media_access_wsgi fast path, needs an app context only
+def check_media_access(header_token: str, original_uri: str):
+    media_token = get_cropped_token(_get_token(header_token, original_uri, 'Media-Authorization'))
     if (media_token is None):
-        errorResponse = jsonify({'message':'Missing Authorization!','code':ResponseCode.MISSING_MEDIA_AUTHORIZATION})
-        return errorResponse, 401
-    user_id = dao_session.get_user_for_media_token(media_token=media_token)
-    if (user_id is None):
-        errorResponse = jsonify({'message':'Invalid Authorization!','code':ResponseCode.INVALID_MEDIA_AUTHORIZATION})
-        return errorResponse, 401
-    return jsonify({'message':'Access Granted','code': ResponseCode.SUCCESS_MEDIA_ACCESS}), 200
-
-def _get_token_from_request(key: str):
-    token = request.headers.get(key)
-    if (token is not None):
-        return token
-    original_uri = request.headers.get('X-Original-URI')
+        return 401, ResponseCode.MISSING_MEDIA_AUTHORIZATION, _get_denied_cache_headers()
+    user_and_expiration = _get_user_and_expiration_for_media_token(media_token, original_uri)
+    if (user_and_expiration is None):
+        return 401, ResponseCode.INVALID_MEDIA_AUTHORIZATION, _get_denied_cache_headers()
+    expires_at = user_and_expiration[1]
+    return 200, ResponseCode.SUCCESS_MEDIA_ACCESS, _get_granted_cache_headers(expires_at)
+
+def _get_user_and_expiration_for_media_token(media_token: str, original_uri: str):
+    if signed_media_token.is_enabled() and signed_media_token.is_signed(media_token):
+        claims = signed_media_token.verify(media_token, path = _get_path(original_uri))
+        if claims is None:
+            return None
+        return (claims['user_id'], claims['expires_at'])
+    return dao_session.get_user_and_expiration_for_media_token(media_token=media_token)
+
+# nginx may cache the authorization (see nginx-proxy-config-auth-cache), never past the token's expiration
+# and never longer than MEDIA_ACCESS_CACHE_MAX_AGE_IN_SECONDS, which is how late a logout can take effect
+def _get_granted_cache_headers(expires_at: float):
+    max_age = current_app.config.get('MEDIA_ACCESS_CACHE_MAX_AGE_IN_SECONDS') or 0
+    if max_age <= 0:
+        return {}
+    max_age = max(0, min(max_age, int(expires_at - time.time())))
+    return _cache_headers(max_age)
+
+def _get_denied_cache_headers():
+    max_age = current_app.config.get('MEDIA_ACCESS_DENIED_CACHE_IN_SECONDS') or 0
+    if max_age <= 0:
+        return {}
+    return _cache_headers(max_age)
+
+def _cache_headers(max_age: int):
+    return {'X-Accel-Expires': str(max_age), 'Cache-Control': 'private, max-age={}'.format(max_age)}
+
+def _get_path(original_uri: str):
+    if not isinstance(original_uri,str):
+        return None
+    return original_uri.split('?')[0]
+
+def _get_token(header_token: str, original_uri: str, key: str):
+    if (header_token is not None):
+        return header_token
     if not isinstance(original_uri,str):
         return None
     query_string = original_uri[original_uri.find('?')+1:]
@@ -0,0 +1,36 @@
+import time
+from flask import g
+from .flask_project import create_app
+from . import media_access_requests
+from . import metrics
+
+_STATUS_LINES = {
+    200: '200 OK',
+    401: '401 UNAUTHORIZED',
+}
+_METRICS_ROUTE = '(media-access-wsgi)'
+
+# Bare WSGI callable answering nginx's media authorization subrequests with an empty body.
+# It skips Flask's request dispatching and JSON serialization, but shares the token parsing
+# and the DAO with the /has_media_access route. Served by its own uWSGI pool, see home-vod-media-access.ini.
+def create_media_access_app(test_config=None):
+    app = create_app(test_config)
+    process_metrics = metrics.get_process_metrics(app)
+
+    # recorded like the after_request hook of the Flask app records its routes
+    def media_access_app(environ, start_response):
+        started_at = time.perf_counter()
+        with app.app_context():
+            g.metrics_route = _METRICS_ROUTE
+            status, code, headers = media_access_requests.check_media_access(
+                header_token = environ.get('HTTP_MEDIA_AUTHORIZATION'),
+                original_uri = environ.get('HTTP_X_ORIGINAL_URI'),
+            )
+            if process_metrics is not None:
+                process_metrics.record_request(_METRICS_ROUTE, environ.get('REQUEST_METHOD'), status, time.perf_counter() - started_at)
+                process_metrics.flush(app)
+        start_response(_STATUS_LINES[status], [('Content-Length', '0')] + list(headers.items()))
+        return [b'']
+
+    media_access_app.flask_app = app
+    return media_access_app
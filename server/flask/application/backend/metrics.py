@@ -0,0 +1,321 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from secrets import token_hex
+from flask import request, g, has_app_context, has_request_context, Response
+from .data import db
+from .data import janitor
+from .data import password_hashing
+from .data import query_log
+from .data.session_cache import get_cache_stats
+
+_EXTENSION = 'metrics'
+_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+_BACKGROUND_ROUTE = '(background)'
+_UNMATCHED_ROUTE = '(unmatched)'
+_TOTAL_FILE = 'total.json'
+_LOCK_FILE = 'metrics.lock'
+
+# Counters of one process. Every process writes its own to <METRICS_DIRECTORY>/<pid>-<token>.json at most every
+# METRICS_FLUSH_INTERVAL_IN_SECONDS, /metrics sums the files of all uWSGI workers, so a worker's
+# latest requests may show up with that much delay. The token keeps a reused pid from overwriting the
+# file of a dead process, and the counters start from zero in every forked worker.
+class ProcessMetrics:
+    def __init__(self, directory: str, flush_interval: float):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._start_process()
+
+    def reset(self):
+        with self._lock:
+            self._start_process()
+
+    def _start_process(self):
+        self._pid = os.getpid()
+        self._file_path = os.path.join(self.directory, '{}-{}.json'.format(self._pid, token_hex(4)))
+        self._last_flush_at = 0
+        self._requests = {}
+        self._latency = {}
+        self._queries = {}
+
+    # called with the lock held
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._start_process()
+
+    def record_request(self, route: str, method: str, status: int, duration: float):
+        with self._lock:
+            self._ensure_process()
+            key = '\t'.join([route, method, str(status)])
+            self._requests[key] = self._requests.get(key, 0) + 1
+            histogram = self._latency.setdefault(route, [0] * (len(_LATENCY_BUCKETS) + 2))
+            for index, upper_bound in enumerate(_LATENCY_BUCKETS):
+                if duration <= upper_bound:
+                    histogram[index] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+
+    # count is 0 for the time fetching the rows of a statement already counted
+    def record_query(self, route: str, duration: float, count: int = 1):
+        with self._lock:
+            self._ensure_process()
+            counter = self._queries.setdefault(route, [0, 0.0])
+            counter[0] += count
+            counter[1] += duration
+
+    def snapshot(self, app):
+        with self._lock:
+            self._ensure_process()
+            snapshot = {
+                'requests': dict(self._requests),
+                'latency': {route: list(histogram) for route, histogram in self._latency.items()},
+                'queries': {route: list(counter) for route, counter in self._queries.items()},
+            }
+        snapshot['hashing'] = password_hashing.get_hashing_stats()
+        executor = password_hashing.get_executor_of(app)
+        executor_stats = {'rejected': 0, 'timed_out': 0} if executor is None else executor.stats()
+        snapshot['hashing_rejected'] = executor_stats['rejected'] + executor_stats['timed_out']
+        snapshot['caches'] = {name: {'hits': stats['hits'], 'misses': stats['misses']} for name, stats in get_cache_stats(app).items()}
+        statement_log = query_log.get_query_log_of(app)
+        statement_stats = {} if statement_log is None else statement_log.statement_stats()
+        snapshot['statements'] = {statement: [stats['count'], stats['total_seconds'], stats['max_seconds']] for statement, stats in statement_stats.items()}
+        janitor_stats = janitor.get_stats()
+        snapshot['janitor'] = {name: janitor_stats[name] for name in ['sweeps', 'total_deleted_rows', 'last_sweep_at', 'last_sweep_duration_in_seconds', 'last_sweep_deleted_rows']}
+        return snapshot
+
+    def flush(self, app, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_flush_at < self.flush_interval:
+            return
+        self._last_flush_at = now
+        snapshot = self.snapshot(app)
+        temporary_path = self._file_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary_path, self._file_path)
+
+def _sum_into(total: dict, snapshot: dict):
+    for key, count in snapshot['requests'].items():
+        total['requests'][key] = total['requests'].get(key, 0) + count
+    for route, histogram in snapshot['latency'].items():
+        current = total['latency'].setdefault(route, [0] * len(histogram))
+        total['latency'][route] = [a + b for a, b in zip(current, histogram)]
+    for route, counter in snapshot['queries'].items():
+        current = total['queries'].setdefault(route, [0, 0.0])
+        total['queries'][route] = [current[0] + counter[0], current[1] + counter[1]]
+    total['hashing']['calls'] += snapshot['hashing']['calls']
+    total['hashing']['total_seconds'] += snapshot['hashing']['total_seconds']
+    total['hashing_rejected'] += snapshot['hashing_rejected']
+    for name, stats in snapshot['caches'].items():
+        current = total['caches'].setdefault(name, {'hits': 0, 'misses': 0})
+        current['hits'] += stats['hits']
+        current['misses'] += stats['misses']
+    for statement, stats in snapshot.get('statements', {}).items():
+        current = total['statements'].setdefault(statement, [0, 0.0, 0.0])
+        total['statements'][statement] = [current[0] + stats[0], current[1] + stats[1], max(current[2], stats[2])]
+    _sum_janitor_into(total['janitor'], snapshot.get('janitor'))
+
+# only the worker holding the janitor lock sweeps, the last sweep is the latest one of any process
+def _sum_janitor_into(total: dict, stats: dict):
+    if stats is None:
+        return
+    total['sweeps'] += stats['sweeps']
+    for table, count in stats['total_deleted_rows'].items():
+        total['total_deleted_rows'][table] = total['total_deleted_rows'].get(table, 0) + count
+    if stats['last_sweep_at'] is not None and (total['last_sweep_at'] is None or stats['last_sweep_at'] > total['last_sweep_at']):
+        total['last_sweep_at'] = stats['last_sweep_at']
+        total['last_sweep_duration_in_seconds'] = stats['last_sweep_duration_in_seconds']
+        total['last_sweep_deleted_rows'] = dict(stats['last_sweep_deleted_rows'])
+
+def _empty_total():
+    return {'requests': {}, 'latency': {}, 'queries': {}, 'hashing': {'calls': 0, 'total_seconds': 0.0}, 'hashing_rejected': 0, 'caches': {}, 'statements': {},
+        'janitor': {'sweeps': 0, 'total_deleted_rows': {}, 'last_sweep_at': None, 'last_sweep_duration_in_seconds': None, 'last_sweep_deleted_rows': {}}}
+
+def _load(file_path: str):
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def _is_process_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# pid of a <pid>-<token>.json process file, None for total.json and foreign files
+def _get_pid(file_path: str):
+    try:
+        return int(os.path.basename(file_path)[:-len('.json')].split('-')[0])
+    except ValueError:
+        return None
+
+# The files of dead processes, restarted workers or a previous run, are summed into total.json and removed,
+# so the counters never go backwards. Holding the lock, no other /metrics request sees a file in both.
+def aggregate(directory: str):
+    if not os.path.isdir(directory):
+        return _empty_total()
+    total_path = os.path.join(directory, _TOTAL_FILE)
+    with open(os.path.join(directory, _LOCK_FILE), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        persistent_total = _load(total_path) or _empty_total()
+        live_files = []
+        dead_files = []
+        for file_path in glob.glob(os.path.join(directory, '*.json')):
+            pid = _get_pid(file_path)
+            if pid is None:
+                continue
+            (live_files if _is_process_alive(pid) else dead_files).append(file_path)
+        if len(dead_files) > 0:
+            for file_path in dead_files:
+                snapshot = _load(file_path)
+                if snapshot is not None:
+                    _sum_into(persistent_total, snapshot)
+            temporary_path = total_path + '.tmp'
+            with open(temporary_path, 'w') as file:
+                json.dump(persistent_total, file)
+            os.replace(temporary_path, total_path)
+            for file_path in dead_files:
+                os.remove(file_path)
+        total = _empty_total()
+        _sum_into(total, persistent_total)
+        for file_path in live_files:
+            snapshot = _load(file_path)
+            if snapshot is not None:
+                _sum_into(total, snapshot)
+    return total
+
+def _escape(value: str):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(name, _escape(str(value))) for name, value in labels.items()) + '}'
+
+def render(total: dict):
+    lines = [
+        '# HELP homevod_http_requests_total Requests by route, method and status.',
+        '# TYPE homevod_http_requests_total counter',
+    ]
+    for key, count in sorted(total['requests'].items()):
+        route, method, status = key.split('\t')
+        lines.append('homevod_http_requests_total{} {}'.format(_labels(route = route, method = method, status = status), count))
+
+    lines.append('# HELP homevod_http_request_duration_seconds Request latency by route.')
+    lines.append('# TYPE homevod_http_request_duration_seconds histogram')
+    for route, histogram in sorted(total['latency'].items()):
+        for upper_bound, count in zip(_LATENCY_BUCKETS, histogram):
+            lines.append('homevod_http_request_duration_seconds_bucket{} {}'.format(_labels(route = route, le = upper_bound), count))
+        lines.append('homevod_http_request_duration_seconds_bucket{} {}'.format(_labels(route = route, le = '+Inf'), histogram[-2]))
+        lines.append('homevod_http_request_duration_seconds_sum{} {}'.format(_labels(route = route), histogram[-1]))
+        lines.append('homevod_http_request_duration_seconds_count{} {}'.format(_labels(route = route), histogram[-2]))
+
+    lines.append('# HELP homevod_db_queries_total SQLite statements and commits by route.')
+    lines.append('# TYPE homevod_db_queries_total counter')
+    for route, counter in sorted(total['queries'].items()):
+        lines.append('homevod_db_queries_total{} {}'.format(_labels(route = route), counter[0]))
+    lines.append('# HELP homevod_db_query_duration_seconds_total Time spent in SQLite statements, commits and fetching rows by route.')
+    lines.append('# TYPE homevod_db_query_duration_seconds_total counter')
+    for route, counter in sorted(total['queries'].items()):
+        lines.append('homevod_db_query_duration_seconds_total{} {}'.format(_labels(route = route), counter[1]))
+
+    lines.append('# HELP homevod_password_hashing_total Password hashes and verifications.')
+    lines.append('# TYPE homevod_password_hashing_total counter')
+    lines.append('homevod_password_hashing_total {}'.format(total['hashing']['calls']))
+    lines.append('# HELP homevod_password_hashing_seconds_total Time spent hashing passwords, including the wait for a free slot.')
+    lines.append('# TYPE homevod_password_hashing_seconds_total counter')
+    lines.append('homevod_password_hashing_seconds_total {}'.format(total['hashing']['total_seconds']))
+    lines.append('# HELP homevod_password_hashing_rejected_total Hashes rejected because hashing was busy.')
+    lines.append('# TYPE homevod_password_hashing_rejected_total counter')
+    lines.append('homevod_password_hashing_rejected_total {}'.format(total['hashing_rejected']))
+
+    lines.append('# HELP homevod_cache_requests_total Cache lookups by cache and result.')
+    lines.append('# TYPE homevod_cache_requests_total counter')
+    for name, stats in sorted(total['caches'].items()):
+        lines.append('homevod_cache_requests_total{} {}'.format(_labels(cache = name, result = 'hit'), stats['hits']))
+        lines.append('homevod_cache_requests_total{} {}'.format(_labels(cache = name, result = 'miss'), stats['misses']))
+
+    # the statements of the slow query log, normalized like there, at most its _MAX_STATEMENTS distinct ones
+    lines.append('# HELP homevod_db_statement_executions_total Executions by SQLite statement.')
+    lines.append('# TYPE homevod_db_statement_executions_total counter')
+    for statement, stats in sorted(total['statements'].items()):
+        lines.append('homevod_db_statement_executions_total{} {}'.format(_labels(statement = statement), stats[0]))
+    lines.append('# HELP homevod_db_statement_duration_seconds_total Time spent by SQLite statement.')
+    lines.append('# TYPE homevod_db_statement_duration_seconds_total counter')
+    for statement, stats in sorted(total['statements'].items()):
+        lines.append('homevod_db_statement_duration_seconds_total{} {}'.format(_labels(statement = statement), stats[1]))
+    lines.append('# HELP homevod_db_statement_duration_seconds_max Slowest execution by SQLite statement.')
+    lines.append('# TYPE homevod_db_statement_duration_seconds_max gauge')
+    for statement, stats in sorted(total['statements'].items()):
+        lines.append('homevod_db_statement_duration_seconds_max{} {}'.format(_labels(statement = statement), stats[2]))
+
+    janitor_total = total['janitor']
+    lines.append('# HELP homevod_janitor_sweeps_total Sweeps of expired sessions and tokens.')
+    lines.append('# TYPE homevod_janitor_sweeps_total counter')
+    lines.append('homevod_janitor_sweeps_total {}'.format(janitor_total['sweeps']))
+    lines.append('# HELP homevod_janitor_deleted_rows_total Expired rows deleted by table.')
+    lines.append('# TYPE homevod_janitor_deleted_rows_total counter')
+    for table, count in sorted(janitor_total['total_deleted_rows'].items()):
+        lines.append('homevod_janitor_deleted_rows_total{} {}'.format(_labels(table = table), count))
+    if janitor_total['last_sweep_at'] is not None:
+        lines.append('# HELP homevod_janitor_last_sweep_timestamp_seconds Time the last sweep finished.')
+        lines.append('# TYPE homevod_janitor_last_sweep_timestamp_seconds gauge')
+        lines.append('homevod_janitor_last_sweep_timestamp_seconds {}'.format(janitor_total['last_sweep_at']))
+        lines.append('# HELP homevod_janitor_last_sweep_duration_seconds Duration of the last sweep.')
+        lines.append('# TYPE homevod_janitor_last_sweep_duration_seconds gauge')
+        lines.append('homevod_janitor_last_sweep_duration_seconds {}'.format(janitor_total['last_sweep_duration_in_seconds']))
+        lines.append('# HELP homevod_janitor_last_sweep_deleted_rows Rows deleted by the last sweep by table.')
+        lines.append('# TYPE homevod_janitor_last_sweep_deleted_rows gauge')
+        for table, count in sorted(janitor_total['last_sweep_deleted_rows'].items()):
+            lines.append('homevod_janitor_last_sweep_deleted_rows{} {}'.format(_labels(table = table), count))
+    return '\n'.join(lines) + '\n'
+
+# apps serving requests without Flask's routing, like media_access_wsgi, name their route in g.metrics_route
+def _get_route():
+    if has_app_context() and 'metrics_route' in g:
+        return g.metrics_route
+    if not has_request_context():
+        return _BACKGROUND_ROUTE
+    if request.url_rule is None:
+        return _UNMATCHED_ROUTE
+    return request.url_rule.rule
+
+def get_process_metrics(app):
+    return app.extensions.get(_EXTENSION)
+
+# METRICS_ENABLED turns on the hooks and /metrics. The files of a previous run are kept, /metrics folds them
+# into the total, so every uWSGI instance writing into the directory can be created at any time.
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    directory = app.config.get('METRICS_DIRECTORY') or os.path.join(app.instance_path, 'metrics')
+    os.makedirs(directory, exist_ok = True)
+    metrics = ProcessMetrics(directory, flush_interval = app.config.get('METRICS_FLUSH_INTERVAL_IN_SECONDS') or 5)
+    app.extensions[_EXTENSION] = metrics
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started_at = g.pop('metrics_started_at', None)
+        if started_at is not None:
+            metrics.record_request(_get_route(), request.method, response.status_code, time.perf_counter() - started_at)
+            metrics.flush(app)
+        return response
+
+    db.add_query_observer(app, lambda sql, params, duration: metrics.record_query(_get_route(), duration))
+    db.add_fetch_observer(app, lambda duration: metrics.record_query(_get_route(), duration, count = 0))
+
+    @app.route("/metrics", methods=['GET'])
+    def get_metrics():
+        metrics.flush(app, force = True)
+        return Response(render(aggregate(directory)), mimetype = 'text/plain; version=0.0.4')
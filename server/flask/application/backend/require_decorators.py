@@ -1,10 +1,10 @@
-from flask import request, jsonify, current_app
+from flask import request, current_app, g
 import functools
 from . import token_generator_util
 from .data import dao_users
 from .data.data_models import User
-from .data import dao_session
-from .data.data_models import ResponseCode
+from .data.data_models import DataError
+from . import error_responses
 
 def get_cropped_username(username: str):
     max_length = current_app.config['MAX_USERNAME_LENGTH']
@@ -46,13 +46,11 @@ def require_username_and_password(request_processor):
     def do_require_username_and_password():
         username = request.form.get('username')
         if username is None:
-            errorResponse = jsonify({'message':'Username cannot be empty!','code':ResponseCode.EMPTY_USERNAME})
-            return errorResponse, 400
+            return error_responses.respond(error_responses.EMPTY_USERNAME)
         
         password = request.form.get('password')
         if password is None:
-            errorResponse = jsonify({'message':'Password cannot be empty!','code':ResponseCode.EMPTY_PASSWORD})
-            return errorResponse, 400
+            return error_responses.respond(error_responses.EMPTY_PASSWORD)
         return request_processor(get_cropped_username(username), get_cropped_password(password))
     return do_require_username_and_password
 
@@ -61,8 +59,7 @@ def require_user_exists_by_username_and_password(request_processor):
     def do_require_user(username, password):
         user = dao_users.get_user_by_name_and_password(user_name = username, password = password)
         if user is None:
-            errorResponse = jsonify({'message':'User cannot be found!','code':ResponseCode.NOT_FOUND_USER})
-            return errorResponse, 400
+            return error_responses.respond(error_responses.NOT_FOUND_USER)
         return request_processor(user)
     return do_require_user
 
@@ -71,29 +68,31 @@ def requires_session(request_processor):
     def do_require_session():
         access_token = get_cropped_token(request.headers.get('Authorization'))
         if (access_token is None):
-            errorResponse = jsonify({'message':'Missing Authorization!','code':ResponseCode.MISSING_AUTHORIZATION})
-            return errorResponse, 401
+            return error_responses.respond(error_responses.MISSING_AUTHORIZATION)
 
-        user_id = dao_session.get_user_for_token(access_token)
-        if (user_id is None):
-            errorResponse = jsonify({'message':'Invalid Authorization!','code':ResponseCode.INVALID_AUTHORIZATION})
-            return errorResponse, 401
+        user = get_session_user(access_token)
+        if (user is None):
+            return error_responses.respond(error_responses.INVALID_AUTHORIZATION)
 
-        user = dao_users.get_user_by_id(user_id)
-        if user is None:
-            errorResponse = jsonify({'message':'Invalid Authorization!','code':ResponseCode.UNASSOCIATED_AUTHORIZATION})
-            return errorResponse, 400
+        if user is DataError.SESSION_WITHOUT_USER:
+            return error_responses.respond(error_responses.UNASSOCIATED_AUTHORIZATION)
         return request_processor(user)
     return do_require_session
 
+# memoized for the request, so the session is resolved only once however many times it is required
+def get_session_user(access_token: str):
+    session_users = g.setdefault('session_users', {})
+    if access_token not in session_users:
+        session_users[access_token] = dao_users.get_user_for_access_token(access_token)
+    return session_users[access_token]
+
 def require_otp_verification_after_session(request_processor):
     @functools.wraps(request_processor)
     def do_require_otp(user: User):
         one_time_password = get_cropped_otp(request.form.get('otp') or '')
         is_otp_ok = token_generator_util.verify_otp(user.otp_secret, one_time_password)
         if not is_otp_ok:
-            errorResponse = jsonify({'message':'Invalid Token!','code':ResponseCode.INVALID_OTP})
-            return errorResponse, 400
+            return error_responses.respond(error_responses.INVALID_OTP)
 
         return request_processor(user)
     return do_require_otp
@@ -102,8 +101,7 @@ def require_user_priviliged_after_session(request_processor):
     @functools.wraps(request_processor)
     def do_require_user_priviliged(user: User):
         if not user.privileged:
-            errorResponse = jsonify({'message':'Not Authorized!','code':ResponseCode.INVALID_REGISTRATION_TOKEN})
-            return errorResponse, 400
+            return error_responses.respond(error_responses.NOT_PRIVILEGED)
         return request_processor(user)
 
     return do_require_user_priviliged
\ No newline at end of file
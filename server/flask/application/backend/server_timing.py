@@ -0,0 +1,70 @@
+import json
+import time
+from flask import request, g
+from .data import db
+from .data import phase_timing
+
+_PHASES = ['db', 'hash', 'otp', 'json']
+
+# SERVER_TIMING_ENABLED adds a Server-Timing header with the time spent in SQLite, password hashing,
+# OTP verification and JSON encoding, and the whole request (app), to every response.
+# SERVER_TIMING_LOG additionally logs the same breakdown as one JSON line per request.
+def init_app(app):
+    if not app.config.get('SERVER_TIMING_ENABLED'):
+        return
+    is_logging = app.config.get('SERVER_TIMING_LOG') or False
+    db.add_query_observer(app, lambda sql, params, duration: phase_timing.add('db', duration))
+    db.add_fetch_observer(app, lambda duration: phase_timing.add('db', duration, count = 0))
+    _time_json_responses(app)
+
+    @app.before_request
+    def start_server_timing():
+        g.server_timing_started_at = time.perf_counter()
+        phase_timing.start()
+
+    @app.after_request
+    def add_server_timing(response):
+        started_at = g.pop('server_timing_started_at', None)
+        if started_at is None:
+            return response
+        total = time.perf_counter() - started_at
+        timings = phase_timing.get()
+        response.headers['Server-Timing'] = format_header(timings, total)
+        if is_logging:
+            app.logger.info(json.dumps(_log_entry(response, timings, total)))
+        return response
+
+def _time_json_responses(app):
+    create_response = app.json.response
+    def timed_response(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return create_response(*args, **kwargs)
+        finally:
+            phase_timing.add('json', time.perf_counter() - started_at)
+    app.json.response = timed_response
+
+def _milliseconds(seconds: float):
+    return round(seconds * 1000, 3)
+
+def format_header(timings: dict, total: float):
+    metrics = []
+    for phase in _PHASES:
+        if phase in timings:
+            duration, count = timings[phase]
+            metrics.append('{};dur={};desc="{}x"'.format(phase, _milliseconds(duration), count))
+    metrics.append('app;dur={}'.format(_milliseconds(total)))
+    return ', '.join(metrics)
+
+def _log_entry(response, timings: dict, total: float):
+    entry = {
+        'method': request.method,
+        'route': request.url_rule.rule if request.url_rule is not None else None,
+        'status': response.status_code,
+        'total_ms': _milliseconds(total),
+    }
+    for phase in _PHASES:
+        duration, count = timings.get(phase, (0.0, 0))
+        entry[phase + '_ms'] = _milliseconds(duration)
+        entry[phase + '_count'] = count
+    return entry
@@ -3,6 +3,8 @@ from flask import current_app
 import time
 import pyotp
 from .data.data_models import Session
+from .data import signed_media_token
+from .data import phase_timing
 
 def _get_byte_count():
     return current_app.config.get('SECRECT_BYTE_COUNT') or 64
@@ -16,17 +18,25 @@ def _get_refresh_expires_in():
 def _get_reset_password_expires_in():
     return current_app.config.get('RESET_PASSWORD_EXPIRATION_IN_SECONDS') or 2*86400
 
+def _get_media_token_path_prefix():
+    return current_app.config.get('MEDIA_TOKEN_PATH_PREFIX') or ''
+
 def generate_session(user_id, byte_count = None, access_expires_in = None, refresh_expires_in = None):
     byte_count = byte_count or _get_byte_count()
     access_expires_in = access_expires_in or _get_access_expires_in()
     refresh_expires_in = refresh_expires_in or _get_refresh_expires_in()
     current_time = time.time()
+    access_expires_at = access_expires_in + current_time
+    if signed_media_token.is_enabled():
+        media_token = signed_media_token.sign(user_id, access_expires_at, _get_media_token_path_prefix())
+    else:
+        media_token = token_urlsafe(byte_count)
     return Session(
         user_id = user_id,
         access_token = token_urlsafe(byte_count),
-        media_token = token_urlsafe(byte_count),
+        media_token = media_token,
         refresh_token = token_urlsafe(byte_count),
-        access_expires_at = access_expires_in + current_time,
+        access_expires_at = access_expires_at,
         refresh_expires_at = refresh_expires_in + current_time,
 	)
 
@@ -39,9 +49,12 @@ def generate_otp_secret():
     return pyotp.random_base32()
 
 def verify_otp(secret, otp_code):
+    started_at = time.perf_counter()
     totp = pyotp.TOTP(secret)
     timestampNow = time.time()
-    return totp.verify(otp_code, time.time(), 2)
+    is_valid = totp.verify(otp_code, time.time(), 2)
+    phase_timing.add('otp', time.perf_counter() - started_at)
+    return is_valid
 
 def get_url(secret, username):
     return pyotp.totp.TOTP(secret).provisioning_uri(name=username,issuer_name='FnivesVOD')
@@ -1,4 +1,6 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app, Response, stream_with_context
+from werkzeug.http import quote_etag
+import hashlib
 from .require_decorators import get_cropped_password
 from .require_decorators import get_cropped_otp
 from .require_decorators import get_cropped_key
@@ -11,22 +13,20 @@ from .data import dao_file_metadata
 from .data.data_models import User
 from .data.data_models import ResponseCode
 from .auth_requests import _jsonify_session as jsonify_session
+from . import error_responses
 
 def handle_change_password(user: User):
     password = get_cropped_password(request.form.get('password'))
     if password is None:
-        errorResponse = jsonify({'message':'Invalid Password!','code':ResponseCode.INVALID_PASSWORD})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_PASSWORD)
 
     new_password = get_cropped_password(request.form.get('new_password'))
     if new_password is None:
-        errorResponse = jsonify({'message':'New Password cannot be empty!','code':ResponseCode.INVALID_NEW_PASSWORD})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_NEW_PASSWORD)
 
     foundUser = dao_users.get_user_by_name_and_password(user_name = user.name, password = password)
     if (foundUser is None):
-        errorResponse = jsonify({'message':'Invalid Password!','code':ResponseCode.INVALID_PASSWORD})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.INVALID_PASSWORD)
         
     session = token_generator_util.generate_session(user.id)
     dao_users.update_user_password(user_id = user.id, new_password = new_password)
@@ -36,17 +36,14 @@ def handle_change_password(user: User):
 def handle_reset_password(username: str, password: str):
     reset_password_token = get_cropped_otp(request.form.get('reset_password_token'))
     if reset_password_token is None:
-        errorResponse = jsonify({'message':'Invalid Reset Password Token given!','code':ResponseCode.UNKNOWN_RESET_PASSWORD_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.UNKNOWN_RESET_PASSWORD_TOKEN)
 
     if dao_reset_password_tokens.is_valid_token(token = reset_password_token, username = username) is False:
-        errorResponse = jsonify({'message':'Invalid Reset Password Token given!','code':ResponseCode.UNKNOWN_RESET_PASSWORD_TOKEN})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.UNKNOWN_RESET_PASSWORD_TOKEN)
 
     foundUser = dao_users.get_user_by_name(username = username)
     if (foundUser is None):
-        errorResponse = jsonify({'message':'User cannot be found!','code':ResponseCode.NOT_FOUND_USER})
-        return errorResponse, 400
+        return error_responses.respond(error_responses.NOT_FOUND_USER)
 
     dao_users.update_user_password(user_id = foundUser.id, new_password = password)
 
@@ -57,15 +54,67 @@ def handle_reset_password(username: str, password: str):
 def handle_get_is_user_priviliged(user: User):
     return jsonify({'is_privileged': user.privileged}), 200
 
+# a null metadata deletes the key
 def handle_add_user_file_data(user: User):
     metadata_to_save = request.get_json(force=True, silent = True)
     if (metadata_to_save is not None and isinstance(metadata_to_save,dict)):
         dao_file_metadata_of_user.insert_metadata(user_id = user.id, metadata = metadata_to_save)
         return jsonify({'message': 'User\'s File MetaData Saved!', 'code': ResponseCode.SUCCESS_SAVED_USER_FILE_METADATA}), 200
-    return jsonify({'message': 'Couldn\'t save user\'s metadata!', 'code': ResponseCode.CANT_SAVE_USER_FILE_METADATA}), 400
+    return error_responses.respond(error_responses.CANT_SAVE_USER_FILE_METADATA)
 
+# without parameters every metadata is returned at once, `limit` and `after` page through it ordered by file_key,
+# with the file_key to continue after in the Next-After header, `stream=true` streams everything in one response.
+# `since` returns only the keys changed after that version, deleted keys as null.
+# The Metadata-Version header holds the version to sync since next time, it is read before the metadata,
+# so a concurrent write is at worst returned again by the next sync.
 def handle_get_user_file_data(user: User):
-    return jsonify(dao_file_metadata_of_user.get_metadata(user_id = user.id)), 200
+    version = dao_file_metadata_of_user.get_version(user_id = user.id)
+    # the version changes with every write of the user, the query string selects the representation
+    query_hash = hashlib.sha1(request.query_string).hexdigest()[0:16]
+    etag = '{}-{}-{}'.format(user.id, version, query_hash)
+    if (_is_not_modified(etag)):
+        return _not_modified_response(etag)
+    version_headers = {'Metadata-Version': str(version), 'ETag': quote_etag(etag)}
+    since = request.args.get('since')
+    if (since is not None):
+        since = _parse_non_negative_int(since)
+        if (since is None):
+            return error_responses.respond(error_responses.INVALID_SINCE_VERSION)
+        return jsonify(dao_file_metadata_of_user.get_changes_since(user_id = user.id, since = since)), 200, version_headers
+    if (request.args.get('stream') == 'true'):
+        return _stream_user_file_data(user), 200, version_headers
+    limit = request.args.get('limit')
+    if (limit is None):
+        return jsonify(dao_file_metadata_of_user.get_metadata(user_id = user.id)), 200, version_headers
+
+    max_limit = current_app.config.get('USER_FILE_METADATA_MAX_PAGE_SIZE') or 1000
+    limit = _parse_non_negative_int(limit)
+    if (limit is None or limit < 1):
+        return error_responses.respond(error_responses.INVALID_PAGE_LIMIT)
+    after = get_cropped_key(request.args.get('after'))
+    page, next_after = dao_file_metadata_of_user.get_metadata_page(user_id = user.id, limit = min(limit, max_limit), after = after)
+    headers = version_headers if next_after is None else {**version_headers, 'Next-After': next_after}
+    return jsonify(page), 200, headers
+
+def _parse_non_negative_int(value: str):
+    try:
+        value = int(value)
+    except ValueError:
+        return None
+    if (value < 0):
+        return None
+    return value
+
+def _stream_user_file_data(user: User):
+    json_provider = current_app.json
+    def generate():
+        separator = '{'
+        for file_key, metadata in dao_file_metadata_of_user.iterate_metadata(user_id = user.id):
+            yield separator + json_provider.dumps(file_key) + ':' + json_provider.dumps(metadata)
+            separator = ','
+        # jsonify ends the body with a newline too
+        yield '{}\n' if separator == '{' else '}\n'
+    return Response(stream_with_context(generate()), mimetype = 'application/json')
 
 
 def handle_add_file_metadata(user: User):
@@ -73,11 +122,39 @@ def handle_add_file_metadata(user: User):
     if (metadata_to_save is not None and isinstance(metadata_to_save,dict)):
         dao_file_metadata.insert_metadata(metadata = metadata_to_save)
         return jsonify({'message': 'File MetaData Saved!', 'code': ResponseCode.SUCCESS_SAVED_FILE_METADATA}), 200
-    return jsonify({'message': 'Couldn\'t save metadata!', 'code': ResponseCode.CANT_SAVE_FILE_METADATA}), 400
+    return error_responses.respond(error_responses.CANT_SAVE_FILE_METADATA)
 
 
 def handle_get_file_metadata(user: User):
     file_key = get_cropped_key(request.args.get('file_key'))
     if (file_key is None):
-        return jsonify({'message': 'Invalid FileKey (file_key)!', 'code': ResponseCode.INVALID_FILE_KEY}), 400        
-    return jsonify(dao_file_metadata.get_metadata(file_key = file_key)), 200    
\ No newline at end of file
+        return error_responses.respond(error_responses.INVALID_FILE_KEY)        
+    etag = str(dao_file_metadata.get_version(file_key = file_key))
+    if (_is_not_modified(etag)):
+        return _not_modified_response(etag)
+    return jsonify(dao_file_metadata.get_metadata(file_key = file_key)), 200, {'ETag': quote_etag(etag)}
+
+# checked before the metadata is read, so an unchanged poll costs one version lookup
+def _is_not_modified(etag: str):
+    return request.if_none_match.contains_weak(etag)
+
+def _not_modified_response(etag: str):
+    return Response(status = 304, headers = {'ETag': quote_etag(etag)})    
+
+# keys are sent as repeated `file_key` query parameters or as a JSON list in the POST body,
+# the response contains only the keys which have metadata
+def handle_get_file_metadata_batch(user: User):
+    if (request.method == 'POST'):
+        requested_keys = request.get_json(force=True, silent = True)
+    else:
+        requested_keys = request.args.getlist('file_key')
+    if (not isinstance(requested_keys, list) or len(requested_keys) == 0):
+        return error_responses.respond(error_responses.INVALID_FILE_KEY)
+
+    file_keys = list(dict.fromkeys(map(get_cropped_key, requested_keys)))
+    if (None in file_keys):
+        return error_responses.respond(error_responses.INVALID_FILE_KEY)
+    max_keys = current_app.config.get('FILE_METADATA_BATCH_LIMIT') or 500
+    if (len(file_keys) > max_keys):
+        return jsonify({'message': 'Too many FileKeys, at most {} are allowed!'.format(max_keys), 'code': ResponseCode.TOO_MANY_FILE_KEYS}), 400
+    return jsonify(dao_file_metadata.get_metadata_for_keys(file_keys = file_keys)), 200
\ No newline at end of file
@@ -0,0 +1,48 @@
+import argparse
+import json
+import timeit
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from backend import json_provider
+
+# Measures the encode and decode cost of the JSON providers on metadata shaped like the players' payloads.
+# Run it from the /server folder: `python -m benchmark.bench_json_provider --entries 5000`
+
+def create_user_metadata(entries: int):
+    metadata = {}
+    for index in range(entries):
+        progress = {'position': index * 37 % 5400, 'duration': 5400, 'watched': index % 3 == 0, 'audio': 'hun', 'subtitle': 'eng'}
+        metadata['/media/series/season-{}/episode-{}.mkv'.format(index // 20, index % 20)] = json.dumps(progress)
+    return metadata
+
+def _measure_ms(function, repeat: int):
+    return min(timeit.repeat(function, number = 1, repeat = repeat)) * 1000
+
+def run(entries: int, repeat: int):
+    metadata = create_user_metadata(entries)
+    app = Flask(__name__)
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if json_provider.is_orjson_available():
+        providers['orjson'] = json_provider.OrjsonJSONProvider(app)
+
+    results = {}
+    for name, provider in providers.items():
+        encoded = provider.dumps(metadata, separators = (',', ':'))
+        results[name] = {
+            'encode_ms': _measure_ms(lambda: provider.dumps(metadata, separators = (',', ':')), repeat),
+            'decode_ms': _measure_ms(lambda: provider.loads(encoded), repeat),
+            'size_in_bytes': len(encoded.encode('utf-8')),
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON Provider Benchmark ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--entries", type=int, default=5000, help="metadata entries in the payload")
+    parser.add_argument("--repeat", type=int, default=20, help="measurements per operation, the fastest is reported")
+    args = parser.parse_args()
+
+    results = run(args.entries, args.repeat)
+    for name, result in results.items():
+        print('{}: encode {:.2f} ms, decode {:.2f} ms, {} bytes'.format(name, result['encode_ms'], result['decode_ms'], result['size_in_bytes']))
+    if 'orjson' not in results:
+        print('orjson is not installed, only the standard library was measured')
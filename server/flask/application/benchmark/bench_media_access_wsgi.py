@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from werkzeug.test import Client
+from backend.data import db
+from backend.data import dao_session
+from backend.data import dao_users
+from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
+from backend.media_access_wsgi import create_media_access_app
+
+# Compares the /has_media_access Flask route with the minimal WSGI app answering the same check.
+# Run it from the /server folder: `python -m benchmark.bench_media_access_wsgi --requests 5000`
+
+# the production config.json with a temporary database, metrics and hashing slots and no janitor thread
+def _load_config(directory: str):
+    with open(os.path.join(os.path.dirname(__file__), '..', 'backend', 'config.json')) as config_file:
+        config = json.load(config_file)
+    return {
+        **config,
+        "DATABASE_PATH": os.path.join(directory, 'benchdb'),
+        "METRICS_DIRECTORY": os.path.join(directory, 'metrics'),
+        "PASSWORD_HASHING_SLOT_DIRECTORY": os.path.join(directory, 'hashing_slots'),
+        "EXPIRED_TOKEN_SWEEP_INTERVAL_IN_SECONDS": 0,
+    }
+
+def _seed(app, media_token: str):
+    with app.app_context():
+        db.init_db()
+        user_id = dao_users.insert_user(RegisteringUser(name = 'bench', password = 'bench', otp_secret = 'otp'))
+        far_future = time.time() + 3600
+        dao_session.insert_user_session(Session(user_id = user_id, access_token = 'access', media_token = media_token, refresh_token = 'refresh', access_expires_at = far_future, refresh_expires_at = far_future))
+        db.close_db()
+
+def _requests_per_second(client: Client, path: str, headers: dict, requests: int):
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers = headers)
+        response.close()
+    return requests / (time.perf_counter() - started_at)
+
+def run(requests: int):
+    with tempfile.TemporaryDirectory() as directory:
+        wsgi_app = create_media_access_app(_load_config(directory))
+        flask_app = wsgi_app.flask_app
+        _seed(flask_app, 'media')
+        headers = {'Media-Authorization': 'media'}
+        results = {
+            'flask': _requests_per_second(Client(flask_app), '/has_media_access', headers, requests),
+            'wsgi': _requests_per_second(Client(wsgi_app), '/', headers, requests),
+        }
+        db.close_persistent_connections()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Media Access Benchmark ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="authorized requests sent to each app")
+    args = parser.parse_args()
+
+    results = run(args.requests)
+    for name, requests_per_second in results.items():
+        print('{}: {:.0f} requests/s'.format(name, requests_per_second))
+    print('speedup: {:.2f}x'.format(results['wsgi'] / results['flask']))
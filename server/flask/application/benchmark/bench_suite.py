@@ -0,0 +1,349 @@
+import argparse
+import json
+import itertools
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import pyotp
+from backend.flask_project import create_app
+from backend.data import db
+from backend.data import dao_session
+from backend.data import dao_users
+from backend.data import dao_file_metadata
+from backend.data import dao_file_metadata_of_user
+from backend.data import dao_registration_tokens
+from backend.data import dao_reset_password_tokens
+from backend.data import dao_revoked_media_tokens
+from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
+
+# Times every route through the test client and every DAO function directly, on databases seeded with
+# each of the given session counts and a large metadata map. Results can be saved as a JSON baseline
+# and later runs compared against it, cases slower than the threshold are reported as regressions.
+# Run it from the /server folder:
+# `python -m benchmark.bench_suite --sessions 100 10000 --save baseline.json`
+# `python -m benchmark.bench_suite --sessions 100 10000 --compare baseline.json --threshold 0.2`
+
+_PASSWORD = 'bench'
+_OTP_SECRET = 'base32secret3232'
+_FAR_FUTURE = time.time() + 30 * 86400
+# cases hashing passwords run this fraction of the iterations
+_HASHING_ITERATIONS_DIVISOR = 10
+
+class Case:
+    def __init__(self, name: str, run, prepare = None, is_hashing: bool = False, expected_status: int = 200):
+        self.name = name
+        self.run = run
+        self.prepare = prepare
+        self.is_hashing = is_hashing
+        self.expected_status = expected_status
+
+# the production config.json with a temporary database and hashing slots, no janitor thread and no metrics files
+def _load_config(directory: str):
+    with open(os.path.join(os.path.dirname(__file__), '..', 'backend', 'config.json')) as config_file:
+        config = json.load(config_file)
+    return {
+        **config,
+        "DATABASE_PATH": os.path.join(directory, 'benchdb'),
+        "PASSWORD_HASHING_SLOT_DIRECTORY": os.path.join(directory, 'hashing_slots'),
+        "EXPIRED_TOKEN_SWEEP_INTERVAL_IN_SECONDS": 0,
+        "SESSION_CACHE_BACKEND": 'local',
+        "METRICS_ENABLED": False,
+        "SLOW_QUERY_THRESHOLD_IN_MS": None,
+    }
+
+def _session(index: int, user_id: int, prefix: str = ''):
+    return Session(
+        user_id = user_id,
+        access_token = '{}access{}'.format(prefix, index),
+        media_token = '{}media{}'.format(prefix, index),
+        refresh_token = '{}refresh{}'.format(prefix, index),
+        access_expires_at = _FAR_FUTURE,
+        refresh_expires_at = _FAR_FUTURE,
+    )
+
+def _session_row(session: Session):
+    return (session.user_id, session.access_token, session.media_token, session.refresh_token, session.access_expires_at, session.refresh_expires_at)
+
+def _metadata(entries: int, prefix: str = '/media/series'):
+    return {'{}/season-{}/episode-{}.mkv'.format(prefix, index // 20, index % 20): json.dumps({'position': index * 37 % 5400, 'duration': 5400}) for index in range(entries)}
+
+# Named users are created through the DAO, the bulk of users share the admin's password hash,
+# so seeding does not pay a production hash per user. Session i belongs to bulk user i % users.
+class Fixture:
+    def __init__(self, app, sessions: int, metadata_entries: int):
+        self.app = app
+        self.sessions = sessions
+        self.metadata_entries = metadata_entries
+        with app.app_context():
+            db.init_db()
+            self.admin_id = self._insert_user('admin', privileged = True)
+            self.changer_id = self._insert_user('changer')
+            self.resetter_id = self._insert_user('resetter')
+            self.verifier_id = self._insert_user('verifier')
+            connection = db.get_db()
+            password_hash = connection.execute("SELECT password FROM user WHERE id = ?", (self.admin_id,)).fetchone()[0]
+            self.users = max(1, sessions // 10)
+            connection.executemany(
+                "INSERT INTO user(username, password, otp_secret, privileged, was_otp_verified) VALUES(?, ?, ?, 0, 1)",
+                (('user{}'.format(index), password_hash, _OTP_SECRET) for index in range(self.users)))
+            first_bulk_user_id = connection.execute("SELECT id FROM user WHERE username = 'user0'").fetchone()[0]
+            connection.executemany(
+                "INSERT INTO session(user_id, access_token, media_token, refresh_token, access_expires_at, refresh_expires_at) VALUES(?, ?, ?, ?, ?, ?)",
+                (_session_row(_session(index, first_bulk_user_id + index % self.users)) for index in range(sessions)))
+            connection.commit()
+            dao_session.insert_user_session(_session(0, self.admin_id, prefix = 'admin'))
+            dao_file_metadata_of_user.insert_metadata(user_id = self.admin_id, metadata = _metadata(metadata_entries))
+            dao_file_metadata.insert_metadata(metadata = _metadata(metadata_entries))
+            db.close_db()
+
+    def _insert_user(self, name: str, privileged: bool = False):
+        return dao_users.insert_user(RegisteringUser(name = name, password = _PASSWORD, otp_secret = _OTP_SECRET, privileged = privileged, was_otp_verified = True))
+
+    # spreads the lookups over the seeded sessions, so the session cache does not answer all of them. The iteration
+    # numbers keep counting across cases, so a case does not find the keys of the case before it cached
+    def session_index(self, iteration: int):
+        return iteration * 7919 % self.sessions
+
+    def access_token(self, iteration: int):
+        return 'access{}'.format(self.session_index(iteration))
+
+    def media_token(self, iteration: int):
+        return 'media{}'.format(self.session_index(iteration))
+
+    def refresh_token(self, iteration: int):
+        return 'refresh{}'.format(self.session_index(iteration))
+
+    def user_id(self, iteration: int):
+        return self.admin_id + 4 + iteration % self.users
+
+# users to delete, without the cost of hashing a password
+def _insert_bare_user(name: str):
+    connection = db.get_db()
+    connection.execute("INSERT INTO user(username, password, otp_secret, privileged, was_otp_verified) VALUES(?, '', ?, 0, 0)", (name, _OTP_SECRET))
+    connection.commit()
+
+def _otp():
+    return pyotp.TOTP(_OTP_SECRET).now()
+
+def _route_cases(fixture: Fixture, client):
+    admin = {'Authorization': 'adminaccess0'}
+    keys = list(_metadata(fixture.metadata_entries).keys())
+    def insert_session(prefix: str, user_id: int):
+        return lambda iteration: dao_session.insert_user_session(_session(iteration, user_id, prefix = prefix))
+    return [
+        Case('route POST /register',
+            prepare = lambda iteration: dao_registration_tokens.insert_token('reg{}'.format(iteration)),
+            run = lambda iteration: client.post('/register', data = {'username': 'registered{}'.format(iteration), 'password': _PASSWORD, 'otp': 'reg{}'.format(iteration)}),
+            is_hashing = True),
+        Case('route POST /otp_verification',
+            run = lambda iteration: client.post('/otp_verification', data = {'username': 'verifier', 'password': _PASSWORD, 'otp': _otp()}),
+            is_hashing = True),
+        Case('route POST /login',
+            run = lambda iteration: client.post('/login', data = {'username': 'admin', 'password': _PASSWORD}),
+            is_hashing = True),
+        Case('route POST /logout',
+            prepare = insert_session('logout', fixture.admin_id),
+            run = lambda iteration: client.post('/logout', headers = {'Authorization': 'logoutaccess{}'.format(iteration)})),
+        Case('route POST /refresh/token',
+            prepare = insert_session('refresh', fixture.admin_id),
+            run = lambda iteration: client.post('/refresh/token', data = {'refresh_token': 'refreshrefresh{}'.format(iteration)})),
+        Case('route GET /user/is_privileged',
+            run = lambda iteration: client.get('/user/is_privileged', headers = {'Authorization': fixture.access_token(iteration)})),
+        Case('route POST /change/password',
+            prepare = insert_session('change', fixture.changer_id),
+            run = lambda iteration: client.post('/change/password', headers = {'Authorization': 'changeaccess{}'.format(iteration)}, data = {'password': _PASSWORD, 'new_password': _PASSWORD, 'otp': _otp()}),
+            is_hashing = True),
+        Case('route POST /reset/password',
+            prepare = lambda iteration: dao_reset_password_tokens.insert_token(token = 'reset{}'.format(iteration), username = 'resetter', expires_at = _FAR_FUTURE),
+            run = lambda iteration: client.post('/reset/password', data = {'username': 'resetter', 'password': _PASSWORD, 'reset_password_token': 'reset{}'.format(iteration)}),
+            is_hashing = True),
+        Case('route POST /user/file/metadata',
+            run = lambda iteration: client.post('/user/file/metadata', headers = admin, json = {keys[iteration % len(keys)]: json.dumps({'position': iteration})})),
+        Case('route GET /user/file/metadata',
+            run = lambda iteration: client.get('/user/file/metadata', headers = admin)),
+        Case('route GET /user/file/metadata?limit=100',
+            run = lambda iteration: client.get('/user/file/metadata?limit=100', headers = admin)),
+        Case('route GET /user/file/metadata?since',
+            run = lambda iteration: client.get('/user/file/metadata?since={}'.format(fixture.metadata_entries), headers = admin)),
+        Case('route POST /file/metadata',
+            run = lambda iteration: client.post('/file/metadata', headers = admin, json = {keys[iteration % len(keys)]: json.dumps({'position': iteration})})),
+        Case('route GET /file/metadata',
+            run = lambda iteration: client.get('/file/metadata', headers = admin, query_string = {'file_key': keys[iteration % len(keys)]})),
+        Case('route POST /file/metadata/batch',
+            run = lambda iteration: client.post('/file/metadata/batch', headers = admin, json = keys[:500])),
+        Case('route POST /admin/registration_token',
+            run = lambda iteration: client.post('/admin/registration_token', headers = admin, data = {'registration_token': 'admin-reg{}'.format(iteration), 'otp': _otp()})),
+        Case('route POST /admin/reset_password_token',
+            run = lambda iteration: client.post('/admin/reset_password_token', headers = admin, data = {'reset_password_token': 'admin-reset{}'.format(iteration), 'username_to_reset': 'resetter', 'otp': _otp()})),
+        Case('route POST /admin/reset_otp_verification',
+            run = lambda iteration: client.post('/admin/reset_otp_verification', headers = admin, data = {'username_to_reset': 'user{}'.format(iteration % fixture.users), 'otp': _otp()})),
+        Case('route GET /admin/get_users',
+            run = lambda iteration: client.get('/admin/get_users', headers = admin)),
+        Case('route GET /admin/get_registration_tokens',
+            run = lambda iteration: client.get('/admin/get_registration_tokens', headers = admin)),
+        Case('route POST /admin/delete/user',
+            prepare = lambda iteration: _insert_bare_user('deleted{}'.format(iteration)),
+            run = lambda iteration: client.post('/admin/delete/user', headers = admin, data = {'username_to_delete': 'deleted{}'.format(iteration), 'otp': _otp()})),
+        Case('route POST /admin/delete/registration_token',
+            prepare = lambda iteration: dao_registration_tokens.insert_token('deleted-reg{}'.format(iteration)),
+            run = lambda iteration: client.post('/admin/delete/registration_token', headers = admin, data = {'registration_token': 'deleted-reg{}'.format(iteration), 'otp': _otp()})),
+        Case('route GET /has_media_access',
+            run = lambda iteration: client.get('/has_media_access', headers = {'X-Original-URI': '/media/movie.mkv?Media-Authorization={}'.format(fixture.media_token(iteration))})),
+    ]
+
+def _dao_cases(fixture: Fixture):
+    keys = list(_metadata(fixture.metadata_entries).keys())
+    def insert_session(prefix: str):
+        return lambda iteration: dao_session.insert_user_session(_session(iteration, fixture.admin_id, prefix = prefix))
+    def get_user_id(name: str):
+        return db.get_db().execute("SELECT id FROM user WHERE username = ?", (name,)).fetchone()[0]
+    return [
+        Case('dao_session.get_user_and_expiration_for_media_token', lambda iteration: dao_session.get_user_and_expiration_for_media_token(fixture.media_token(iteration))),
+        Case('dao_session.get_user_for_refresh_token', lambda iteration: dao_session.get_user_for_refresh_token(fixture.refresh_token(iteration))),
+        Case('dao_session.insert_user_session', lambda iteration: dao_session.insert_user_session(_session(iteration, fixture.admin_id, prefix = 'dao-insert'))),
+        Case('dao_session.delete_user_session', prepare = insert_session('dao-delete'), run = lambda iteration: dao_session.delete_user_session('dao-deleteaccess{}'.format(iteration))),
+        Case('dao_session.delete_all_user_session_by_user_id', lambda iteration: dao_session.delete_all_user_session_by_user_id(fixture.resetter_id)),
+        Case('dao_session.create_new_single_session', lambda iteration: dao_session.create_new_single_session(_session(iteration, fixture.verifier_id, prefix = 'dao-single'))),
+        Case('dao_session.swap_refresh_session', prepare = insert_session('dao-swap'), run = lambda iteration: dao_session.swap_refresh_session('dao-swaprefresh{}'.format(iteration), _session(iteration, fixture.admin_id, prefix = 'dao-swapped'))),
+        Case('dao_users.get_user_by_id', lambda iteration: dao_users.get_user_by_id(fixture.user_id(iteration))),
+        Case('dao_users.get_user_for_access_token', lambda iteration: dao_users.get_user_for_access_token(fixture.access_token(iteration))),
+        Case('dao_users.get_user_by_name', lambda iteration: dao_users.get_user_by_name('user{}'.format(iteration % fixture.users))),
+        Case('dao_users.get_user_by_name_and_password', lambda iteration: dao_users.get_user_by_name_and_password('admin', _PASSWORD), is_hashing = True),
+        Case('dao_users.get_users', lambda iteration: list(dao_users.get_users())),
+        Case('dao_users.insert_user', lambda iteration: dao_users.insert_user(RegisteringUser(name = 'dao-user{}'.format(iteration), password = _PASSWORD, otp_secret = _OTP_SECRET)), is_hashing = True),
+        Case('dao_users.update_user_privilige', lambda iteration: dao_users.update_user_privilige(fixture.user_id(iteration), False)),
+        Case('dao_users.update_user_otp_verification', lambda iteration: dao_users.update_user_otp_verification(fixture.user_id(iteration), True)),
+        Case('dao_users.update_user_password', lambda iteration: dao_users.update_user_password(fixture.changer_id, _PASSWORD), is_hashing = True),
+        Case('dao_users.delete_user_by_id', prepare = lambda iteration: _insert_bare_user('dao-deleted{}'.format(iteration)), run = lambda iteration: dao_users.delete_user_by_id(get_user_id('dao-deleted{}'.format(iteration)))),
+        Case('dao_file_metadata.insert_metadata', lambda iteration: dao_file_metadata.insert_metadata({keys[iteration % len(keys)]: json.dumps({'position': iteration})})),
+        Case('dao_file_metadata.get_version', lambda iteration: dao_file_metadata.get_version(keys[iteration % len(keys)])),
+        Case('dao_file_metadata.get_metadata', lambda iteration: dao_file_metadata.get_metadata(keys[iteration % len(keys)])),
+        Case('dao_file_metadata.get_metadata_for_keys', lambda iteration: dao_file_metadata.get_metadata_for_keys(keys[:500])),
+        Case('dao_file_metadata_of_user.insert_metadata', lambda iteration: dao_file_metadata_of_user.insert_metadata(fixture.admin_id, {keys[iteration % len(keys)]: json.dumps({'position': iteration})})),
+        Case('dao_file_metadata_of_user.get_metadata', lambda iteration: dao_file_metadata_of_user.get_metadata(fixture.admin_id)),
+        Case('dao_file_metadata_of_user.get_version', lambda iteration: dao_file_metadata_of_user.get_version(fixture.admin_id)),
+        Case('dao_file_metadata_of_user.get_changes_since', lambda iteration: dao_file_metadata_of_user.get_changes_since(fixture.admin_id, fixture.metadata_entries)),
+        Case('dao_file_metadata_of_user.get_metadata_page', lambda iteration: dao_file_metadata_of_user.get_metadata_page(fixture.admin_id, limit = 100, after = keys[iteration % len(keys)])),
+        Case('dao_file_metadata_of_user.iterate_metadata', lambda iteration: sum(1 for _ in dao_file_metadata_of_user.iterate_metadata(fixture.admin_id))),
+        Case('dao_registration_tokens.is_valid_token', lambda iteration: dao_registration_tokens.is_valid_token('reg{}'.format(iteration))),
+        Case('dao_registration_tokens.insert_token', lambda iteration: dao_registration_tokens.insert_token('dao-reg{}'.format(iteration))),
+        Case('dao_registration_tokens.delete_token', prepare = lambda iteration: dao_registration_tokens.insert_token('dao-deleted-reg{}'.format(iteration)), run = lambda iteration: dao_registration_tokens.delete_token('dao-deleted-reg{}'.format(iteration))),
+        Case('dao_registration_tokens.get_tokens', lambda iteration: dao_registration_tokens.get_tokens()),
+        Case('dao_reset_password_tokens.is_valid_token', lambda iteration: dao_reset_password_tokens.is_valid_token('reset{}'.format(iteration), 'resetter')),
+        Case('dao_reset_password_tokens.insert_token', lambda iteration: dao_reset_password_tokens.insert_token('dao-reset{}'.format(iteration), 'user{}'.format(iteration % fixture.users), _FAR_FUTURE)),
+        Case('dao_reset_password_tokens.delete_tokens', lambda iteration: dao_reset_password_tokens.delete_tokens('user{}'.format(iteration % fixture.users))),
+        Case('dao_revoked_media_tokens.get_revoked_token_ids', lambda iteration: dao_revoked_media_tokens.get_revoked_token_ids()),
+    ]
+
+def _call(app, case: Case, iteration: int):
+    with app.app_context():
+        if case.prepare is not None:
+            case.prepare(iteration)
+        started_at = time.perf_counter()
+        result = case.run(iteration)
+        duration = time.perf_counter() - started_at
+    status_code = getattr(result, 'status_code', None)
+    if status_code is not None and status_code != case.expected_status:
+        raise RuntimeError('{} answered {}: {}'.format(case.name, status_code, result.get_data(as_text = True)[:200]))
+    return duration
+
+# the warm-up calls are not measured, the median is the lowest of the medians of the repeated runs, the one
+# least disturbed by the rest of the machine. Every call takes the next number of the shared iteration counter,
+# so no case reads session keys an earlier case left in the cache, and the rows prepared under it stay unique
+def _measure(app, case: Case, iterations: int, warmup_iterations: int, repeats: int, iteration_numbers):
+    if case.is_hashing:
+        iterations = max(1, iterations // _HASHING_ITERATIONS_DIVISOR)
+        warmup_iterations = max(1, warmup_iterations // _HASHING_ITERATIONS_DIVISOR)
+    for _ in range(warmup_iterations):
+        _call(app, case, next(iteration_numbers))
+    medians = []
+    durations = []
+    for _ in range(repeats):
+        run_durations = [_call(app, case, next(iteration_numbers)) for _ in range(iterations)]
+        medians.append(statistics.median(run_durations))
+        durations.extend(run_durations)
+    durations.sort()
+    return {
+        'iterations': iterations,
+        'repeats': repeats,
+        'median_ms': round(min(medians) * 1000, 4),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000, 4),
+    }
+
+def run_size(sessions: int, metadata_entries: int, iterations: int, warmup_iterations: int, repeats: int, name_filter: str = None):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(_load_config(directory))
+        fixture = Fixture(app, sessions, metadata_entries)
+        client = app.test_client()
+        iteration_numbers = itertools.count()
+        for case in _route_cases(fixture, client) + _dao_cases(fixture):
+            if name_filter is not None and name_filter not in case.name:
+                continue
+            results[case.name] = _measure(app, case, iterations, warmup_iterations, repeats, iteration_numbers)
+        db.close_persistent_connections()
+    return results
+
+def run(sizes: list, metadata_entries: int, iterations: int, warmup_iterations: int, repeats: int, name_filter: str = None):
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'metadata_entries': metadata_entries,
+        },
+        'results': {'sessions={}'.format(sessions): run_size(sessions, metadata_entries, iterations, warmup_iterations, repeats, name_filter) for sessions in sizes},
+    }
+
+# (size, case, baseline median, current median) of the cases whose median grew by more than threshold,
+# and by at least min_difference_ms, so the noise of sub-millisecond cases is not reported
+def compare(baseline: dict, current: dict, threshold: float, min_difference_ms: float = 0):
+    regressions = []
+    for size, cases in current['results'].items():
+        for name, result in cases.items():
+            baseline_result = baseline['results'].get(size, {}).get(name)
+            if baseline_result is None:
+                continue
+            difference_ms = result['median_ms'] - baseline_result['median_ms']
+            if result['median_ms'] > baseline_result['median_ms'] * (1 + threshold) and difference_ms >= min_difference_ms:
+                regressions.append((size, name, baseline_result['median_ms'], result['median_ms']))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Suite ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 10000], help="seeded session counts, every one is a separate run, 1000000 takes a while to seed")
+    parser.add_argument("--metadata-entries", type=int, default=10000, help="entries of the seeded user and global metadata maps")
+    parser.add_argument("--iterations", type=int, default=50, help="measured calls per case and run, cases hashing passwords run a tenth")
+    parser.add_argument("--warmup-iterations", type=int, default=5, help="unmeasured calls before the runs of a case, cases hashing passwords run a tenth")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per case, the lowest of their medians is reported")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this")
+    parser.add_argument("--save", default=None, help="write the results as a JSON baseline to this file")
+    parser.add_argument("--compare", default=None, help="JSON baseline to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative median slowdown reported as regression")
+    parser.add_argument("--min-difference-ms", type=float, default=0.2, help="smaller median slowdowns are never reported, sub-millisecond cases swing by about a tenth of a millisecond between runs")
+    args = parser.parse_args()
+
+    current = run(args.sessions, args.metadata_entries, args.iterations, args.warmup_iterations, args.repeats, args.filter)
+    for size, cases in current['results'].items():
+        print(size)
+        for name, result in cases.items():
+            print('  {:<55} median {:>9.3f} ms  p95 {:>9.3f} ms'.format(name, result['median_ms'], result['p95_ms']))
+    if args.save is not None:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(current, baseline_file, indent = 2)
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['environment'] != current['environment']:
+            print('WARNING the baseline was measured in a different environment: {}'.format(baseline['environment']))
+        regressions = compare(baseline, current, args.threshold, args.min_difference_ms)
+        for size, name, baseline_ms, current_ms in regressions:
+            print('REGRESSION {} {}: {:.3f} ms -> {:.3f} ms'.format(size, name, baseline_ms, current_ms))
+        if len(regressions) > 0:
+            sys.exit(1)
+        print('no regressions above {:.0%}'.format(args.threshold))
@@ -0,0 +1,282 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+from werkzeug.serving import make_server
+from backend.flask_project import create_app
+from backend.data import db
+from backend.data import dao_session
+from backend.data import dao_users
+from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
+
+# Simulates video players against one box: every player asks /has_media_access for each range request of its
+# video, the way nginx does with X-Original-URI and the media token in the query, and regularly POSTs its
+# playback progress to /user/file/metadata. Reports throughput, p50/p95/p99 latency and SQLITE_BUSY errors.
+# Run it from the /server folder: `python -m benchmark.load_test --players 50 --duration 30`
+# `--server uwsgi` starts the app with uWSGI like home-vod-server.ini, `--server werkzeug` runs it in this
+# process, where the players compete with the server for the GIL, so its numbers are a lower bound.
+
+_BUSY_HEADER = 'X-Load-Test-Sqlite-Busy'
+_APPLICATION_DIRECTORY = os.path.join(os.path.dirname(__file__), '..')
+
+# the production config.json with a temporary database, metrics and hashing slots and no janitor thread
+def _load_config(directory: str):
+    with open(os.path.join(_APPLICATION_DIRECTORY, 'backend', 'config.json')) as config_file:
+        config = json.load(config_file)
+    return {
+        **config,
+        "DATABASE_PATH": os.path.join(directory, 'loadtestdb'),
+        "METRICS_DIRECTORY": os.path.join(directory, 'metrics'),
+        "PASSWORD_HASHING_SLOT_DIRECTORY": os.path.join(directory, 'hashing_slots'),
+        "EXPIRED_TOKEN_SWEEP_INTERVAL_IN_SECONDS": 0,
+    }
+
+# locked database errors are answered with a marker header, so the players can count them in any server
+def create_load_test_app(config: dict):
+    app = create_app(config)
+
+    @app.errorhandler(sqlite3.OperationalError)
+    def count_sqlite_busy(e):
+        message = str(e)
+        is_busy = 'locked' in message or 'busy' in message
+        return 'database error', 500, {_BUSY_HEADER: '1' if is_busy else '0'}
+
+    return app
+
+# the seeded users skip the production hash rounds, logins are not part of the load
+def _seed(config: dict, users: int):
+    app = create_app({**config, "PASSWORD_SCHEMES": ['sha256_crypt'], "PASSWORD_SCHEME_SETTINGS": {'sha256_crypt__default_rounds': 1000}})
+    sessions = []
+    far_future = time.time() + 86400
+    with app.app_context():
+        db.init_db()
+        for index in range(users):
+            user_id = dao_users.insert_user(RegisteringUser(name = 'player{}'.format(index), password = 'load-test', otp_secret = 'base32secret3232'))
+            session = Session(
+                user_id = user_id,
+                access_token = 'access{}'.format(index),
+                media_token = 'media{}'.format(index),
+                refresh_token = 'refresh{}'.format(index),
+                access_expires_at = far_future,
+                refresh_expires_at = far_future,
+            )
+            dao_session.insert_user_session(session)
+            sessions.append(session)
+        db.close_db()
+    db.close_persistent_connections()
+    return sessions
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def _wait_until_listening(port: int, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout = 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start listening on port {}'.format(port))
+
+class _WerkzeugServer:
+    def __init__(self, config: dict):
+        # the access log of every request would slow the players down
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        # one process, the uWSGI cache is not available
+        config = {**config, "SESSION_CACHE_BACKEND": 'local'}
+        self._server = make_server('127.0.0.1', 0, create_load_test_app(config), threaded = True)
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target = self._server.serve_forever, name = 'load-test-server', daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+
+# the workers import benchmark.load_test_wsgi, which reads the config written here. The players talk to
+# uWSGI's HTTP router, which hands every request to a free worker like nginx does, a worker serving an
+# --http-socket directly would either close every connection or stay pinned to one kept-alive player
+class _UwsgiServer:
+    def __init__(self, config: dict, directory: str, processes: int):
+        uwsgi = shutil.which('uwsgi')
+        if uwsgi is None:
+            raise RuntimeError('uwsgi is not installed, run with --server werkzeug or install it')
+        config_path = os.path.join(directory, 'config.json')
+        with open(config_path, 'w') as config_file:
+            json.dump(config, config_file)
+        self.port = _free_port()
+        self._process = subprocess.Popen([
+            uwsgi,
+            '--http', '127.0.0.1:{}'.format(self.port),
+            '--http-keepalive',
+            '--module', 'benchmark.load_test_wsgi:app',
+            '--pythonpath', os.path.abspath(_APPLICATION_DIRECTORY),
+            '--env', 'LOAD_TEST_CONFIG={}'.format(config_path),
+            '--master',
+            '--processes', str(processes),
+            '--enable-threads',
+            '--cache2', 'name=session_tokens,items=4096,blocksize=256',
+            '--die-on-term',
+            '--disable-logging',
+        ], stdout = subprocess.DEVNULL, stderr = subprocess.STDOUT)
+        _wait_until_listening(self.port, timeout = 30)
+
+    def stop(self):
+        self._process.terminate()
+        self._process.wait(timeout = 30)
+
+class _Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {'media_access': [], 'progress': []}
+        self.errors = {'media_access': 0, 'progress': 0}
+        self.sqlite_busy = 0
+
+    def record(self, kind: str, latency: float, status: int, is_busy: bool):
+        with self._lock:
+            self.latencies[kind].append(latency)
+            if status >= 400:
+                self.errors[kind] += 1
+            if is_busy:
+                self.sqlite_busy += 1
+
+def _percentile(sorted_values: list, percentile: float):
+    if len(sorted_values) == 0:
+        return None
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[index]
+
+class _Player:
+    def __init__(self, index: int, port: int, session: Session, results: _Results, range_requests_per_second: float, progress_interval: float):
+        self.index = index
+        self.port = port
+        self.session = session
+        self.results = results
+        self.range_interval = 1 / range_requests_per_second if range_requests_per_second > 0 else 0
+        self.progress_interval = progress_interval
+        self.connection = None
+        self.position = 0
+
+    def _request(self, kind: str, method: str, path: str, body: bytes = None, headers: dict = None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout = 30)
+        started_at = time.perf_counter()
+        try:
+            self.connection.request(method, path, body = body, headers = headers or {})
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            self.results.record(kind, time.perf_counter() - started_at, 599, False)
+            return
+        self.results.record(kind, time.perf_counter() - started_at, response.status, response.getheader(_BUSY_HEADER) == '1')
+
+    # nginx forwards the original media URI, the token is in its query string
+    def _check_media_access(self):
+        original_uri = '/media/movies/movie-{}.mkv?Media-Authorization={}'.format(self.index, quote(self.session.media_token))
+        self._request('media_access', 'GET', '/has_media_access', headers = {'X-Original-URI': original_uri})
+
+    def _post_progress(self):
+        self.position += 1
+        body = json.dumps({'/media/movies/movie-{}.mkv'.format(self.index): json.dumps({'position': self.position})}).encode()
+        self._request('progress', 'POST', '/user/file/metadata', body = body, headers = {'Authorization': self.session.access_token, 'Content-Type': 'application/json'})
+
+    def play(self, finish_at: float):
+        next_range_at = time.perf_counter()
+        next_progress_at = next_range_at + self.progress_interval
+        while time.perf_counter() < finish_at:
+            self._check_media_access()
+            if self.progress_interval > 0 and time.perf_counter() >= next_progress_at:
+                self._post_progress()
+                next_progress_at += self.progress_interval
+            next_range_at += self.range_interval
+            wait = next_range_at - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        if self.connection is not None:
+            self.connection.close()
+
+def run(server: str, players: int, users: int, duration: float, range_requests_per_second: float, progress_interval: float, processes: int):
+    with tempfile.TemporaryDirectory() as directory:
+        config = _load_config(directory)
+        sessions = _seed(config, users)
+        if server == 'uwsgi':
+            running_server = _UwsgiServer(config, directory, processes)
+        else:
+            running_server = _WerkzeugServer(config)
+        results = _Results()
+        try:
+            finish_at = time.perf_counter() + duration
+            threads = []
+            for index in range(players):
+                player = _Player(index, running_server.port, sessions[index % len(sessions)], results, range_requests_per_second, progress_interval)
+                threads.append(threading.Thread(target = player.play, args = (finish_at,), name = 'player-{}'.format(index)))
+            started_at = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started_at
+        finally:
+            running_server.stop()
+            db.close_persistent_connections()
+    return _report(results, elapsed)
+
+def _report(results: _Results, elapsed: float):
+    report = {'elapsed_seconds': round(elapsed, 2), 'sqlite_busy': results.sqlite_busy}
+    for kind, latencies in results.latencies.items():
+        latencies = sorted(latencies)
+        report[kind] = {
+            'requests': len(latencies),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            'errors': results.errors[kind],
+        }
+        for percentile in [50, 95, 99]:
+            latency = _percentile(latencies, percentile)
+            report[kind]['p{}_ms'.format(percentile)] = None if latency is None else round(latency * 1000, 2)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load Test ArgumentParser", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--server", choices=['werkzeug', 'uwsgi'], default='werkzeug', help="server running the app")
+    parser.add_argument("--processes", type=int, default=5, help="uWSGI worker processes, like home-vod-server.ini")
+    parser.add_argument("--players", type=int, default=20, help="concurrent players")
+    parser.add_argument("--users", type=int, default=10, help="seeded users, the players share their sessions round robin")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to play")
+    parser.add_argument("--range-requests-per-second", type=float, default=4, help="media authorizations per player per second, 0 for as fast as possible")
+    parser.add_argument("--progress-interval", type=float, default=5, help="seconds between progress POSTs of a player, 0 to disable")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(
+        server = args.server,
+        players = args.players,
+        users = args.users,
+        duration = args.duration,
+        range_requests_per_second = args.range_requests_per_second,
+        progress_interval = args.progress_interval,
+        processes = args.processes,
+    )
+    if args.json:
+        print(json.dumps(report, indent = 2))
+        sys.exit(0)
+    print('{} players for {}s, SQLITE_BUSY: {}'.format(args.players, report['elapsed_seconds'], report['sqlite_busy']))
+    for kind in ['media_access', 'progress']:
+        stats = report[kind]
+        print('{}: {} requests, {} requests/s, {} errors, p50 {} ms, p95 {} ms, p99 {} ms'.format(
+            kind, stats['requests'], stats['requests_per_second'], stats['errors'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
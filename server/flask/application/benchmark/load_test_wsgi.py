@@ -0,0 +1,7 @@
+import json
+import os
+from .load_test import create_load_test_app
+
+# entry point of the uWSGI workers started by `python -m benchmark.load_test --server uwsgi`
+with open(os.environ['LOAD_TEST_CONFIG']) as config_file:
+    app = create_load_test_app(json.load(config_file))
@@ -0,0 +1,3 @@
+from backend.media_access_wsgi import create_media_access_app
+
+app = create_media_access_app()
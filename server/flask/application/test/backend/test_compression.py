@@ -0,0 +1,81 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+import gzip
+import json
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_session
+from backend.data import dao_file_metadata
+from backend.data import dao_file_metadata_of_user
+from backend.data.data_models import RegisteringUser
+
+class CompressionTest(unittest.TestCase):
+
+    app = context.create_app({**context.default_test_config, "COMPRESSION_MIN_SIZE_IN_BYTES": 100})
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+            user_id = dao_users.insert_user(RegisteringUser(name = 'banan', password = 'citrom', otp_secret = 'base32secret3232'))
+            dao_session.insert_user_session(context.create_test_session(user_id=user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+            dao_file_metadata_of_user.insert_metadata(user_id = user_id, metadata = {'key' + str(index): 'value' for index in range(20)})
+            dao_file_metadata.insert_metadata(metadata = {'key': 'value' * 50, 'small': 'value'})
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_accepted_large_response_is_gzipped(self, mock_time):
+        expected = self.client.get('/user/file/metadata', headers = {'Authorization': 'token'})
+
+        response = self.client.get('/user/file/metadata', headers = {'Authorization': 'token', 'Accept-Encoding': 'gzip'})
+
+        self.assertEqual('gzip', response.headers.get('Content-Encoding'))
+        self.assertEqual(expected.data, gzip.decompress(response.data))
+        self.assertIn('Accept-Encoding', response.headers.get('Vary'))
+        self.assertEqual(None, expected.headers.get('Content-Encoding'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_small_response_is_not_compressed(self, mock_time):
+        response = self.client.get('/file/metadata', headers = {'Authorization': 'token', 'Accept-Encoding': 'gzip'}, query_string = {'file_key': 'small'})
+
+        self.assertEqual(None, response.headers.get('Content-Encoding'))
+        self.assertEqual({'small': 'value'}, json.loads(response.data.decode()))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_compressed_file_metadata_is_cached_by_etag(self, mock_time):
+        header = {'Authorization': 'token', 'Accept-Encoding': 'gzip'}
+        get_query = {'file_key': 'key'}
+        with self.app.app_context():
+            cache = self.app.extensions['compressed_response_cache']
+        stats_before = cache.stats()
+
+        first = self.client.get('/file/metadata', headers = header, query_string = get_query)
+        second = self.client.get('/file/metadata', headers = header, query_string = get_query)
+        stats_after = cache.stats()
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual({'key': 'value' * 50}, json.loads(gzip.decompress(second.data)))
+        self.assertEqual(1, stats_after['hits'] - stats_before['hits'])
+        self.assertEqual(1, stats_after['misses'] - stats_before['misses'])
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_compressed_response_has_weak_etag_which_still_matches(self, mock_time):
+        header = {'Authorization': 'token', 'Accept-Encoding': 'gzip'}
+        get_query = {'file_key': 'key'}
+        response = self.client.get('/file/metadata', headers = header, query_string = get_query)
+
+        actual = self.client.get('/file/metadata', headers = {**header, 'If-None-Match': response.headers.get('ETag')}, query_string = get_query)
+
+        self.assertTrue(response.headers.get('ETag').startswith('W/'))
+        self.assertEqual(304, actual.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,48 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import json
+
+import backend.error_responses as sut
+
+class ErrorResponsesTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+    stdlib_app = context.create_app({**context.default_test_config, "JSON_PROVIDER": "stdlib"})
+    client = app.test_client()
+
+    # the body every handler built with jsonify before the responses were precomputed
+    def jsonify_body(self, error):
+        return (json.dumps({'message': error.message, 'code': int(error.code)}, separators = (',', ':'), sort_keys = True) + '\n').encode()
+
+    def test_every_error_is_byte_identical_to_jsonify(self):
+        for app in [self.app, self.stdlib_app]:
+            for error in sut.ALL:
+                with app.test_request_context():
+                    response = sut.respond(error)
+
+                self.assertEqual(self.jsonify_body(error), response.get_data(), error)
+                self.assertEqual(error.status, response.status_code)
+                self.assertEqual('application/json', response.mimetype)
+
+    def test_known_body_is_unchanged(self):
+        expected = b'{"code":440,"message":"Missing Authorization!"}\n'
+
+        response = self.client.get('/user/file/metadata')
+
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(expected, response.data)
+        self.assertEqual(str(len(expected)), response.headers.get('Content-Length'))
+
+    def test_responses_are_independent_copies(self):
+        with self.app.test_request_context():
+            first = sut.respond(sut.SERVER_BUSY, headers = {'Retry-After': '1'})
+            second = sut.respond(sut.SERVER_BUSY)
+
+        self.assertEqual('1', first.headers.get('Retry-After'))
+        self.assertEqual(None, second.headers.get('Retry-After'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,49 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+from flask import jsonify
+from flask.json.provider import DefaultJSONProvider
+from backend.data.data_models import ResponseCode
+
+import backend.json_provider as sut
+
+@unittest.skipUnless(sut.is_orjson_available(), 'orjson is not installed')
+class OrjsonJSONProviderTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+    stdlib_app = context.create_app({**context.default_test_config, "JSON_PROVIDER": "stdlib"})
+
+    def jsonify_with(self, app, obj):
+        with app.app_context():
+            return jsonify(obj).get_data()
+
+    def test_orjson_is_used_when_installed(self):
+        self.assertIsInstance(self.app.json, sut.OrjsonJSONProvider)
+        self.assertIsInstance(self.stdlib_app.json, DefaultJSONProvider)
+        self.assertNotIsInstance(self.stdlib_app.json, sut.OrjsonJSONProvider)
+
+    def test_ascii_responses_are_byte_identical_to_stdlib(self):
+        response = {'message': 'Invalid Authorization!', 'code': ResponseCode.INVALID_AUTHORIZATION, 'list': [1, 2.5, None, True]}
+        metadata = {'b': '{"position": 12}', 'a': 'value', 'c': 'with "quotes" and \\ backslash'}
+
+        for obj in [response, metadata, {}, []]:
+            self.assertEqual(self.jsonify_with(self.stdlib_app, obj), self.jsonify_with(self.app, obj))
+
+    def test_non_ascii_responses_decode_to_the_same(self):
+        obj = {'title': 'árvíztűrő tükörfúrógép', 'surrogate': '\ud800'}
+
+        with self.app.app_context():
+            actual = self.app.json.loads(jsonify(obj).get_data())
+
+        self.assertEqual(obj, actual)
+
+    def test_stdlib_only_input_is_still_decoded(self):
+        with self.app.app_context():
+            actual = self.app.json.loads('{"big": 100000000000000000000000, "nan": NaN}')
+
+        self.assertEqual(100000000000000000000000, actual['big'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
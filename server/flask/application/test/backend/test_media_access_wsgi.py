@@ -0,0 +1,85 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import shutil
+import tempfile
+from werkzeug.test import Client
+from backend import metrics
+from backend.data import db
+from backend.data import dao_session
+
+from backend.media_access_wsgi import create_media_access_app as sut
+
+class TestMediaAccessWsgi(unittest.TestCase):
+
+    metrics_directory = tempfile.mkdtemp()
+    config = {**context.default_test_config, "MEDIA_ACCESS_CACHE_MAX_AGE_IN_SECONDS": 30, "MEDIA_ACCESS_DENIED_CACHE_IN_SECONDS": 5, "METRICS_ENABLED": True, "METRICS_DIRECTORY": metrics_directory}
+    wsgi_app = sut(config)
+    client = Client(wsgi_app)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.metrics_directory)
+
+    def setUp(self):
+        with self.wsgi_app.flask_app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.wsgi_app.flask_app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def insert_session(self, session):
+        with self.wsgi_app.flask_app.app_context():
+            dao_session.insert_user_session(session)
+
+    def test_no_headers_returns_unauthorized_with_empty_body(self):
+        response = self.client.get('/')
+
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(b'', response.data)
+        self.assertEqual('5', response.headers.get('X-Accel-Expires'))
+
+    def test_not_saved_token_returns_unauthorized_with_empty_body(self):
+        response = self.client.get('/', headers={'Media-Authorization': 'token'})
+
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(b'', response.data)
+
+    def test_valid_header_token_returns_success_with_empty_body(self):
+        self.insert_session(context.create_test_session(user_id=2, media_token='token', access_expires_at=3000000000, refresh_expires_at=3000000000))
+
+        response = self.client.get('/', headers={'Media-Authorization': 'token'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.data)
+        self.assertEqual('0', response.headers.get('Content-Length'))
+        self.assertEqual('30', response.headers.get('X-Accel-Expires'))
+
+    def test_valid_query_token_in_original_uri_returns_success(self):
+        self.insert_session(context.create_test_session(user_id=2, media_token='token', access_expires_at=3000000000, refresh_expires_at=3000000000))
+
+        response = self.client.get('/', headers={'X-Original-URI': '/media/a.mp4?Media-Authorization=token'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.data)
+
+    def snapshot_metrics(self):
+        app = self.wsgi_app.flask_app
+        with app.app_context():
+            return metrics.get_process_metrics(app).snapshot(app)
+
+    def test_requests_and_queries_are_recorded_in_the_metrics(self):
+        before = self.snapshot_metrics()
+
+        self.client.get('/', headers={'Media-Authorization': 'token'})
+        after = self.snapshot_metrics()
+
+        self.assertEqual(1, after['requests']['(media-access-wsgi)\tGET\t401'] - before['requests'].get('(media-access-wsgi)\tGET\t401', 0))
+        self.assertEqual(1, after['queries']['(media-access-wsgi)'][0] - before['queries'].get('(media-access-wsgi)', [0])[0])
+        self.assertEqual(1, len([name for name in os.listdir(self.metrics_directory) if name.startswith('{}-'.format(os.getpid()))]))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,166 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+import json
+import shutil
+import subprocess
+import tempfile
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_session
+from backend.data import janitor
+from backend.data import password_hashing
+from backend.data import query_log
+from backend.data.data_models import RegisteringUser
+
+import backend.metrics as sut
+
+class MetricsTest(unittest.TestCase):
+
+    metrics_directory = tempfile.mkdtemp()
+    app = context.create_app({**context.default_test_config, "METRICS_ENABLED": True, "METRICS_DIRECTORY": metrics_directory, "SLOW_QUERY_THRESHOLD_IN_MS": 10000})
+    client = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.metrics_directory)
+
+    def setUp(self):
+        shutil.rmtree(self.metrics_directory)
+        os.makedirs(self.metrics_directory)
+        sut.get_process_metrics(self.app).reset()
+        query_log.get_query_log_of(self.app).reset()
+        with self.app.app_context():
+            db.init_db()
+            user_id = dao_users.insert_user(RegisteringUser(name = 'banan', password = 'citrom', otp_secret = 'base32secret3232'))
+            dao_session.insert_user_session(context.create_test_session(user_id=user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_requests_and_queries_are_counted_per_route(self, mock_time):
+        self.client.get('/user/file/metadata', headers = {'Authorization': 'token'})
+        self.client.get('/user/file/metadata', headers = {'Authorization': 'token'})
+        self.client.get('/user/file/metadata', headers = {'Authorization': 'invalid'})
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.data.decode()
+        self.assertIn('homevod_http_requests_total{route="/user/file/metadata",method="GET",status="200"} 2', body)
+        self.assertIn('homevod_http_requests_total{route="/user/file/metadata",method="GET",status="401"} 1', body)
+        self.assertIn('homevod_http_request_duration_seconds_count{route="/user/file/metadata"} 3', body)
+        self.assertIn('homevod_http_request_duration_seconds_bucket{route="/user/file/metadata",le="+Inf"} 3', body)
+        self.assertRegex(body, r'homevod_db_queries_total\{route="/user/file/metadata"\} [1-9]')
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_statements_of_the_query_log_are_exported(self, mock_time):
+        self.client.get('/user/file/metadata', headers = {'Authorization': 'token'})
+
+        body = self.client.get('/metrics').data.decode()
+
+        self.assertRegex(body, r'homevod_db_statement_executions_total\{statement="SELECT [^"]*FROM session[^"]*"\} [1-9]')
+        self.assertRegex(body, r'homevod_db_statement_duration_seconds_total\{statement="SELECT [^"]*FROM session[^"]*"\} \d')
+        self.assertRegex(body, r'homevod_db_statement_duration_seconds_max\{statement="SELECT [^"]*FROM session[^"]*"\} \d')
+
+    @unittest.mock.patch('time.time', return_value=3000)
+    def test_janitor_sweeps_are_exported(self, mock_time):
+        deleted_rows_before = janitor.get_stats()['total_deleted_rows'].get('session', 0)
+        with self.app.app_context():
+            janitor.sweep_expired(db.get_db())
+
+        body = self.client.get('/metrics').data.decode()
+
+        self.assertIn('homevod_janitor_deleted_rows_total{{table="session"}} {}'.format(deleted_rows_before + 1), body)
+        self.assertIn('homevod_janitor_last_sweep_deleted_rows{table="session"} 1', body)
+        self.assertIn('homevod_janitor_last_sweep_deleted_rows{table="reset_password_token"} 0', body)
+        self.assertIn('homevod_janitor_last_sweep_timestamp_seconds 3000', body)
+        self.assertRegex(body, r'homevod_janitor_last_sweep_duration_seconds \d')
+
+    def test_unmatched_routes_share_one_label(self):
+        self.client.get('/does/not/exist')
+        self.client.get('/neither/does/this')
+
+        body = self.client.get('/metrics').data.decode()
+
+        self.assertIn('homevod_http_requests_total{route="(unmatched)",method="GET",status="404"} 2', body)
+
+    def write_other_process_file(self, file_name: str, requests: dict):
+        with self.app.app_context():
+            snapshot = self.app.extensions['metrics'].snapshot(self.app)
+        snapshot['requests'] = requests
+        snapshot['hashing'] = {'calls': 3, 'total_seconds': 0.3}
+        snapshot['janitor'] = {'sweeps': 2, 'total_deleted_rows': {'session': 5}, 'last_sweep_at': 1, 'last_sweep_duration_in_seconds': 0.5, 'last_sweep_deleted_rows': {'session': 4}}
+        with open(os.path.join(self.metrics_directory, file_name), 'w') as file:
+            json.dump(snapshot, file)
+
+    def test_files_of_other_workers_are_summed(self):
+        self.write_other_process_file('{}-other.json'.format(os.getpid()), {'/login\tPOST\t200': 3})
+
+        body = self.client.get('/metrics').data.decode()
+
+        self.assertIn('homevod_http_requests_total{route="/login",method="POST",status="200"} 3', body)
+        self.assertIn('homevod_password_hashing_total {}'.format(password_hashing.get_hashing_stats()['calls'] + 3), body)
+        janitor_stats = janitor.get_stats()
+        self.assertIn('homevod_janitor_sweeps_total {}'.format(janitor_stats['sweeps'] + 2), body)
+        self.assertIn('homevod_janitor_deleted_rows_total{{table="session"}} {}'.format(janitor_stats['total_deleted_rows'].get('session', 0) + 5), body)
+
+    def test_files_of_dead_processes_are_folded_into_the_total(self):
+        dead_process = subprocess.Popen(['true'])
+        dead_process.wait()
+        self.write_other_process_file('{}-dead.json'.format(dead_process.pid), {'/login\tPOST\t200': 3})
+
+        first_body = self.client.get('/metrics').data.decode()
+        second_body = self.client.get('/metrics').data.decode()
+
+        self.assertIn('homevod_http_requests_total{route="/login",method="POST",status="200"} 3', first_body)
+        self.assertIn('homevod_http_requests_total{route="/login",method="POST",status="200"} 3', second_body)
+        self.assertEqual(['total.json'], [name for name in os.listdir(self.metrics_directory) if name.startswith(('{}-'.format(dead_process.pid), 'total'))])
+
+    def test_files_are_kept_when_another_app_is_created(self):
+        self.write_other_process_file('{}-other.json'.format(os.getpid()), {'/login\tPOST\t200': 3})
+
+        context.create_app({**context.default_test_config, "METRICS_ENABLED": True, "METRICS_DIRECTORY": self.metrics_directory})
+        body = self.client.get('/metrics').data.decode()
+
+        self.assertIn('homevod_http_requests_total{route="/login",method="POST",status="200"} 3', body)
+
+    def test_forked_process_starts_from_zero(self):
+        metrics = self.app.extensions['metrics']
+        metrics.record_request('/login', 'POST', 200, 0.1)
+
+        with unittest.mock.patch('os.getpid', return_value = os.getpid() + 1):
+            with self.app.app_context():
+                actual = metrics.snapshot(self.app)
+
+        self.assertEqual({}, actual['requests'])
+
+class MetricsDisabledTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+    client = app.test_client()
+
+    def test_metrics_route_is_not_registered(self):
+        response = self.client.get('/metrics')
+
+        self.assertEqual(404, response.status_code)
+
+class RenderTest(unittest.TestCase):
+
+    def test_label_values_are_escaped(self):
+        total = sut.aggregate(tempfile.gettempdir() + '/does-not-exist')
+        total['requests'] = {'/a"b\\c\tGET\t200': 1}
+
+        actual = sut.render(total)
+
+        self.assertIn('homevod_http_requests_total{route="/a\\"b\\\\c",method="GET",status="200"} 1', actual)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,75 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+import json
+from backend.data import db
+from backend.data import dao_users
+from backend.data.data_models import RegisteringUser
+
+import backend.server_timing as sut
+
+def get_metric_names(header):
+    return [metric.split(';')[0] for metric in header.split(', ')]
+
+class ServerTimingTest(unittest.TestCase):
+
+    app = context.create_app({**context.default_test_config, "SERVER_TIMING_ENABLED": True, "SERVER_TIMING_LOG": True})
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+            dao_users.insert_user(RegisteringUser(name = 'myname', password = 'mypass', otp_secret = 'base32secret3232'))
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_otp_verification_timing_has_every_phase(self, mock_time):
+        data = {'username': 'myname', 'password': 'mypass', 'otp': '585501'}
+
+        response = self.client.post('/otp_verification', data = data)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['db', 'hash', 'otp', 'json', 'app'], get_metric_names(response.headers['Server-Timing']))
+
+    def test_request_without_phases_only_has_app_timing(self):
+        response = self.client.get('/does/not/exist')
+
+        self.assertRegex(response.headers['Server-Timing'], r'^app;dur=[0-9.]+$')
+
+    def test_timing_is_logged_as_json(self):
+        with self.assertLogs(self.app.logger, level = 'INFO') as logs:
+            self.client.post('/login', data = {'username': 'myname', 'password': 'wrong'})
+
+        actual = json.loads(logs.records[-1].getMessage())
+        self.assertEqual('/login', actual['route'])
+        self.assertEqual('POST', actual['method'])
+        self.assertEqual(1, actual['hash_count'])
+        self.assertLess(0, actual['db_count'])
+        self.assertEqual(0, actual['otp_count'])
+
+class ServerTimingDisabledTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+    client = app.test_client()
+
+    def test_header_is_not_added(self):
+        response = self.client.get('/does/not/exist')
+
+        self.assertNotIn('Server-Timing', response.headers)
+
+class FormatHeaderTest(unittest.TestCase):
+
+    def test_phases_are_in_milliseconds_with_counts(self):
+        actual = sut.format_header({'json': (0.0005, 1), 'db': (0.0021, 3)}, 0.01)
+
+        self.assertEqual('db;dur=2.1;desc="3x", json;dur=0.5;desc="1x", app;dur=10.0', actual)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,51 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import backend.data.db as db
+
+import backend.data.dao_file_metadata as sut
+
+class FileMetadataDAOTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def count_rows(self):
+        with self.app.app_context():
+            return db.get_db().execute("SELECT COUNT(*) FROM file_metadata").fetchone()[0]
+
+    def test_empty_db_contains_no_metadata(self):
+        with self.app.app_context():
+            actual = sut.get_metadata('key')
+
+        self.assertEqual({}, actual)
+
+    def test_rewritten_key_is_updated_in_place(self):
+        with self.app.app_context():
+            sut.insert_metadata({'key': 'first', 'other': 'value'})
+            sut.insert_metadata({'key': 'second'})
+            actual = sut.get_metadata('key')
+
+        self.assertEqual({'key': 'second'}, actual)
+        self.assertEqual(2, self.count_rows())
+
+    def test_keys_above_the_variable_limit_are_resolved_in_chunks(self):
+        metadata = dict(map(lambda index: ('key' + str(index), 'value' + str(index)), range(2000)))
+        with self.app.app_context():
+            sut.insert_metadata(metadata)
+            actual = sut.get_metadata_for_keys(list(metadata.keys()) + ['missing'])
+
+        self.assertEqual(metadata, actual)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,86 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import backend.data.db as db
+
+import backend.data.dao_file_metadata_of_user as sut
+
+class FileMetadataOfUserDAOTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def count_rows(self):
+        with self.app.app_context():
+            return db.get_db().execute("SELECT COUNT(*) FROM file_metadata_of_user").fetchone()[0]
+
+    def test_empty_db_contains_no_metadata(self):
+        with self.app.app_context():
+            actual = sut.get_metadata(1)
+
+        self.assertEqual({}, actual)
+
+    def test_rewritten_key_is_updated_in_place_per_user(self):
+        with self.app.app_context():
+            sut.insert_metadata(1, {'key': 'first', 'other': 'value'})
+            sut.insert_metadata(2, {'key': 'of other user'})
+            sut.insert_metadata(1, {'key': 'second'})
+            actual = sut.get_metadata(1)
+            actual_other = sut.get_metadata(2)
+
+        self.assertEqual({'key': 'second', 'other': 'value'}, actual)
+        self.assertEqual({'key': 'of other user'}, actual_other)
+        self.assertEqual(3, self.count_rows())
+
+    def test_page_ending_at_the_last_key_has_no_next_page(self):
+        with self.app.app_context():
+            sut.insert_metadata(1, {'a': '1', 'b': '2', 'c': '3', 'd': '4'})
+            actual_first = sut.get_metadata_page(1, limit = 2)
+            actual_last = sut.get_metadata_page(1, limit = 2, after = 'b')
+
+        self.assertEqual(({'a': '1', 'b': '2'}, 'b'), actual_first)
+        self.assertEqual(({'c': '3', 'd': '4'}, None), actual_last)
+
+    def test_iterated_metadata_is_ordered_across_batches(self):
+        with self.app.app_context():
+            sut.insert_metadata(1, {'c': '3', 'a': '1', 'b': '2'})
+            sut.insert_metadata(2, {'a': 'other'})
+            actual = list(sut.iterate_metadata(1, batch_size = 2))
+
+        self.assertEqual([('a', '1'), ('b', '2'), ('c', '3')], actual)
+
+    def test_unchanged_metadata_keeps_its_version(self):
+        with self.app.app_context():
+            sut.insert_metadata(1, {'a': '1', 'b': '2'})
+            sut.insert_metadata(1, {'a': '1'})
+            sut.insert_metadata(2, {'a': 'other'})
+            actual_version = sut.get_version(1)
+            actual_changes = sut.get_changes_since(1, since = 1)
+
+        self.assertEqual(2, actual_version)
+        self.assertEqual({'b': '2'}, actual_changes)
+
+    def test_deleted_key_is_a_tombstone_with_a_new_version(self):
+        with self.app.app_context():
+            sut.insert_metadata(1, {'a': '1', 'b': '2'})
+            sut.insert_metadata(1, {'a': None})
+            actual_metadata = sut.get_metadata(1)
+            actual_changes = sut.get_changes_since(1, since = 2)
+            actual_version = sut.get_version(1)
+
+        self.assertEqual({'b': '2'}, actual_metadata)
+        self.assertEqual({'a': None}, actual_changes)
+        self.assertEqual(3, actual_version)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,7 +6,9 @@ import unittest.mock
 import time
 from flask import current_app
 from backend.data import db
+from backend.data import dao_users
 from backend.data.data_models import Session
+from backend.data.session_cache import get_session_cache
 
 import backend.data.dao_session as sut
 
@@ -22,19 +24,32 @@ class SessionDAOTest(unittest.TestCase):
     def setUp(self):
         with self.app.app_context():
             db.init_db()
+            connection = db.get_db()
+            for user_id in range(13, 17):
+                connection.execute("INSERT INTO user(id, username, password, otp_secret, privileged, was_otp_verified) VALUES(?, ?, '', '', 0, 0)", (user_id, 'user{}'.format(user_id)))
+            connection.commit()
 
     def tearDown(self):
         with self.app.app_context():
             db.close_db()
         os.remove("testdb")
 
+    # access tokens are resolved with their user, the way the requests do
+    def get_user_id_for_access_token(self, access_token):
+        user = dao_users.get_user_for_access_token(access_token)
+        return None if user is None else user.id
+
+    def get_user_id_for_media_token(self, media_token):
+        user_and_expiration = sut.get_user_and_expiration_for_media_token(media_token)
+        return None if user_and_expiration is None else user_and_expiration[0]
+
     def test_empty_db_contains_no_session(self):
         expected = None
         
         with self.app.app_context():
-            actual_by_access = sut.get_user_for_token('access')
-            actual_by_media = sut.get_user_for_media_token('media')
-            actual_by_refresh = sut.get_user_for_token('refresh')
+            actual_by_access = self.get_user_id_for_access_token('access')
+            actual_by_media = self.get_user_id_for_media_token('media')
+            actual_by_refresh = self.get_user_id_for_access_token('refresh')
 
         self.assertEqual(expected, actual_by_access)
         self.assertEqual(expected, actual_by_media)
@@ -58,8 +73,8 @@ class SessionDAOTest(unittest.TestCase):
 
         with self.app.app_context():
             sut.insert_user_session(session)
-            actual_by_access = sut.get_user_for_token(access_token)
-            actual_by_media = sut.get_user_for_media_token(media_token)
+            actual_by_access = self.get_user_id_for_access_token(access_token)
+            actual_by_media = self.get_user_id_for_media_token(media_token)
             actual_by_refresh = sut.get_user_for_refresh_token(refresh_token)
 
         self.assertEqual(expected, actual_by_access)
@@ -91,7 +106,7 @@ class SessionDAOTest(unittest.TestCase):
         with self.app.app_context():
             sut.insert_user_session(session1)
             sut.insert_user_session(session2)
-            actual = sut.get_user_for_token(access_token)
+            actual = self.get_user_id_for_access_token(access_token)
 
         self.assertEqual(expected, actual)
     
@@ -120,7 +135,7 @@ class SessionDAOTest(unittest.TestCase):
         with self.app.app_context():
             sut.insert_user_session(session1)
             sut.insert_user_session(session2)
-            actual = sut.get_user_for_media_token(media_token)
+            actual = self.get_user_id_for_media_token(media_token)
 
         self.assertEqual(expected, actual)
     
@@ -172,8 +187,8 @@ class SessionDAOTest(unittest.TestCase):
         
         with self.app.app_context():
             sut.insert_user_session(session)
-            actual_by_access = sut.get_user_for_token(access_token)
-            actual_by_media = sut.get_user_for_media_token(media_token)
+            actual_by_access = self.get_user_id_for_access_token(access_token)
+            actual_by_media = self.get_user_id_for_media_token(media_token)
             actual_by_refresh = sut.get_user_for_refresh_token(refresh_token)
 
         self.assertEqual(expected, actual_by_access)
@@ -198,8 +213,8 @@ class SessionDAOTest(unittest.TestCase):
         
         with self.app.app_context():
             sut.insert_user_session(session)
-            actual_by_access = sut.get_user_for_token(access_token)
-            actual_by_media = sut.get_user_for_media_token(media_token)
+            actual_by_access = self.get_user_id_for_access_token(access_token)
+            actual_by_media = self.get_user_id_for_media_token(media_token)
             actual_by_refresh = sut.get_user_for_refresh_token(refresh_token)
 
         self.assertEqual(expected, actual_by_access)
@@ -225,8 +240,8 @@ class SessionDAOTest(unittest.TestCase):
         with self.app.app_context():
             sut.insert_user_session(session = session)
             sut.delete_user_session(access_token = access_token)
-            actual_by_access = sut.get_user_for_token(access_token)
-            actual_by_media = sut.get_user_for_media_token(media_token)
+            actual_by_access = self.get_user_id_for_access_token(access_token)
+            actual_by_media = self.get_user_id_for_media_token(media_token)
             actual_by_refresh = sut.get_user_for_refresh_token(refresh_token)
 
         self.assertEqual(expected, actual_by_access)
@@ -267,14 +282,14 @@ class SessionDAOTest(unittest.TestCase):
             sut.insert_user_session(session = session2)
             sut.insert_user_session(session = session_of_different_user)
             sut.delete_all_user_session_by_user_id(user_id=13)
-            actual1_by_access = sut.get_user_for_token(access_token = session1.access_token)
-            actual2_by_access = sut.get_user_for_token(access_token = session2.access_token)
-            actual1_by_media = sut.get_user_for_media_token(media_token = session1.media_token)
-            actual2_by_media = sut.get_user_for_media_token(media_token = session2.media_token)
+            actual1_by_access = self.get_user_id_for_access_token(access_token = session1.access_token)
+            actual2_by_access = self.get_user_id_for_access_token(access_token = session2.access_token)
+            actual1_by_media = self.get_user_id_for_media_token(media_token = session1.media_token)
+            actual2_by_media = self.get_user_id_for_media_token(media_token = session2.media_token)
             actual1_by_refresh = sut.get_user_for_refresh_token(refresh_token = session1.refresh_token)
             actual2_by_refresh = sut.get_user_for_refresh_token(refresh_token = session2.refresh_token)
-            actual_of_different_user_by_access = sut.get_user_for_token(session_of_different_user.access_token)
-            actual_of_different_user_by_media = sut.get_user_for_media_token(session_of_different_user.media_token)
+            actual_of_different_user_by_access = self.get_user_id_for_access_token(session_of_different_user.access_token)
+            actual_of_different_user_by_media = self.get_user_id_for_media_token(session_of_different_user.media_token)
             actual_of_different_user_by_refresh = sut.get_user_for_refresh_token(session_of_different_user.refresh_token)
 
         self.assertEqual(expected, actual1_by_access)
@@ -312,11 +327,11 @@ class SessionDAOTest(unittest.TestCase):
         with self.app.app_context():
             sut.insert_user_session(session = session)
             sut.create_new_single_session(session = new_session)
-            actual_old_by_access = sut.get_user_for_token(session.access_token)
-            actual_old_by_media = sut.get_user_for_media_token(session.media_token)
+            actual_old_by_access = self.get_user_id_for_access_token(session.access_token)
+            actual_old_by_media = self.get_user_id_for_media_token(session.media_token)
             actual_old_by_refresh = sut.get_user_for_refresh_token(session.refresh_token)
-            actual_new_by_access = sut.get_user_for_token(new_session.access_token)
-            actual_new_by_media = sut.get_user_for_media_token(new_session.media_token)
+            actual_new_by_access = self.get_user_id_for_access_token(new_session.access_token)
+            actual_new_by_media = self.get_user_id_for_media_token(new_session.media_token)
             actual_new_by_refresh = sut.get_user_for_refresh_token(new_session.refresh_token)
 
         self.assertEqual(expected_old, actual_old_by_access)
@@ -351,11 +366,11 @@ class SessionDAOTest(unittest.TestCase):
         with self.app.app_context():
             sut.insert_user_session(session = session)
             sut.swap_refresh_session(refresh_token = session.refresh_token, session = new_session)
-            actual_old_by_access = sut.get_user_for_token(session.access_token)
-            actual_old_by_media = sut.get_user_for_media_token(session.media_token)
+            actual_old_by_access = self.get_user_id_for_access_token(session.access_token)
+            actual_old_by_media = self.get_user_id_for_media_token(session.media_token)
             actual_old_by_refresh = sut.get_user_for_refresh_token(session.refresh_token)
-            actual_new_by_access = sut.get_user_for_token(new_session.access_token)
-            actual_new_by_media = sut.get_user_for_media_token(new_session.media_token)
+            actual_new_by_access = self.get_user_id_for_access_token(new_session.access_token)
+            actual_new_by_media = self.get_user_id_for_media_token(new_session.media_token)
             actual_new_by_refresh = sut.get_user_for_refresh_token(new_session.refresh_token)
 
         self.assertEqual(expected_old, actual_old_by_access)
@@ -365,6 +380,79 @@ class SessionDAOTest(unittest.TestCase):
         self.assertEqual(expected_new, actual_new_by_media)
         self.assertEqual(expected_new, actual_new_by_refresh)
 
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_cached_media_token_isnt_returned_after_session_changes(self, mock_time):
+        def new_session(user_id, postfix):
+            return Session(
+                user_id = user_id,
+                access_token = "access" + postfix,
+                media_token = "media" + postfix,
+                refresh_token = "refresh" + postfix,
+                access_expires_at = 1500,
+                refresh_expires_at = 5000
+            )
+        logged_out = new_session(13, "1")
+        deleted_user = new_session(14, "2")
+        replaced_single = new_session(15, "3")
+        swapped = new_session(16, "4")
+        sessions = [logged_out, deleted_user, replaced_single, swapped]
+
+        with self.app.app_context():
+            for session in sessions:
+                sut.insert_user_session(session = session)
+            cached = list(map(lambda session: self.get_user_id_for_media_token(session.media_token), sessions))
+            sut.delete_user_session(access_token = logged_out.access_token)
+            sut.delete_all_user_session_by_user_id(user_id = deleted_user.user_id)
+            sut.create_new_single_session(session = new_session(15, "5"))
+            sut.swap_refresh_session(refresh_token = swapped.refresh_token, session = new_session(16, "6"))
+            actual = list(map(lambda session: self.get_user_id_for_media_token(session.media_token), sessions))
+
+        self.assertEqual([13, 14, 15, 16], cached)
+        self.assertEqual([None, None, None, None], actual)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_cached_access_token_isnt_returned_after_logout(self, mock_time):
+        session = Session(
+            user_id = 13,
+            access_token = "access",
+            media_token = "media",
+            refresh_token = "refresh",
+            access_expires_at = 1500,
+            refresh_expires_at = 5000
+        )
+
+        with self.app.app_context():
+            sut.insert_user_session(session = session)
+            cached = self.get_user_id_for_access_token(session.access_token)
+            sut.delete_user_session(access_token = session.access_token)
+            actual = self.get_user_id_for_access_token(session.access_token)
+
+        self.assertEqual(13, cached)
+        self.assertEqual(None, actual)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_repeated_media_token_lookup_is_served_from_cache(self, mock_time):
+        session = Session(
+            user_id = 13,
+            access_token = "access",
+            media_token = "media",
+            refresh_token = "refresh",
+            access_expires_at = 1500,
+            refresh_expires_at = 5000
+        )
+
+        with self.app.app_context():
+            sut.insert_user_session(session = session)
+            stats_before = get_session_cache().stats()
+            first = self.get_user_id_for_media_token(session.media_token)
+            second = self.get_user_id_for_media_token(session.media_token)
+            stats_after = get_session_cache().stats()
+
+        self.assertEqual(13, first)
+        self.assertEqual(13, second)
+        self.assertEqual(1, stats_after['misses'] - stats_before['misses'])
+        self.assertEqual(1, stats_after['hits'] - stats_before['hits'])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
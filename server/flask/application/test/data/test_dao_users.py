@@ -6,6 +6,8 @@ import unittest.mock
 import time
 from flask import current_app
 from backend.data import db
+from backend.data import dao_session
+from passlib.hash import sha256_crypt, pbkdf2_sha256
 from backend.data.data_models import RegisteringUser
 from backend.data.data_models import User
 from backend.data.data_models import DataError
@@ -296,6 +298,105 @@ class RegistrationTokenDAOTest(unittest.TestCase):
         
         self.assertEqual(expected_old, actual_old)
         self.assertEqual(expected_new, actual_new)
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_user_can_be_found_by_access_token(self, mock_time):
+        inserted = RegisteringUser(
+            name = "admin",
+            password = "admin",
+            otp_secret = "secret",
+            privileged = True,
+            was_otp_verified = True
+        )
+
+        with self.app.app_context():
+            user_id = sut.insert_user(inserted)
+            dao_session.insert_user_session(context.create_test_session(user_id = user_id, access_token = 'token', access_expires_at = 1500, refresh_expires_at = 2000))
+            actual = sut.get_user_for_access_token('token')
+            actual_by_unknown_token = sut.get_user_for_access_token('unknown')
+
+        self.assertEqual(User(id = user_id, name = "admin", otp_secret = "secret", privileged = True, was_otp_verified = True), actual)
+        self.assertEqual(None, actual_by_unknown_token)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_user_is_not_found_by_expired_access_token(self, mock_time):
+        with self.app.app_context():
+            user_id = sut.insert_user(RegisteringUser(name = "admin", password = "admin", otp_secret = "secret"))
+            dao_session.insert_user_session(context.create_test_session(user_id = user_id, access_token = 'token', access_expires_at = 999, refresh_expires_at = 2000))
+            actual = sut.get_user_for_access_token('token')
+
+        self.assertEqual(None, actual)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_session_of_deleted_user_is_reported(self, mock_time):
+        with self.app.app_context():
+            dao_session.insert_user_session(context.create_test_session(user_id = 13, access_token = 'token', access_expires_at = 1500, refresh_expires_at = 2000))
+            actual = sut.get_user_for_access_token('token')
+
+        self.assertEqual(DataError.SESSION_WITHOUT_USER, actual)
+
+class PasswordRehashDAOTest(unittest.TestCase):
+
+    app = context.create_app({
+        **context.default_test_config,
+        "PASSWORD_SCHEMES": ["pbkdf2_sha256", "sha256_crypt"],
+        "PASSWORD_SCHEME_SETTINGS": {"pbkdf2_sha256__default_rounds": 1000, "pbkdf2_sha256__max_rounds": 1000},
+    })
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def insert_user_with_hash(self, hashed_password):
+        with self.app.app_context():
+            user_id = sut.insert_user(RegisteringUser(name = "admin", password = "admin", otp_secret = "secret"))
+            db.get_db().execute('UPDATE user SET password = :pass WHERE id=:id', {'id': user_id, 'pass': hashed_password})
+            db.get_db().commit()
+        return user_id
+
+    def stored_hash(self, user_id):
+        with self.app.app_context():
+            return db.get_db().execute('SELECT password FROM user WHERE id=:id', {'id': user_id}).fetchone()[0]
+
+    def test_new_password_is_hashed_with_first_scheme(self):
+        with self.app.app_context():
+            user_id = sut.insert_user(RegisteringUser(name = "admin", password = "admin", otp_secret = "secret"))
+
+        self.assertTrue(self.stored_hash(user_id).startswith('$pbkdf2-sha256$1000$'))
+
+    def test_deprecated_scheme_is_rehashed_on_login(self):
+        user_id = self.insert_user_with_hash(sha256_crypt.using(rounds = 1000).hash("admin"))
+
+        with self.app.app_context():
+            actual = sut.get_user_by_name_and_password(user_name = "admin", password = "admin")
+
+        self.assertEqual(user_id, actual.id)
+        self.assertTrue(self.stored_hash(user_id).startswith('$pbkdf2-sha256$1000$'))
+        with self.app.app_context():
+            self.assertEqual(user_id, sut.get_user_by_name_and_password(user_name = "admin", password = "admin").id)
+
+    def test_over_cost_hash_is_rehashed_on_login(self):
+        user_id = self.insert_user_with_hash(pbkdf2_sha256.using(rounds = 2000).hash("admin"))
+
+        with self.app.app_context():
+            sut.get_user_by_name_and_password(user_name = "admin", password = "admin")
+
+        self.assertTrue(self.stored_hash(user_id).startswith('$pbkdf2-sha256$1000$'))
+
+    def test_hash_is_not_changed_on_wrong_password(self):
+        old_hash = sha256_crypt.using(rounds = 1000).hash("admin")
+        user_id = self.insert_user_with_hash(old_hash)
+
+        with self.app.app_context():
+            actual = sut.get_user_by_name_and_password(user_name = "admin", password = "wrong")
+
+        self.assertEqual(None, actual)
+        self.assertEqual(old_hash, self.stored_hash(user_id))
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,136 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import threading
+
+import backend.data.db as sut
+
+class DbConnectionTest(unittest.TestCase):
+
+    app = context.create_app({
+        **context.default_test_config,
+        "DATABASE_KEEP_CONNECTION_ALIVE": True,
+        "DATABASE_PRAGMAS": {
+            "synchronous": "NORMAL",
+            "cache_size": -4000,
+            "temp_store": "MEMORY",
+            "busy_timeout": 3000,
+            "foreign_keys": True,
+        },
+    })
+
+    def setUp(self):
+        with self.app.app_context():
+            sut.init_db()
+
+    def tearDown(self):
+        sut.close_persistent_connections()
+        os.remove("testdb")
+
+    def test_connection_is_kept_alive_between_app_contexts(self):
+        with self.app.app_context():
+            first = sut.get_db()
+        with self.app.app_context():
+            second = sut.get_db()
+            second.execute("SELECT 1")
+
+        self.assertIs(first, second)
+
+    def test_threads_do_not_share_connections(self):
+        connections = []
+        def get_connection():
+            with self.app.app_context():
+                connections.append(sut.get_db())
+
+        thread = threading.Thread(target = get_connection)
+        thread.start()
+        thread.join()
+        get_connection()
+
+        self.assertIsNot(connections[0], connections[1])
+
+    def test_pragmas_are_applied(self):
+        with self.app.app_context():
+            db = sut.get_db()
+            actual_synchronous = db.execute("PRAGMA synchronous").fetchone()[0]
+            actual_cache_size = db.execute("PRAGMA cache_size").fetchone()[0]
+            actual_temp_store = db.execute("PRAGMA temp_store").fetchone()[0]
+            actual_busy_timeout = db.execute("PRAGMA busy_timeout").fetchone()[0]
+            actual_foreign_keys = db.execute("PRAGMA foreign_keys").fetchone()[0]
+
+        self.assertEqual(1, actual_synchronous)
+        self.assertEqual(-4000, actual_cache_size)
+        self.assertEqual(2, actual_temp_store)
+        self.assertEqual(3000, actual_busy_timeout)
+        self.assertEqual(1, actual_foreign_keys)
+
+    def test_open_transaction_is_rolled_back_at_teardown(self):
+        with self.app.app_context():
+            sut.get_db().execute("INSERT INTO registration_token(token) VALUES('token')")
+        with self.app.app_context():
+            db = sut.get_db()
+            actual_in_transaction = db.in_transaction
+            actual_count = db.execute("SELECT COUNT(*) FROM registration_token").fetchone()[0]
+
+        self.assertEqual(False, actual_in_transaction)
+        self.assertEqual(0, actual_count)
+
+    def test_invalid_pragma_is_rejected(self):
+        with self.assertRaises(ValueError):
+            sut.connect("testdb", {"journal_mode": "WAL; DROP TABLE user"})
+
+class QueryObserverTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+    observed = []
+    sut.add_query_observer(app, lambda sql, params, duration: QueryObserverTest.observed.append((sql, params)))
+    sut.add_fetch_observer(app, lambda duration: QueryObserverTest.observed.append(('fetch', duration >= 0)))
+
+    def setUp(self):
+        with self.app.app_context():
+            sut.init_db()
+        self.observed.clear()
+
+    def tearDown(self):
+        with self.app.app_context():
+            sut.close_db()
+        os.remove("testdb")
+
+    def test_statements_of_connection_and_cursor_are_observed(self):
+        with self.app.app_context():
+            db = sut.get_db()
+            db.execute("SELECT ?", (1,))
+            db.cursor().executemany("INSERT INTO registration_token(token) VALUES(?)", [('a',), ('b',)])
+
+        self.assertEqual([("SELECT ?", (1,)), ("INSERT INTO registration_token(token) VALUES(?)", [('a',), ('b',)])], self.observed)
+
+    def test_commits_are_observed(self):
+        with self.app.app_context():
+            db = sut.get_db()
+            db.execute("INSERT INTO registration_token(token) VALUES(?)", ('a',))
+            db.commit()
+
+        self.assertEqual([("INSERT INTO registration_token(token) VALUES(?)", ('a',)), ('COMMIT', ())], self.observed)
+
+    def test_fetches_are_observed(self):
+        with self.app.app_context():
+            db_cursor = sut.get_db().cursor()
+            db_cursor.execute("SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3")
+            first = db_cursor.fetchone()
+            second = db_cursor.fetchmany(1)
+            rest = db_cursor.fetchall()
+
+        self.assertEqual([1, 2, 3], [first[0], second[0][0], rest[0][0]])
+        self.assertEqual([('fetch', True)] * 3, self.observed[1:])
+
+    def test_connections_without_observers_are_not_instrumented(self):
+        app = context.create_app(context.default_test_config)
+        with app.app_context():
+            db = sut.get_db()
+
+        self.assertNotIsInstance(db, sut.InstrumentedConnection)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,72 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+import time
+from backend.data import db
+from backend.data import dao_session
+from backend.data import dao_users
+from backend.data import dao_reset_password_tokens
+
+import backend.data.janitor as sut
+
+class JanitorTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def count_rows(self, table):
+        with self.app.app_context():
+            return db.get_db().execute("SELECT COUNT(*) FROM " + table).fetchone()[0]
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_only_expired_rows_are_deleted_in_batches(self, mock_time):
+        with self.app.app_context():
+            for index in range(5):
+                dao_session.insert_user_session(context.create_test_session(user_id = index, access_token = 'expired' + str(index), refresh_expires_at = 1000))
+            dao_session.insert_user_session(context.create_test_session(user_id = 13, access_token = 'valid', media_token = 'validmedia', access_expires_at = 1500, refresh_expires_at = 2000))
+            dao_reset_password_tokens.insert_token(token = 'expired', username = 'user', expires_at = 999)
+            dao_reset_password_tokens.insert_token(token = 'valid', username = 'user', expires_at = 2000)
+
+            actual = sut.sweep_expired(db.get_db(), batch_size = 2)
+
+        self.assertEqual({'session': 5, 'reset_password_token': 1, 'revoked_media_token': 0}, actual)
+        self.assertEqual(1, self.count_rows('session'))
+        self.assertEqual(1, self.count_rows('reset_password_token'))
+        with self.app.app_context():
+            self.assertEqual(13, dao_session.get_user_and_expiration_for_media_token('validmedia')[0])
+            self.assertEqual(True, dao_reset_password_tokens.is_valid_token(token = 'valid', username = 'user'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_sweep_is_recorded_in_stats(self, mock_time):
+        with self.app.app_context():
+            dao_session.insert_user_session(context.create_test_session(user_id = 1, access_token = 'expired', refresh_expires_at = 500))
+            stats_before = sut.get_stats()
+            sut.sweep_expired(db.get_db())
+        stats_after = sut.get_stats()
+
+        self.assertEqual(1, stats_after['sweeps'] - stats_before['sweeps'])
+        self.assertEqual({'session': 1, 'reset_password_token': 0, 'revoked_media_token': 0}, stats_after['last_sweep_deleted_rows'])
+        self.assertIsNotNone(stats_after['last_sweep_duration_in_seconds'])
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_reads_do_not_delete_expired_rows(self, mock_time):
+        with self.app.app_context():
+            dao_session.insert_user_session(context.create_test_session(user_id = 1, access_token = 'expired', refresh_token = 'refresh', refresh_expires_at = 500))
+            dao_users.get_user_for_access_token('expired')
+            dao_session.get_user_for_refresh_token('refresh')
+
+        self.assertEqual(1, self.count_rows('session'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import sqlite3
+from backend.data import db
+
+import backend.data.migration as sut
+
+# schema of databases created before media tokens and migrations existed
+_LEGACY_SCHEMA = """
+CREATE TABLE user (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL, otp_secret TEXT NOT NULL, privileged INTEGER NOT NULL, was_otp_verified INTEGER NOT NULL);
+CREATE TABLE registration_token (token TEXT PRIMARY KEY NOT NULL);
+CREATE TABLE reset_password_token (id INTEGER PRIMARY KEY AUTOINCREMENT, token TEXT NOT NULL, username TEXT NOT NULL, expires_at INTEGER NOT NULL);
+CREATE TABLE session (user_id INTEGER NOT NULL, access_token TEXT NOT NULL, refresh_token TEXT NOT NULL, access_expires_at INTEGER NOT NULL, refresh_expires_at INTEGER NOT NULL, FOREIGN KEY (user_id) REFERENCES user (id));
+CREATE TABLE file_metadata_of_user (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, file_key TEXT NOT NULL, metadata TEXT NOT NULL);
+CREATE TABLE file_metadata (id INTEGER PRIMARY KEY AUTOINCREMENT, file_key TEXT NOT NULL, metadata TEXT NOT NULL);
+INSERT INTO session(user_id, access_token, refresh_token, access_expires_at, refresh_expires_at) VALUES(1, 'access', 'refresh', 10, 20);
+INSERT INTO file_metadata(file_key, metadata) VALUES('key', 'value');
+"""
+
+class MigrationTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+
+    def tearDown(self):
+        os.remove("testdb")
+
+    def create_legacy_db(self):
+        legacy_db = sqlite3.connect("testdb")
+        legacy_db.executescript(_LEGACY_SCHEMA)
+        legacy_db.commit()
+        return legacy_db
+
+    def index_names(self, connection):
+        rows = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'").fetchall()
+        return set(map(lambda row: row[0], rows))
+
+    def test_new_db_is_at_latest_version(self):
+        with self.app.app_context():
+            db.init_db()
+            db.close_db()
+            actual_version = sut.get_version(db.get_db())
+            actual_pending = sut.get_pending_migrations(db.get_db())
+            db.close_db()
+
+        self.assertEqual(sut.get_latest_version(), actual_version)
+        self.assertEqual([], actual_pending)
+
+    def test_legacy_db_is_upgraded_without_data_loss(self):
+        legacy_db = self.create_legacy_db()
+
+        applied = sut.migrate(legacy_db)
+        session_rows = legacy_db.execute("SELECT user_id, access_token, media_token, refresh_token FROM session").fetchall()
+        metadata_rows = legacy_db.execute("SELECT file_key, metadata FROM file_metadata").fetchall()
+        actual_indexes = self.index_names(legacy_db)
+        actual_version = sut.get_version(legacy_db)
+        legacy_db.close()
+
+        self.assertEqual(list(map(lambda migration: migration[0], sut.MIGRATIONS)), list(map(lambda migration: migration[0], applied)))
+        self.assertEqual(sut.get_latest_version(), actual_version)
+        self.assertEqual([(1, 'access', '', 'refresh')], list(map(tuple, session_rows)))
+        self.assertEqual([('key', 'value')], list(map(tuple, metadata_rows)))
+        self.assertTrue({
+            'session_access_token_index',
+            'session_media_token_index',
+            'session_refresh_token_index',
+            'session_refresh_expires_at_index',
+            'session_user_id_index',
+            'file_metadata_file_key_unique_index',
+            'file_metadata_of_user_user_id_file_key_unique_index',
+        }.issubset(actual_indexes))
+
+    def test_dry_run_does_not_change_the_db(self):
+        legacy_db = self.create_legacy_db()
+
+        pending = sut.migrate(legacy_db, dry_run = True)
+        actual_version = sut.get_version(legacy_db)
+        actual_indexes = self.index_names(legacy_db)
+        legacy_db.close()
+
+        self.assertEqual(len(sut.MIGRATIONS), len(pending))
+        self.assertEqual(0, actual_version)
+        self.assertEqual(set(), actual_indexes)
+
+    def test_duplicated_metadata_keeps_the_latest_row(self):
+        legacy_db = self.create_legacy_db()
+        legacy_db.executescript("""
+        INSERT INTO file_metadata(file_key, metadata) VALUES('key', 'latest');
+        INSERT INTO file_metadata_of_user(user_id, file_key, metadata) VALUES(1, 'key', 'old');
+        INSERT INTO file_metadata_of_user(user_id, file_key, metadata) VALUES(1, 'key', 'latest');
+        INSERT INTO file_metadata_of_user(user_id, file_key, metadata) VALUES(2, 'key', 'other user');
+        """)
+
+        sut.migrate(legacy_db)
+        metadata_rows = legacy_db.execute("SELECT file_key, metadata FROM file_metadata").fetchall()
+        metadata_of_user_rows = legacy_db.execute("SELECT user_id, file_key, metadata FROM file_metadata_of_user ORDER BY user_id").fetchall()
+        legacy_db.close()
+
+        self.assertEqual([('key', 'latest')], list(map(tuple, metadata_rows)))
+        self.assertEqual([(1, 'key', 'latest'), (2, 'key', 'other user')], list(map(tuple, metadata_of_user_rows)))
+
+    def test_existing_metadata_of_user_is_synced_since_version_0(self):
+        legacy_db = self.create_legacy_db()
+        legacy_db.execute("INSERT INTO file_metadata_of_user(user_id, file_key, metadata) VALUES(1, 'key', 'value')")
+        legacy_db.commit()
+
+        sut.migrate(legacy_db)
+        rows = legacy_db.execute("SELECT file_key, metadata, version, deleted FROM file_metadata_of_user WHERE version > 0").fetchall()
+        legacy_db.close()
+
+        self.assertEqual([('key', 'value', 1, 0)], list(map(tuple, rows)))
+
+    def test_migrating_twice_applies_nothing(self):
+        legacy_db = self.create_legacy_db()
+
+        sut.migrate(legacy_db)
+        actual = sut.migrate(legacy_db)
+        legacy_db.close()
+
+        self.assertEqual([], actual)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
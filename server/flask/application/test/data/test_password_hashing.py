@@ -0,0 +1,125 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import threading
+import json
+import multiprocessing
+import shutil
+import tempfile
+from backend.data import db
+from backend.data import password_hashing
+
+from backend.data.password_hashing import HashingExecutor as sut
+
+def run_blocking_call(executor):
+    started = threading.Event()
+    release = threading.Event()
+    def blocking():
+        started.set()
+        release.wait(5)
+    thread = threading.Thread(target = lambda: executor.run(blocking))
+    thread.start()
+    started.wait(5)
+    return thread, release
+
+# hashes in a forked process, which dies while holding both slots
+def die_while_hashing(executor):
+    process = multiprocessing.get_context('fork').Process(target = executor.run, args = (os._exit, 1))
+    process.start()
+    process.join(5)
+    return process.exitcode
+
+class HashingExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_result_of_function_is_returned_and_timed(self):
+        executor = sut(directory = self.directory, workers = 1, queue_depth = 0, timeout = 1)
+
+        actual = executor.run(lambda value: value * 2, 21)
+
+        self.assertEqual(42, actual)
+        self.assertEqual(1, executor.stats()['calls'])
+
+    def test_call_is_rejected_when_queue_is_full(self):
+        executor = sut(directory = self.directory, workers = 1, queue_depth = 0, timeout = 1)
+        thread, release = run_blocking_call(executor)
+
+        with self.assertRaises(password_hashing.HashingBusyError):
+            executor.run(lambda: None)
+        release.set()
+        thread.join()
+
+        self.assertEqual(1, executor.stats()['rejected'])
+        self.assertEqual(1, executor.stats()['calls'])
+
+    def test_queued_call_times_out_when_no_worker_frees_up(self):
+        executor = sut(directory = self.directory, workers = 1, queue_depth = 1, timeout = 0.05)
+        thread, release = run_blocking_call(executor)
+
+        with self.assertRaises(password_hashing.HashingBusyError):
+            executor.run(lambda: None)
+        release.set()
+        thread.join()
+
+        self.assertEqual(1, executor.stats()['timed_out'])
+
+    def test_slots_are_shared_by_executors_of_the_same_directory(self):
+        executor = sut(directory = self.directory, workers = 1, queue_depth = 0, timeout = 1)
+        other_executor = sut(directory = self.directory, workers = 1, queue_depth = 0, timeout = 1)
+        thread, release = run_blocking_call(executor)
+
+        with self.assertRaises(password_hashing.HashingBusyError):
+            other_executor.run(lambda: None)
+        release.set()
+        thread.join()
+
+        self.assertEqual(1, other_executor.stats()['rejected'])
+
+    def test_slots_of_a_worker_dying_mid_hash_are_freed(self):
+        executor = sut(directory = self.directory, workers = 1, queue_depth = 0, timeout = 1)
+
+        exitcode = die_while_hashing(executor)
+        actual = executor.run(lambda value: value * 2, 21)
+
+        self.assertEqual(1, exitcode)
+        self.assertEqual(42, actual)
+
+class HashingBusyResponseTest(unittest.TestCase):
+
+    slot_directory = tempfile.mkdtemp()
+    app = context.create_app({**context.default_test_config, "PASSWORD_HASHING_WORKERS": 1, "PASSWORD_HASHING_QUEUE_DEPTH": 0, "PASSWORD_HASHING_SLOT_DIRECTORY": slot_directory})
+    client = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.slot_directory)
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        os.remove("testdb")
+
+    def test_login_is_rejected_with_503_when_hashing_is_busy(self):
+        with self.app.app_context():
+            executor = password_hashing.get_executor()
+        thread, release = run_blocking_call(executor)
+        expected = {'message':'Server is busy, try again later!','code':470}
+
+        response = self.client.post('/login', data = {'username': 'name', 'password': 'pass'})
+        release.set()
+        thread.join()
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(expected, json.loads(response.data.decode()))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_file_metadata
+from backend.data.data_models import RegisteringUser
+
+import backend.data.query_log as sut
+
+class QueryLogTest(unittest.TestCase):
+
+    app = context.create_app({**context.default_test_config, "SLOW_QUERY_THRESHOLD_IN_MS": 10000, "QUERY_PLAN_CAPTURE_ENABLED": True})
+
+    def setUp(self):
+        sut.get_query_log_of(self.app).reset()
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_latency_is_recorded_per_statement(self, mock_time):
+        with self.app.app_context():
+            dao_users.get_user_for_access_token('token1')
+            dao_users.get_user_for_access_token('token2')
+            actual = sut.get_query_log().statement_stats()
+
+        self.assertEqual(1, len(actual))
+        self.assertEqual(2, list(actual.values())[0]['count'])
+
+    def test_batch_lookups_of_any_size_are_one_statement(self):
+        with self.app.app_context():
+            dao_file_metadata.get_metadata_for_keys(['a', 'b'])
+            dao_file_metadata.get_metadata_for_keys(['a', 'b', 'c'])
+            actual = list(sut.get_query_log().statement_stats().keys())
+
+        self.assertEqual(1, len(actual))
+        self.assertIn('IN (?, ...)', actual[0])
+
+    def test_plan_is_captured_once_per_statement(self):
+        with self.app.app_context():
+            with self.assertLogs(self.app.logger, level = 'INFO') as logs:
+                dao_users.get_user_by_id(1)
+                dao_users.get_user_by_id(2)
+            actual = sut.get_query_log().query_plans()
+
+        self.assertEqual(1, len(actual))
+        self.assertIn('SEARCH user USING INTEGER PRIMARY KEY', list(actual.values())[0][0])
+        self.assertEqual(1, len(logs.records))
+
+    def test_full_scan_is_logged_as_warning(self):
+        with self.app.app_context():
+            with self.assertLogs(self.app.logger, level = 'WARNING') as logs:
+                dao_users.get_users()
+
+        self.assertIn('Full table scan (SCAN user)', logs.records[0].getMessage())
+
+class SlowQueryLogTest(unittest.TestCase):
+
+    app = context.create_app({**context.default_test_config, "SLOW_QUERY_THRESHOLD_IN_MS": 0})
+
+    def setUp(self):
+        sut.get_query_log_of(self.app).reset()
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def test_slow_statement_is_logged_with_redacted_tokens(self):
+        with self.app.app_context():
+            with self.assertLogs(self.app.logger, level = 'WARNING') as logs:
+                dao_users.get_user_for_access_token('secret-access-token')
+
+        message = logs.records[0].getMessage()
+        self.assertTrue(message.startswith('Slow query'))
+        self.assertIn("'token': '<redacted>'", message)
+        self.assertNotIn('secret-access-token', message)
+
+    @unittest.mock.patch.object(sut, '_MAX_STATEMENTS', 0)
+    def test_slow_statement_is_logged_when_no_more_statements_are_recorded(self):
+        with self.app.app_context():
+            with self.assertLogs(self.app.logger, level = 'WARNING') as logs:
+                dao_users.get_user_for_access_token('token')
+            actual = sut.get_query_log().statement_stats()
+
+        self.assertEqual({}, actual)
+        self.assertTrue(logs.records[0].getMessage().startswith('Slow query'))
+
+class RedactTest(unittest.TestCase):
+
+    def test_sensitive_names_are_redacted(self):
+        actual = sut.redact({'id': 3, 'pass': 'hash', 'media_token': 'media', 'otp_secret': 'secret'})
+
+        self.assertEqual("{'id': 3, 'pass': '<redacted>', 'media_token': '<redacted>', 'otp_secret': '<redacted>'}", actual)
+
+    def test_executemany_rows_are_summarized(self):
+        actual = sut.redact([{'token_id': 'a', 'expires_at': 1}, {'token_id': 'b', 'expires_at': 2}])
+
+        self.assertEqual("2 rows, first: {'token_id': '<redacted>', 'expires_at': 1}", actual)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
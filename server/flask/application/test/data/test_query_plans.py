@@ -0,0 +1,78 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import inspect
+import re
+from backend.data import db
+from backend.data import dao_session
+from backend.data import dao_users
+from backend.data import dao_file_metadata
+from backend.data import dao_file_metadata_of_user
+from backend.data import dao_registration_tokens
+from backend.data import dao_reset_password_tokens
+from backend.data import dao_revoked_media_tokens
+from backend.data import query_log
+
+_DAOS = [dao_session, dao_users, dao_file_metadata, dao_file_metadata_of_user, dao_registration_tokens, dao_reset_password_tokens, dao_revoked_media_tokens]
+# statements listing a whole table on purpose
+_FULL_SCAN_ALLOWED = {'dao_users._GET_USERS_SQL', 'dao_registration_tokens._GET_TOKENS_SQL'}
+_INLINE_SQL = re.compile(r'execute(many)?\(\s*[\'"]')
+
+def get_statements():
+    statements = {}
+    for dao in _DAOS:
+        for name, value in vars(dao).items():
+            if name.endswith('_SQL'):
+                statements['{}.{}'.format(dao.__name__.split('.')[-1], name)] = value
+    return statements
+
+# unbound parameters are NULL, the plan does not depend on the values
+def get_null_params(sql: str):
+    names = re.findall(r':(\w+)', sql)
+    if len(names) > 0:
+        return dict.fromkeys(names)
+    return (None,) * sql.count('?')
+
+class QueryPlanTest(unittest.TestCase):
+
+    app = context.create_app(context.default_test_config)
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def get_plan(self, sql: str):
+        sql = sql.format('?, ?')
+        with self.app.app_context():
+            rows = db.get_db().execute('EXPLAIN QUERY PLAN ' + sql, get_null_params(sql)).fetchall()
+        return list(map(lambda row: row['detail'], rows))
+
+    def test_statements_do_not_scan_full_tables(self):
+        for name, sql in get_statements().items():
+            if name in _FULL_SCAN_ALLOWED:
+                continue
+            with self.subTest(statement = name):
+                plan = self.get_plan(sql)
+
+                full_scans = list(filter(query_log.is_full_scan, plan))
+                self.assertEqual([], full_scans, '{} scans a full table: {}'.format(name, sql))
+
+    def test_every_allowed_full_scan_still_exists(self):
+        self.assertEqual(set(), _FULL_SCAN_ALLOWED - set(get_statements().keys()))
+
+    def test_daos_have_no_inline_sql(self):
+        for dao in _DAOS:
+            with self.subTest(dao = dao.__name__):
+                actual = _INLINE_SQL.findall(inspect.getsource(dao))
+
+                self.assertEqual([], actual, 'SQL of {} should be in _SQL constants, so its plan is tested'.format(dao.__name__))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,185 @@
+import os,sys
+sys.path.append('../')
+import context
+import unittest
+import unittest.mock
+import time
+
+from backend.data import session_cache
+from backend.data.session_cache import LruTtlCache as sut
+
+class LruTtlCacheTest(unittest.TestCase):
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_put_value_is_returned(self, mock_time):
+        cache = sut(max_size = 2, ttl = 60)
+
+        cache.put('token', 13, expires_at = 2000)
+        actual = cache.get('token')
+
+        self.assertEqual(13, actual)
+        self.assertEqual(1, cache.stats()['hits'])
+        self.assertEqual(0, cache.stats()['misses'])
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_missing_value_counts_as_miss(self, mock_time):
+        cache = sut(max_size = 2, ttl = 60)
+
+        actual = cache.get('token')
+
+        self.assertEqual(None, actual)
+        self.assertEqual(0, cache.stats()['hits'])
+        self.assertEqual(1, cache.stats()['misses'])
+
+    def test_value_is_not_returned_after_its_expiration(self):
+        cache = sut(max_size = 2, ttl = 60)
+        with unittest.mock.patch('time.time', return_value=1000):
+            cache.put('token', 13, expires_at = 1010)
+
+        with unittest.mock.patch('time.time', return_value=1011):
+            actual = cache.get('token')
+
+        self.assertEqual(None, actual)
+        self.assertEqual(0, cache.stats()['size'])
+
+    def test_value_is_not_returned_after_ttl(self):
+        cache = sut(max_size = 2, ttl = 60)
+        with unittest.mock.patch('time.time', return_value=1000):
+            cache.put('token', 13, expires_at = 5000)
+
+        with unittest.mock.patch('time.time', return_value=1061):
+            actual = cache.get('token')
+
+        self.assertEqual(None, actual)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_least_recently_used_is_evicted(self, mock_time):
+        cache = sut(max_size = 2, ttl = 60)
+
+        cache.put('token1', 1, expires_at = 2000)
+        cache.put('token2', 2, expires_at = 2000)
+        cache.get('token1')
+        cache.put('token3', 3, expires_at = 2000)
+
+        self.assertEqual(1, cache.get('token1'))
+        self.assertEqual(None, cache.get('token2'))
+        self.assertEqual(3, cache.get('token3'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_invalidated_value_is_not_returned(self, mock_time):
+        cache = sut(max_size = 2, ttl = 60)
+
+        cache.put('token1', 1, expires_at = 2000)
+        cache.put('token2', 2, expires_at = 2000)
+        cache.invalidate(['token1'])
+
+        self.assertEqual(None, cache.get('token1'))
+        self.assertEqual(2, cache.get('token2'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_zero_sized_cache_stores_nothing(self, mock_time):
+        cache = sut(max_size = 0, ttl = 60)
+
+        cache.put('token', 13, expires_at = 2000)
+
+        self.assertEqual(None, cache.get('token'))
+
+# the cache functions of the uwsgi module, which is only importable inside uWSGI
+class FakeUwsgi:
+    def __init__(self):
+        self.opt = {'cache2': b'name=session_tokens,items=10,blocksize=256'}
+        self.entries = {}
+
+    def cache_get(self, key, cache_name):
+        return self.entries.get((cache_name, key))
+
+    def cache_set(self, key, value, expires, cache_name):
+        if (cache_name, key) in self.entries:
+            return None
+        self.entries[(cache_name, key)] = value
+        return True
+
+    def cache_update(self, key, value, expires, cache_name):
+        self.entries[(cache_name, key)] = value
+        return True
+
+    def cache_clear(self, cache_name):
+        self.entries = {key: value for key, value in self.entries.items() if key[0] != cache_name}
+
+class UwsgiCacheTest(unittest.TestCase):
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_put_value_is_returned_to_every_worker(self, mock_time):
+        uwsgi = FakeUwsgi()
+        worker1 = session_cache.UwsgiCache(uwsgi, cache_name = 'session_tokens', ttl = 60)
+        worker2 = session_cache.UwsgiCache(uwsgi, cache_name = 'session_tokens', ttl = 60)
+
+        worker1.put('token', (13, 2000), expires_at = 2000)
+        actual = worker2.get('token')
+
+        self.assertEqual((13, 2000), actual)
+        self.assertEqual(1, worker2.stats()['hits'])
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_put_user_fields_are_returned(self, mock_time):
+        cache = session_cache.UwsgiCache(FakeUwsgi(), cache_name = 'session_tokens', ttl = 60)
+
+        cache.put('user:13', (13, 'bánán', 'base32secret3232', True, False), expires_at = 2000)
+        actual = cache.get('user:13')
+
+        self.assertEqual((13, 'bánán', 'base32secret3232', True, False), actual)
+
+    def test_value_is_not_returned_after_ttl(self):
+        cache = session_cache.UwsgiCache(FakeUwsgi(), cache_name = 'session_tokens', ttl = 60)
+        with unittest.mock.patch('time.time', return_value=1000):
+            cache.put('token', (13, 5000), expires_at = 5000)
+
+        with unittest.mock.patch('time.time', return_value=1061):
+            actual = cache.get('token')
+
+        self.assertEqual(None, actual)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_invalidated_value_can_not_be_put_back_by_another_worker(self, mock_time):
+        uwsgi = FakeUwsgi()
+        worker1 = session_cache.UwsgiCache(uwsgi, cache_name = 'session_tokens', ttl = 60)
+        worker2 = session_cache.UwsgiCache(uwsgi, cache_name = 'session_tokens', ttl = 60)
+
+        worker1.put('token', (13, 2000), expires_at = 2000)
+        worker2.invalidate(['token'])
+        worker1.put('token', (13, 2000), expires_at = 2000)
+
+        self.assertEqual(None, worker1.get('token'))
+        self.assertEqual(None, worker2.get('token'))
+
+class SessionCacheBackendTest(unittest.TestCase):
+
+    def test_local_cache_is_used_by_default(self):
+        app = context.create_app(context.default_test_config)
+
+        with app.app_context():
+            actual = session_cache.get_session_cache()
+
+        self.assertIsInstance(actual, sut)
+
+    def test_uwsgi_backend_falls_back_to_local_outside_of_uwsgi(self):
+        app = context.create_app({**context.default_test_config, "SESSION_CACHE_BACKEND": "uwsgi"})
+
+        with app.app_context():
+            actual = session_cache.get_session_cache()
+
+        self.assertIsInstance(actual, sut)
+
+    def test_uwsgi_backend_is_used_when_cache_is_declared(self):
+        app = context.create_app({**context.default_test_config, "SESSION_CACHE_BACKEND": "uwsgi"})
+
+        with unittest.mock.patch.dict('sys.modules', {'uwsgi': FakeUwsgi()}):
+            with app.app_context():
+                actual = session_cache.get_session_cache()
+
+        self.assertIsInstance(actual, session_cache.UwsgiCache)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
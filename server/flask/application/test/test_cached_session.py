@@ -0,0 +1,77 @@
+import os
+import unittest
+import unittest.mock
+import json
+from .context import create_app, default_test_config, create_test_session
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_session
+from backend.data.data_models import RegisteringUser
+
+class CachedSessionTest(unittest.TestCase):
+
+    url_path = '/user/is_privileged'
+    app = create_app(default_test_config)
+    client = app.test_client()
+    queries = []
+    db.add_query_observer(app, lambda sql, params, duration: CachedSessionTest.queries.append(sql))
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+            self.user_id = dao_users.insert_user(RegisteringUser(name = 'banan', password = 'citrom', otp_secret = 'base32secret3232', privileged = True))
+            dao_session.insert_user_session(create_test_session(user_id=self.user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+        self.queries.clear()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def get_is_privileged(self):
+        return self.client.get(self.url_path, headers = {'Authorization': 'token'})
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_second_request_of_session_does_not_query_the_database(self, mock_time):
+        self.get_is_privileged()
+        self.queries.clear()
+
+        response = self.get_is_privileged()
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'is_privileged': True}, json.loads(response.data.decode()))
+        self.assertEqual([], self.queries)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_logout_invalidates_the_cached_session(self, mock_time):
+        self.get_is_privileged()
+
+        self.client.post('/logout', headers = {'Authorization': 'token'})
+        response = self.get_is_privileged()
+
+        self.assertEqual(401, response.status_code)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_privilege_change_invalidates_the_cached_user(self, mock_time):
+        self.get_is_privileged()
+
+        with self.app.app_context():
+            dao_users.update_user_privilige(self.user_id, False)
+        response = self.get_is_privileged()
+
+        self.assertEqual({'is_privileged': False}, json.loads(response.data.decode()))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_deleting_the_user_invalidates_the_cached_user(self, mock_time):
+        self.get_is_privileged()
+
+        with self.app.app_context():
+            dao_users.delete_user_by_id(self.user_id)
+        response = self.get_is_privileged()
+
+        self.assertEqual(400, response.status_code)
+        self.assertEqual({'message':'Invalid Authorization!','code':442}, json.loads(response.data.decode()))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -35,8 +35,8 @@ class PasswordChangeUnitTest(unittest.TestCase):
 
     def assertHasSession(self, access_token, user_id):
         with self.app.app_context():
-            actual = dao_session.get_user_for_token(access_token)
-        self.assertEqual(user_id, actual)
+            actual = dao_users.get_user_for_access_token(access_token)
+        self.assertEqual(user_id, actual.id)
 
     def test_no_headers_returns_unauthorized(self):
         expected = {'message':'Missing Authorization!','code':440}
@@ -40,7 +40,7 @@ class DeleteTokenUnitTest(unittest.TestCase):
 
     def assert_session(self, access_token: str, exists: bool):
         with self.app.app_context():
-            actual = dao_session.get_user_for_token(access_token)
+            actual = dao_users.get_user_for_access_token(access_token)
         self.assertEqual(exists, actual is not None)
     
     def test_no_headers_returns_unauthorized(self):
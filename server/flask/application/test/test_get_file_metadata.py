@@ -6,6 +6,7 @@ from .context import create_app, default_test_config, create_test_session
 from backend.data import db
 from backend.data import dao_users
 from backend.data import dao_session
+from backend.data import dao_file_metadata
 from backend.data.data_models import Session
 from backend.data.data_models import RegisteringUser
 
@@ -148,5 +149,46 @@ class GetFileMetadataOfUserUnitTest(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(expected, actual_response_json)
 
+    def insert_user_with_session(self):
+        user = RegisteringUser(
+            name = 'banan',
+            password = 'citrom',
+            otp_secret = 'base32secret3232'
+        )
+        user_id = self.insert_user(user)
+        self.insert_session(create_test_session(user_id=user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_unchanged_metadata_with_matching_etag_is_not_modified(self, mock_time):
+        self.insert_user_with_session()
+        with self.app.app_context():
+            dao_file_metadata.insert_metadata({'key': 'value'})
+        header = {'Authorization': 'token'}
+        get_query = {'file_key': 'key'}
+        response = self.client.get(self.url_path, headers = header, query_string = get_query)
+        with self.app.app_context():
+            dao_file_metadata.insert_metadata({'key': 'value'})
+
+        actual = self.client.get(self.url_path, headers = {**header, 'If-None-Match': response.headers.get('ETag')}, query_string = get_query)
+
+        self.assertEqual(304, actual.status_code)
+        self.assertEqual(b'', actual.data)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_changed_metadata_with_old_etag_is_returned(self, mock_time):
+        self.insert_user_with_session()
+        with self.app.app_context():
+            dao_file_metadata.insert_metadata({'key': 'value'})
+        header = {'Authorization': 'token'}
+        get_query = {'file_key': 'key'}
+        response = self.client.get(self.url_path, headers = header, query_string = get_query)
+        with self.app.app_context():
+            dao_file_metadata.insert_metadata({'key': 'changed'})
+
+        actual = self.client.get(self.url_path, headers = {**header, 'If-None-Match': response.headers.get('ETag')}, query_string = get_query)
+
+        self.assertEqual(200, actual.status_code)
+        self.assertEqual({'key': 'changed'}, json.loads(actual.data.decode()))
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import unittest
+import unittest.mock
+import json
+from .context import create_app, default_test_config, create_test_session
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_session
+from backend.data import dao_file_metadata
+from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
+
+class GetFileMetadataBatchUnitTest(unittest.TestCase):
+
+    url_path = '/file/metadata/batch'
+    app = create_app({**default_test_config, "FILE_METADATA_BATCH_LIMIT": 3})
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def insert_user_with_session(self):
+        user = RegisteringUser(
+            name = 'banan',
+            password = 'citrom',
+            otp_secret = 'base32secret3232'
+        )
+        with self.app.app_context():
+            user_id = dao_users.insert_user(user)
+            dao_session.insert_user_session(create_test_session(user_id=user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+
+    def insert_metadata(self, metadata: dict):
+        with self.app.app_context():
+            dao_file_metadata.insert_metadata(metadata = metadata)
+
+    def test_no_headers_returns_unauthorized(self):
+        expected = {'message':'Missing Authorization!','code':440}
+
+        response = self.client.get(self.url_path)
+        actual_response_json = json.loads(response.data.decode())
+
+        self.assertEqual(401, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_authenticated_user_without_keys_error_is_shown(self, mock_time):
+        self.insert_user_with_session()
+        expected = {'message': 'Invalid FileKey (file_key)!', 'code': 416}
+
+        response = self.client.get(self.url_path, headers = {'Authorization': 'token'})
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_authenticated_user_query_keys_are_resolved_and_missing_are_omitted(self, mock_time):
+        self.insert_user_with_session()
+        self.insert_metadata({'a': 'value a', 'b': 'value b', 'c': 'value c'})
+        expected = {'a': 'value a', 'c': 'value c'}
+
+        get_query = [('file_key', 'a'), ('file_key', 'c'), ('file_key', 'missing')]
+        response = self.client.get(self.url_path, headers = {'Authorization': 'token'}, query_string = get_query)
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_authenticated_user_posted_keys_are_resolved(self, mock_time):
+        self.insert_user_with_session()
+        self.insert_metadata({'a': 'value a', 'b': 'value b'})
+        expected = {'a': 'value a', 'b': 'value b'}
+
+        response = self.client.post(self.url_path, headers = {'Authorization': 'token'}, data = json.dumps(['a', 'b', 'a']))
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_authenticated_user_posting_non_list_error_is_shown(self, mock_time):
+        self.insert_user_with_session()
+        expected = {'message': 'Invalid FileKey (file_key)!', 'code': 416}
+
+        response = self.client.post(self.url_path, headers = {'Authorization': 'token'}, data = json.dumps({'a': 'b'}))
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_authenticated_user_requesting_too_many_keys_error_is_shown(self, mock_time):
+        self.insert_user_with_session()
+        expected = {'message': 'Too many FileKeys, at most 3 are allowed!', 'code': 417}
+
+        response = self.client.post(self.url_path, headers = {'Authorization': 'token'}, data = json.dumps(['a', 'b', 'c', 'd']))
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,6 +6,7 @@ from .context import create_app, default_test_config, create_test_session
 from backend.data import db
 from backend.data import dao_users
 from backend.data import dao_session
+from backend.data import dao_file_metadata_of_user
 from backend.data.data_models import Session
 from backend.data.data_models import RegisteringUser
 
@@ -126,5 +127,137 @@ class GetFileMetadataOfUserUnitTest(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(expected, actual_response_json)
 
+    def insert_user_with_metadata(self, metadata: dict):
+        user = RegisteringUser(
+            name = 'banan',
+            password = 'citrom',
+            otp_secret = 'base32secret3232'
+        )
+        user_id = self.insert_user(user)
+        self.insert_session(create_test_session(user_id=user_id, access_token='token', access_expires_at=1050, refresh_expires_at=2000))
+        with self.app.app_context():
+            dao_file_metadata_of_user.insert_metadata(user_id = user_id, metadata = metadata)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_limit_metadata_is_paged_by_file_key(self, mock_time):
+        self.insert_user_with_metadata({'c': '3', 'a': '1', 'b': '2'})
+        header = {'Authorization': 'token'}
+
+        first_response = self.client.get(self.url_path, headers = header, query_string = {'limit': 2})
+        second_response = self.client.get(self.url_path, headers = header, query_string = {'limit': 2, 'after': first_response.headers.get('Next-After')})
+
+        self.assertEqual(200, first_response.status_code)
+        self.assertEqual({'a': '1', 'b': '2'}, json.loads(first_response.data.decode()))
+        self.assertEqual('b', first_response.headers.get('Next-After'))
+        self.assertEqual(200, second_response.status_code)
+        self.assertEqual({'c': '3'}, json.loads(second_response.data.decode()))
+        self.assertEqual(None, second_response.headers.get('Next-After'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_invalid_limit_error_is_shown(self, mock_time):
+        self.insert_user_with_metadata({'a': '1'})
+        expected = {'message': 'Invalid Limit (limit)!', 'code': 418}
+
+        response = self.client.get(self.url_path, headers = {'Authorization': 'token'}, query_string = {'limit': 'zero'})
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_streamed_metadata_is_the_same_as_not_streamed(self, mock_time):
+        self.insert_user_with_metadata({'b': 'second', 'a': '"quoted"', 'c': '\u00e1'})
+        header = {'Authorization': 'token'}
+
+        expected = self.client.get(self.url_path, headers = header)
+        response = self.client.get(self.url_path, headers = header, query_string = {'stream': 'true'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/json', response.mimetype)
+        self.assertEqual(expected.data, response.data)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_streamed_empty_metadata_is_empty_object(self, mock_time):
+        self.insert_user_with_metadata({})
+
+        response = self.client.get(self.url_path, headers = {'Authorization': 'token'}, query_string = {'stream': 'true'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({}, json.loads(response.data.decode()))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_since_only_changes_after_that_version_are_returned(self, mock_time):
+        self.insert_user_with_metadata({'a': '1', 'b': '2'})
+        header = {'Authorization': 'token'}
+        full_response = self.client.get(self.url_path, headers = header)
+        self.client.post(self.url_path, headers = header, data = json.dumps({'b': 'changed', 'a': None, 'c': 'new'}), content_type='application/json')
+
+        response = self.client.get(self.url_path, headers = header, query_string = {'since': full_response.headers.get('Metadata-Version')})
+        unchanged_response = self.client.get(self.url_path, headers = header, query_string = {'since': response.headers.get('Metadata-Version')})
+
+        self.assertEqual('2', full_response.headers.get('Metadata-Version'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'a': None, 'b': 'changed', 'c': 'new'}, json.loads(response.data.decode()))
+        self.assertEqual('5', response.headers.get('Metadata-Version'))
+        self.assertEqual({}, json.loads(unchanged_response.data.decode()))
+        self.assertEqual('5', unchanged_response.headers.get('Metadata-Version'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_deleted_keys_are_not_returned_without_since(self, mock_time):
+        self.insert_user_with_metadata({'a': '1', 'b': '2'})
+        header = {'Authorization': 'token'}
+        self.client.post(self.url_path, headers = header, data = json.dumps({'a': None}), content_type='application/json')
+
+        response = self.client.get(self.url_path, headers = header)
+
+        self.assertEqual({'b': '2'}, json.loads(response.data.decode()))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_given_invalid_since_error_is_shown(self, mock_time):
+        self.insert_user_with_metadata({'a': '1'})
+        expected = {'message': 'Invalid Version (since)!', 'code': 419}
+
+        response = self.client.get(self.url_path, headers = {'Authorization': 'token'}, query_string = {'since': '-1'})
+
+        actual_response_json = json.loads(response.data.decode())
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(expected, actual_response_json)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_unchanged_metadata_with_matching_etag_is_not_modified(self, mock_time):
+        self.insert_user_with_metadata({'a': '1'})
+        header = {'Authorization': 'token'}
+        response = self.client.get(self.url_path, headers = header)
+
+        actual = self.client.get(self.url_path, headers = {**header, 'If-None-Match': response.headers.get('ETag')})
+
+        self.assertEqual(304, actual.status_code)
+        self.assertEqual(b'', actual.data)
+        self.assertEqual(response.headers.get('ETag'), actual.headers.get('ETag'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_changed_metadata_with_old_etag_is_returned(self, mock_time):
+        self.insert_user_with_metadata({'a': '1'})
+        header = {'Authorization': 'token'}
+        response = self.client.get(self.url_path, headers = header)
+        self.client.post(self.url_path, headers = header, data = json.dumps({'a': '2'}), content_type='application/json')
+
+        actual = self.client.get(self.url_path, headers = {**header, 'If-None-Match': response.headers.get('ETag')})
+
+        self.assertEqual(200, actual.status_code)
+        self.assertEqual({'a': '2'}, json.loads(actual.data.decode()))
+        self.assertNotEqual(response.headers.get('ETag'), actual.headers.get('ETag'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_etag_of_other_query_does_not_match(self, mock_time):
+        self.insert_user_with_metadata({'a': '1', 'b': '2'})
+        header = {'Authorization': 'token'}
+        response = self.client.get(self.url_path, headers = header)
+
+        actual = self.client.get(self.url_path, headers = {**header, 'If-None-Match': response.headers.get('ETag')}, query_string = {'limit': 1})
+
+        self.assertEqual(200, actual.status_code)
+        self.assertEqual({'a': '1'}, json.loads(actual.data.decode()))
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -4,7 +4,9 @@ import unittest.mock
 from .context import create_app, default_test_config, create_test_session
 from backend.data import db
 from backend.data import dao_session
+from backend.data import dao_users
 from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
 
 class LogoutUnitTest(unittest.TestCase):
  
@@ -27,8 +29,8 @@ class LogoutUnitTest(unittest.TestCase):
 
     def assertSession(self, access_token, user_id):
         with self.app.app_context():
-             actual_user_id = dao_session.get_user_for_token(access_token)
-        self.assertEqual(actual_user_id, user_id)
+             actual_user = dao_users.get_user_for_access_token(access_token)
+        self.assertEqual(None if actual_user is None else actual_user.id, user_id)
 
     def test_no_headers_returns_ok(self):
         expected = ''
@@ -48,15 +50,17 @@ class LogoutUnitTest(unittest.TestCase):
 
     @unittest.mock.patch('time.time', return_value=1000)
     def test_given_valid_session_returns_and_session_is_invalidated_ok(self, mock_time):
+        with self.app.app_context():
+            user_id = dao_users.insert_user(RegisteringUser(name = 'banan', password = 'citrom', otp_secret = 'base32secret3232'))
         session = create_test_session(
-            user_id=2,
+            user_id=user_id,
             access_token='access',
             refresh_token="refresh",
             access_expires_at=1010,
             refresh_expires_at=1020
         )
         self.insert_session(session = session)
-        self.assertSession(access_token = 'access', user_id = 2)
+        self.assertSession(access_token = 'access', user_id = user_id)
         expected = ''
         response = self.client.post(self.url_path, headers={'Authorization': 'access'})
         actual_response = response.data.decode()
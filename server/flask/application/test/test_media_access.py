@@ -2,10 +2,14 @@ import os
 import unittest
 import unittest.mock
 import json
+import time
 from .context import create_app, default_test_config, create_test_session
 from backend.data import db
 from backend.data import dao_users
 from backend.data import dao_session
+from backend.data import dao_revoked_media_tokens
+from backend.data import signed_media_token
+from backend import token_generator_util
 from backend.data.data_models import Session
 from backend.data.data_models import RegisteringUser
 
@@ -70,5 +74,200 @@ class TestMediaAccess(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(expected, actual_response_json)
 
+class TestMediaAccessCacheHeaders(unittest.TestCase):
+
+    url_path = '/has_media_access'
+    app = create_app({**default_test_config, 'MEDIA_ACCESS_CACHE_MAX_AGE_IN_SECONDS': 30, 'MEDIA_ACCESS_DENIED_CACHE_IN_SECONDS': 5})
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def insert_session(self, session: Session):
+        with self.app.app_context():
+            dao_session.insert_user_session(session)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_granted_access_is_cacheable_for_max_age(self, mock_time):
+        self.insert_session(create_test_session(user_id=2, media_token='token', access_expires_at=5000, refresh_expires_at=6000))
+
+        response = self.client.get(self.url_path, headers = {'Media-Authorization': 'token'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('30', response.headers.get('X-Accel-Expires'))
+        self.assertEqual('private, max-age=30', response.headers.get('Cache-Control'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_granted_access_is_not_cacheable_past_token_expiration(self, mock_time):
+        self.insert_session(create_test_session(user_id=2, media_token='token', access_expires_at=1010, refresh_expires_at=6000))
+
+        response = self.client.get(self.url_path, headers = {'Media-Authorization': 'token'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('10', response.headers.get('X-Accel-Expires'))
+
+    def test_denied_access_is_cacheable_for_negative_ttl(self):
+        response = self.client.get(self.url_path, headers = {'Media-Authorization': 'token'})
+
+        self.assertEqual(401, response.status_code)
+        self.assertEqual('5', response.headers.get('X-Accel-Expires'))
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_without_config_no_cache_headers_are_sent(self, mock_time):
+        app = create_app(default_test_config)
+        with app.app_context():
+            dao_session.insert_user_session(create_test_session(user_id=2, media_token='token', access_expires_at=5000, refresh_expires_at=6000))
+
+        granted_response = app.test_client().get(self.url_path, headers = {'Media-Authorization': 'token'})
+        denied_response = app.test_client().get(self.url_path)
+
+        self.assertEqual(200, granted_response.status_code)
+        self.assertEqual(None, granted_response.headers.get('X-Accel-Expires'))
+        self.assertEqual(None, granted_response.headers.get('Cache-Control'))
+        self.assertEqual(401, denied_response.status_code)
+        self.assertEqual(None, denied_response.headers.get('X-Accel-Expires'))
+
+class TestSignedMediaAccess(unittest.TestCase):
+
+    url_path = '/has_media_access'
+    app = create_app({**default_test_config, 'MEDIA_TOKEN_SIGNING_KEY': 'signing-key', 'MEDIA_TOKEN_PATH_PREFIX': '/media/'})
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.close_db()
+        os.remove("testdb")
+
+    def generate_session(self, user_id = 2):
+        with self.app.app_context():
+            session = token_generator_util.generate_session(user_id)
+            dao_session.insert_user_session(session)
+        return session
+
+    def get(self, media_token, original_uri = '/media/movie.mp4'):
+        header = {'X-Original-URI': original_uri + '?Media-Authorization=' + media_token}
+        return self.client.get(self.url_path, headers = header)
+
+    def test_signed_token_is_generated(self):
+        session = self.generate_session()
+
+        self.assertTrue(session.media_token.startswith('v1.'))
+        self.assertTrue(len(session.media_token) <= default_test_config['MAX_TOKEN_LENGTH'])
+
+    def test_signed_token_longer_than_max_token_length_is_not_issued(self):
+        with self.app.app_context():
+            with self.assertRaises(ValueError):
+                signed_media_token.sign(2, time.time() + 100, '/media/' + 'a' * default_test_config['MAX_TOKEN_LENGTH'])
+
+    def test_given_valid_signed_token_returns_access_granted(self):
+        session = self.generate_session()
+        expected = {'message': 'Access Granted', 'code': 220}
+
+        with unittest.mock.patch('backend.data.dao_session.get_user_and_expiration_for_media_token') as session_lookup:
+            response = self.get(session.media_token)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected, json.loads(response.data.decode()))
+        session_lookup.assert_not_called()
+
+    def test_tampered_signed_token_returns_unauthorized(self):
+        session = self.generate_session(user_id = 2)
+        with self.app.app_context():
+            other_user_token = signed_media_token.sign(3, session.access_expires_at, '/media/')
+        tampered = other_user_token.split('.')[0] + '.' + other_user_token.split('.')[1] + '.' + session.media_token.split('.')[2]
+
+        response = self.get(tampered)
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_outside_of_path_prefix_returns_unauthorized(self):
+        session = self.generate_session()
+
+        response = self.get(session.media_token, original_uri = '/other/movie.mp4')
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_escaping_path_prefix_with_dot_segments_returns_unauthorized(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, time.time() + 100, '/media/allowed/')
+
+        response = self.get(media_token, original_uri = '/media/allowed/../private/movie.mp4')
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_escaping_path_prefix_with_encoded_dot_segments_returns_unauthorized(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, time.time() + 100, '/media/allowed/')
+
+        response = self.get(media_token, original_uri = '/media/allowed/%2e%2e/private/movie.mp4')
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_in_sibling_directory_of_path_prefix_returns_unauthorized(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, time.time() + 100, '/media/alice')
+
+        response = self.get(media_token, original_uri = '/media/alice2/movie.mp4')
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_with_path_prefix_without_trailing_slash_returns_access_granted(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, time.time() + 100, '/media/alice')
+
+        response = self.get(media_token, original_uri = '/media/alice/movie.mp4')
+
+        self.assertEqual(200, response.status_code)
+
+    def test_signed_token_with_encoded_path_inside_prefix_returns_access_granted(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, time.time() + 100, '/media/allowed/')
+
+        response = self.get(media_token, original_uri = '/media/allowed/my%20movie.mp4')
+
+        self.assertEqual(200, response.status_code)
+
+    def test_expired_signed_token_returns_unauthorized(self):
+        with self.app.app_context():
+            media_token = signed_media_token.sign(2, 1, '')
+
+        response = self.get(media_token)
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_of_logged_out_session_returns_unauthorized(self):
+        session = self.generate_session()
+        self.get(session.media_token)
+
+        self.client.post('/logout', headers = {'Authorization': session.access_token})
+        response = self.get(session.media_token)
+
+        self.assertEqual(401, response.status_code)
+
+    def test_signed_token_revoked_by_other_worker_returns_unauthorized_after_refresh(self):
+        session = self.generate_session()
+        self.get(session.media_token)
+        with self.app.app_context():
+            db_cursor = db.get_db().cursor()
+            claims = signed_media_token.parse(session.media_token)
+            dao_revoked_media_tokens.insert_revoked_tokens(db_cursor, [(claims['token_id'], claims['expires_at'])])
+            db.get_db().commit()
+
+        with unittest.mock.patch('time.time', return_value = time.time() + 60):
+            response = self.get(session.media_token)
+
+        self.assertEqual(401, response.status_code)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -30,8 +30,8 @@ class OTP_VerificationUnitTest(unittest.TestCase):
 
     def assertHasSession(self, access_token, user_id):
         with self.app.app_context():
-            actual = dao_session.get_user_for_token(access_token)
-        self.assertEqual(user_id, actual)
+            actual = dao_users.get_user_for_access_token(access_token)
+        self.assertEqual(user_id, actual.id)
 
     def assertUserOTPIs(self, user_id, was_otp_verified):
         with self.app.app_context():
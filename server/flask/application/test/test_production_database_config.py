@@ -0,0 +1,91 @@
+import os
+import unittest
+import unittest.mock
+import json
+import sqlite3
+from .context import create_app, default_test_config, create_test_session
+from backend.data import db
+from backend.data import dao_users
+from backend.data import dao_session
+from backend.data.data_models import RegisteringUser
+
+# the pragmas shipped in config.json, with foreign keys and WAL, on connections kept alive between requests
+def load_production_database_config():
+    with open(os.path.join(os.path.dirname(__file__), '..', 'backend', 'config.json')) as config_file:
+        config = json.load(config_file)
+    return {
+        **default_test_config,
+        "DATABASE_PRAGMAS": config['DATABASE_PRAGMAS'],
+        "DATABASE_KEEP_CONNECTION_ALIVE": config['DATABASE_KEEP_CONNECTION_ALIVE'],
+    }
+
+class ProductionDatabaseConfigTest(unittest.TestCase):
+
+    app = create_app(load_production_database_config())
+    client = app.test_client()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.init_db()
+
+    def tearDown(self):
+        db.close_persistent_connections()
+        os.remove("testdb")
+
+    def insert_user(self, name: str, privileged: bool = False):
+        with self.app.app_context():
+            return dao_users.insert_user(RegisteringUser(name = name, password = 'pass', otp_secret = 'base32secret3232', privileged = privileged, was_otp_verified = True))
+
+    def test_pragmas_are_applied_to_request_connections(self):
+        with self.app.app_context():
+            connection = db.get_db()
+            actual_journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+            actual_foreign_keys = connection.execute("PRAGMA foreign_keys").fetchone()[0]
+
+        self.assertEqual('wal', actual_journal_mode)
+        self.assertEqual(1, actual_foreign_keys)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_otp_verification_metadata_and_logout(self, mock_time):
+        with self.app.app_context():
+            dao_users.insert_user(RegisteringUser(name = 'name', password = 'pass', otp_secret = 'base32secret3232'))
+
+        login_response = self.client.post('/otp_verification', data = {'username': 'name', 'password': 'pass', 'otp': '585501'})
+        headers = {'Authorization': json.loads(login_response.data.decode())['access_token']}
+        save_response = self.client.post('/user/file/metadata', headers = headers, json = {'key': 'value'})
+        get_response = self.client.get('/user/file/metadata', headers = headers)
+        logout_response = self.client.post('/logout', headers = headers)
+        after_logout_response = self.client.get('/user/file/metadata', headers = headers)
+
+        self.assertEqual(200, login_response.status_code)
+        self.assertEqual(200, save_response.status_code)
+        self.assertEqual({'key': 'value'}, json.loads(get_response.data.decode()))
+        self.assertEqual(200, logout_response.status_code)
+        self.assertEqual(401, after_logout_response.status_code)
+
+    @unittest.mock.patch('time.time', return_value=1000)
+    def test_deleting_user_with_sessions_respects_foreign_keys(self, mock_time):
+        admin_id = self.insert_user('admin', privileged = True)
+        user_id = self.insert_user('deleted')
+        with self.app.app_context():
+            dao_session.insert_user_session(create_session(admin_id, 'admin'))
+            dao_session.insert_user_session(create_session(user_id, 'deleted'))
+
+        response = self.client.post('/admin/delete/user', headers = {'Authorization': 'adminaccess'}, data = {'username_to_delete': 'deleted', 'otp': '585501'})
+
+        self.assertEqual(200, response.status_code)
+        with self.app.app_context():
+            self.assertIsNone(dao_users.get_user_by_id(user_id))
+            self.assertIsNone(dao_users.get_user_for_access_token('deletedaccess'))
+
+    def test_session_of_unknown_user_is_rejected_by_foreign_key(self):
+        with self.app.app_context():
+            with self.assertRaises(sqlite3.IntegrityError):
+                dao_session.insert_user_session(create_session(42, 'orphan'))
+
+def create_session(user_id: int, prefix: str):
+    return create_test_session(user_id = user_id, access_token = prefix + 'access', media_token = prefix + 'media', refresh_token = prefix + 'refresh', access_expires_at = 1500, refresh_expires_at = 2000)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -5,7 +5,9 @@ import json
 from .context import create_app, default_test_config, create_test_session
 from backend.data import db
 from backend.data import dao_session
+from backend.data import dao_users
 from backend.data.data_models import Session
+from backend.data.data_models import RegisteringUser
 
 class RefreshTokenUnitTest(unittest.TestCase):
 
@@ -28,8 +30,8 @@ class RefreshTokenUnitTest(unittest.TestCase):
 
     def assertHasSession(self, access_token, user_id):
         with self.app.app_context():
-            actual = dao_session.get_user_for_token(access_token)
-        self.assertEqual(user_id, actual)
+            actual = dao_users.get_user_for_access_token(access_token)
+        self.assertEqual(user_id, actual.id)
     
     def test_no_refresh_token_returns_error(self):
         expected = {'message':'Invalid Refresh Token!','code':450}
@@ -95,8 +97,10 @@ class RefreshTokenUnitTest(unittest.TestCase):
 
     @unittest.mock.patch('time.time', return_value=1000)
     def test_expired_access_token_but_non_expires_refresh_token_then_new_is_returned(self, mock_time):
+        with self.app.app_context():
+            user_id = dao_users.insert_user(RegisteringUser(name = 'banan', password = 'citrom', otp_secret = 'base32secret3232'))
         session = create_test_session(
-            user_id=1,
+            user_id=user_id,
             access_token='a',
             refresh_token="token",
             access_expires_at=900,
@@ -111,7 +115,7 @@ class RefreshTokenUnitTest(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(expected_keys, set(actual_response_json.keys()))
         self.assertEqual(actual_response_json['expires_at'], 1000+20000)
-        self.assertHasSession(access_token = actual_response_json['access_token'], user_id = 1)
+        self.assertHasSession(access_token = actual_response_json['access_token'], user_id = user_id)
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
@@ -62,7 +62,7 @@ docker run -d --name "$CONTAINER_NAME" -p443:443 --restart=always --mount type=b
 
 # initialize database with admin credentials
 echo "Initializing database with adming user..."
-docker exec $CONTAINER_NAME python backend/data/db.py -u "$admin_username" -p "$password"
+docker exec $CONTAINER_NAME python -m backend.data.db -u "$admin_username" -p "$password"
 
 echo "Docker container should be ready to use."
 echo "To test server, you may use \`curl -k -d \"username=$admin_username&password=$password\" https://localhost:443/login\`"